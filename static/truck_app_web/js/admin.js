@@ -0,0 +1,103 @@
+// Shared scripts of the truck_app_web admin and account pages
+
+// Sidebar collapse on the admin pages
+function toggles(e)
+{
+   var toggles = document.getElementById("navigation");
+   var main = document.getElementById("main");
+   toggles.classList.toggle("active");
+   main.classList.toggle("active");
+};
+
+// Date pickers on the booking details pages (they load jQuery UI)
+if (window.jQuery && jQuery.fn.datepicker) {
+  $(function() {
+    $('.datepicker').datepicker({
+      dateFormat: 'yy-mm-dd',
+      timeFormat: 'HH:mm:ss'
+    });
+  });
+}
+
+// Login page
+function showPassword() {
+  var passwordField = document.getElementById("password-field");
+  if (passwordField.type === "password") {
+    passwordField.type = "text";
+  } else {
+    passwordField.type = "password";
+  }
+}
+
+let slideIndex = 0;
+if (document.getElementsByClassName("mySlides").length) {
+  showSlides();
+}
+
+function showSlides() {
+  let i;
+  let slides = document.getElementsByClassName("mySlides");
+  let dots = document.getElementsByClassName("dot");
+  for (i = 0; i < slides.length; i++) {
+    slides[i].style.display = "none";
+  }
+  slideIndex++;
+  if (slideIndex > slides.length) {slideIndex = 1}
+  for (i = 0; i < dots.length; i++) {
+    dots[i].className = dots[i].className.replace(" active", "");
+  }
+  slides[slideIndex-1].style.display = "block";
+  dots[slideIndex-1].className += " active";
+  setTimeout(showSlides, 2000); // Change image every 2 seconds
+}
+
+// Change password page
+function validateForm() {
+  const password1 = document.getElementById("new-password").value;
+  const password2 = document.getElementById("confirm-password").value;
+  const passwordError = document.getElementById("password-error");
+  const confirmError = document.getElementById("confirm-password-error");
+
+  // Reset error messages and alert classes
+  passwordError.textContent = "";
+  passwordError.classList.remove("error-alert", "success-alert");
+  confirmError.textContent = "";
+  confirmError.classList.remove("error-alert", "success-alert");
+
+  // Validate passwords
+  if (password1.length < 8) {
+    passwordError.textContent = "Password should be at least 8 characters long.";
+    passwordError.classList.add("error-alert");
+    return false;
+  }
+
+  if (password1 !== password2) {
+    confirmError.textContent = "Passwords do not match.";
+    confirmError.classList.add("error-alert");
+    return false;
+  }
+
+  if (!/[!@#$%^&*]/.test(password1)) {
+    passwordError.textContent = "Password must contain at least one special character (!@#$%^&*).";
+    passwordError.classList.add("error-alert");
+    return false;
+  }
+
+  // Display success alert
+  passwordError.textContent = "Valid password!";
+  passwordError.classList.add("success-alert");
+  confirmError.textContent = "Valid password!";
+  confirmError.classList.add("success-alert");
+
+  return true;
+}
+
+function togglePasswordVisibility(inputId) {
+  const input = document.getElementById(inputId);
+
+  if (input.type === 'password') {
+    input.type = 'text';
+  } else {
+    input.type = 'password';
+  }
+}
@@ -0,0 +1,63 @@
+// Dashboard income chart: this year's months come with the page (monthly-income-data json_script
+// element), other years and recent weeks from the RevenueChart endpoint
+const monthlyIncomeData = JSON.parse(document.getElementById('monthly-income-data').textContent);
+
+// Get the canvas element
+const canvas = document.getElementById('income-chart');
+
+// Create the chart object
+const chart = new Chart(canvas, {
+  type: 'line',
+  data: {
+    labels: ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+    datasets: [{
+      label: 'Monthly Income',
+      data: monthlyIncomeData,
+      backgroundColor: 'rgba(255, 99, 132, 0.2)',
+      borderColor: 'rgba(255, 99, 132, 1)',
+      borderWidth: 2
+    }]
+  },
+  options: {
+    responsive: true,
+    maintainAspectRatio: false,
+    scales: {
+      yAxes: [{
+        ticks: {
+          beginAtZero: true
+        }
+      }]
+    }
+  }
+});
+
+const periodSelect = document.getElementById('income-period');
+const yearInput = document.getElementById('income-year');
+const weeksSelect = document.getElementById('income-weeks');
+
+function loadIncome() {
+  const weekly = periodSelect.value === 'week';
+  yearInput.style.display = weekly ? 'none' : '';
+  weeksSelect.style.display = weekly ? '' : 'none';
+  const params = weekly ? {period: 'week', weeks: weeksSelect.value} : {year: yearInput.value};
+  fetch(canvas.dataset.url + '?' + new URLSearchParams(params), {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.json();
+    })
+    .then(function (income) {
+      chart.data.labels = income.labels;
+      chart.data.datasets[0].data = income.data;
+      chart.data.datasets[0].label = weekly ? 'Weekly Income' : 'Monthly Income';
+      chart.update();
+    })
+    .catch(function () {
+      // Keep the chart as it is; a bad year is answered with 400
+    });
+}
+
+periodSelect.addEventListener('change', loadIncome);
+yearInput.addEventListener('change', loadIncome);
+weeksSelect.addEventListener('change', loadIncome);
@@ -0,0 +1,87 @@
+// Live operations board: rows pushed by the server over server-sent events (truck_app_web.live)
+
+(function() {
+  var status = document.getElementById("live-status");
+  var rows = document.getElementById("live-events");
+  var MAX_ROWS = 200;
+  var LABELS = {
+    house_shifting: "House Shifting",
+    vehicle_shifting: "Vehicle Shifting",
+    warehouse_shifting: "Warehouse Shifting"
+  };
+  var DETAIL_PAGES = {
+    house_shifting: "/web/HouseShifting_Details/",
+    vehicle_shifting: "/web/VehicleShifting_Details/",
+    warehouse_shifting: "/web/WarehouseShifting_Details/"
+  };
+
+  function setStatus(text, className) {
+    status.textContent = text;
+    status.className = "live-status " + className;
+  }
+
+  function cell(row, text, href) {
+    var td = row.insertCell();
+    if (href) {
+      var link = document.createElement("a");
+      link.href = href;
+      link.textContent = text;
+      td.appendChild(link);
+    } else {
+      td.textContent = text == null ? "" : text;
+    }
+  }
+
+  function describe(name, data) {
+    if (name === "order") {
+      return [data.payment_method, data.total_amount].filter(Boolean).join(", ");
+    }
+    if (name === "completion") {
+      return (data.completed ? "Completed: " : "Reopened: ") + data.ids.length + " booking(s)";
+    }
+    if (data.completed_date !== undefined && data.ids) {
+      return "Completed date set to " + data.completed_date;
+    }
+    return [data.pickup_location, data.completed ? "Completed" : "Pending"].filter(Boolean).join(", ");
+  }
+
+  function addRow(name, data) {
+    var row = rows.insertRow(0);
+    row.className = "fresh";
+    cell(row, new Date().toLocaleTimeString());
+    cell(row, name.charAt(0).toUpperCase() + name.slice(1));
+    cell(row, LABELS[data.kind] || data.kind);
+    if (data.id && DETAIL_PAGES[data.kind] && name !== "order") {
+      cell(row, data.booking_id || data.id, DETAIL_PAGES[data.kind] + data.id);
+    } else {
+      cell(row, data.booking_id || (data.ids || []).join(", "));
+    }
+    cell(row, describe(name, data));
+    while (rows.rows.length > MAX_ROWS) {
+      rows.deleteRow(rows.rows.length - 1);
+    }
+  }
+
+  if (!window.EventSource) {
+    setStatus("This browser cannot show live updates.", "offline");
+    return;
+  }
+
+  var source = new EventSource(status.dataset.eventsUrl);
+  source.onopen = function() {
+    setStatus("Live", "connected");
+  };
+  source.onerror = function() {
+    // EventSource reconnects by itself unless the server answered without a stream
+    if (source.readyState === EventSource.CLOSED) {
+      setStatus("Live updates are not available on this server.", "offline");
+    } else {
+      setStatus("Reconnecting...", "");
+    }
+  };
+  ["booking", "status", "completion", "order"].forEach(function(name) {
+    source.addEventListener(name, function(event) {
+      addRow(name, JSON.parse(event.data));
+    });
+  });
+})();
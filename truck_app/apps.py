@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class TruckAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'truck_app'
+
+    def ready(self):
+        from django.core import checks
+
+        from . import caching, metrics, search, sms
+        checks.register(sms.check_api_key)
+        caching.connect_signals()
+        metrics.connect_signals()
+        search.connect_signals()
@@ -0,0 +1,213 @@
+"""Two-tier cache for read endpoints, invalidated by model signals.
+
+A small in-process LRU sits in front of the shared cache (CACHES[CACHE_SHARED_ALIAS]): a
+file-based cache by default, Django's Redis backend when REDIS_URL is set. Values are stored under
+CacheKeys, built by the typed builders below, which name the tags a value depends on: a model row
+(instance_tag) or everything of one customer (user_tag).
+
+Each tag has a version number kept in the shared tier, and the version is part of every stored
+key. post_save/post_delete on the booking models bump the versions of the tags the row touches, so
+a write in any process makes every process, local tiers included, stop finding the old value. A
+cached read therefore costs one shared lookup of the tag versions and, on a local hit, nothing else.
+
+Treat cached values as read-only: the local tier hands the same object to every caller.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import ChosenShiftingVehicle
+from .models import HouseShiftingDetails
+from .models import HouseShiftingProducts
+from .models import OrderBooking
+from .models import UserBookingCounter
+from .models import UserProfile
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+from .models import WareHouseStoringProducts
+from .routers import primary_reads
+from .signals import shifting_details_updated
+
+KEY_PREFIX = 'truck_app:cache'
+TAG_PREFIX = 'truck_app:tag'
+
+# Models whose writes invalidate cached values; rows with a user_id also invalidate that customer
+INVALIDATING_MODELS = (
+    UserProfile,
+    UserBookingCounter,
+    OrderBooking,
+    HouseShiftingDetails,
+    HouseShiftingProducts,
+    VehicleShiftingDetails,
+    ChosenShiftingVehicle,
+    WareHouseStorageDetails,
+    WareHouseStoringProducts,
+)
+
+MISSING = object()
+
+
+class CacheKey:
+    """A cache key and the tags whose invalidation drops it"""
+    def __init__(self, name, *parts, tags=()):
+        self.key = ':'.join([name, *(str(part) for part in parts)])
+        self.tags = tuple(tags)
+
+    def __repr__(self):
+        return '<CacheKey %s %s>' % (self.key, self.tags)
+
+
+def instance_tag(model, pk):
+    return '%s:%s' % (model._meta.label_lower, pk)
+
+
+def user_tag(user_id):
+    return 'user:%s' % user_id
+
+
+def instance_key(model, pk, *parts):
+    """Key of a value computed from one row"""
+    return CacheKey(model._meta.label_lower, pk, *parts, tags=[instance_tag(model, pk)])
+
+
+def user_key(name, user_id, *parts):
+    """Key of a value computed from a customer's profile, counters and bookings"""
+    return CacheKey(name, user_id, *parts, tags=[user_tag(user_id)])
+
+
+def rows_key(name, *rows, parts=()):
+    """Key of a value computed from several rows, given as (model, pk) pairs"""
+    return CacheKey(name, *(pk for model, pk in rows), *parts,
+                    tags=[instance_tag(model, pk) for model, pk in rows])
+
+
+class LocalLRU:
+    """Thread-safe, size-bounded in-process cache with a per-entry expiry"""
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalLRU(getattr(settings, 'CACHE_LOCAL_MAX_ENTRIES', 1000))
+
+
+def shared_cache():
+    return caches[getattr(settings, 'CACHE_SHARED_ALIAS', 'default')]
+
+
+def _new_version():
+    # Never reuses an old number, even when the shared tier lost the tag
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    if not tags:
+        return []
+    shared = shared_cache()
+    tag_keys = ['%s:%s' % (TAG_PREFIX, tag) for tag in tags]
+    versions = shared.get_many(tag_keys)
+    for tag_key in tag_keys:
+        if tag_key not in versions:
+            version = _new_version()
+            if not shared.add(tag_key, version, timeout=None):
+                version = shared.get(tag_key, version)
+            versions[tag_key] = version
+    return [versions[tag_key] for tag_key in tag_keys]
+
+
+def _bump(tags):
+    # A fresh version rather than incr(), which the file-based backend re-saves with the default timeout
+    shared_cache().set_many({'%s:%s' % (TAG_PREFIX, tag): _new_version() for tag in tags}, timeout=None)
+
+
+def invalidate(*tags):
+    """Drop every value filed under tags, once the current transaction commits.
+
+    Before the commit another request could still read the old rows and cache them again.
+    """
+    if tags:
+        transaction.on_commit(partial(_bump, tags))
+
+
+def invalidate_users(user_ids):
+    invalidate(*(user_tag(user_id) for user_id in user_ids))
+
+
+def cached(cache_key, build, timeout=None):
+    """The value stored under cache_key, calling build() and storing its result on a miss.
+
+    timeout defaults to CACHE_DEFAULT_TIMEOUT; the local tier keeps values at most
+    CACHE_LOCAL_TIMEOUT seconds, which bounds its memory rather than its freshness.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'CACHE_DEFAULT_TIMEOUT', 300)
+    versions = tag_versions(cache_key.tags)
+    full_key = ':'.join([KEY_PREFIX, cache_key.key, *(str(version) for version in versions)])
+    local_timeout = min(timeout, getattr(settings, 'CACHE_LOCAL_TIMEOUT', 60))
+
+    value = local_cache.get(full_key)
+    if value is not MISSING:
+        return value
+    shared = shared_cache()
+    value = shared.get(full_key, MISSING)
+    if value is MISSING:
+        # A replica may not have the write that just invalidated this key yet
+        with primary_reads():
+            value = build()
+        shared.set(full_key, value, timeout=timeout)
+    local_cache.set(full_key, value, local_timeout)
+    return value
+
+
+def row_tags(instance):
+    tags = [instance_tag(type(instance), instance.pk)]
+    user_id = getattr(instance, 'user_id', None)
+    if user_id is not None:
+        tags.append(user_tag(user_id))
+    return tags
+
+
+def row_changed(sender, instance, **kwargs):
+    invalidate(*row_tags(instance))
+
+
+def rows_updated(sender, ids, **kwargs):
+    invalidate(*(instance_tag(sender, pk) for pk in ids))
+
+
+def connect_signals():
+    for model in INVALIDATING_MODELS:
+        post_save.connect(row_changed, sender=model, dispatch_uid='cache_%s_saved' % model.__name__)
+        post_delete.connect(row_changed, sender=model, dispatch_uid='cache_%s_deleted' % model.__name__)
+    shifting_details_updated.connect(rows_updated, dispatch_uid='cache_shifting_details_updated')
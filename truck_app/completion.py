@@ -0,0 +1,70 @@
+import datetime
+from functools import partial
+
+import pytz
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import EMPTY_IDS, rebuild_counters
+from .models import HouseShiftingDetails
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+from .routers import primary_reads
+from .signals import shifting_details_updated
+
+SHIFTING_MODELS = (HouseShiftingDetails, VehicleShiftingDetails, WareHouseStorageDetails)
+
+RECONCILED_KEY = 'truck_app:completion_reconciled'
+
+
+def completion_now():
+    """Current wall-clock time in COMPLETION_TIME_ZONE, labelled with the default time zone.
+
+    The admin detail pages save completed_date straight from a datetime-local input, so the stored
+    value carries Asia/Kolkata wall-clock digits. Comparing against the same digits keeps the
+    behaviour of the old per-row date and time checks.
+    """
+    wall_clock = datetime.datetime.now(pytz.timezone(getattr(settings, 'COMPLETION_TIME_ZONE', 'Asia/Kolkata')))
+    return timezone.make_aware(wall_clock.replace(tzinfo=None))
+
+
+def reconcile_completion(now=None):
+    """Set completed from completed_date on every shifting table with set-based updates.
+
+    Rows whose completed_date has passed become completed, completed rows whose date was moved into the
+    future are reopened. Returns the number of rows changed.
+    """
+    now = now or completion_now()
+    changed = 0
+    # The admin lists call this under replica_reads; the rows to update must come from the primary,
+    # not from a replica that has not caught up with them yet
+    with primary_reads(), transaction.atomic():
+        affected_user_ids = set()
+        for model in SHIFTING_MODELS:
+            due = model.objects.filter(Q(completed=False) | Q(completed__isnull=True), completed_date__lte=now)
+            reopened = model.objects.filter(completed=True, completed_date__gt=now)
+            for rows, completed in ((due, True), (reopened, False)):
+                # Collected before the update, since afterwards the rows no longer match
+                matched = list(rows.values_list('id', 'user_id', 'booking_id'))
+                if not matched:
+                    continue
+                affected_user_ids.update(user_id for row_id, user_id, booking_id in matched
+                                         if booking_id is not None and booking_id not in EMPTY_IDS)
+                changed += rows.update(completed=completed)
+                transaction.on_commit(partial(shifting_details_updated.send, sender=model,
+                                              ids=[row_id for row_id, user_id, booking_id in matched],
+                                              values={'completed': completed}))
+        if affected_user_ids:
+            rebuild_counters(user_ids=affected_user_ids)
+    return changed
+
+
+def maybe_reconcile_completion():
+    """Run reconcile_completion at most once per COMPLETION_RECONCILE_INTERVAL seconds across workers"""
+    interval = getattr(settings, 'COMPLETION_RECONCILE_INTERVAL', 60)
+    if cache.add(RECONCILED_KEY, 1, timeout=interval):
+        return reconcile_completion()
+    return None
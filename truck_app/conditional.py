@@ -0,0 +1,161 @@
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+from .caching import tag_versions, user_tag
+from .models import ChosenShiftingVehicle
+from .models import HouseShiftingProducts
+from .models import OrderBooking
+from .models import WareHouseStoringProducts
+from .profiles import cached_user_profile_details
+from .routers import primary_reads
+from .summaries import sparse_key
+
+
+def make_etag(*parts):
+    """Build a quoted ETag from version parts such as row ids and updated timestamps"""
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def request_json(request):
+    """The JSON object in the body of request, or None when it is missing, malformed or not an object"""
+    try:
+        request_data = json.loads(request.body)
+    except ValueError:
+        return None
+    return request_data if isinstance(request_data, dict) else None
+
+
+def has_secret_key(request):
+    return request.headers.get('Authorization') == settings.SECRET_KEY
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, so W/ tags added by CompressionMiddleware still match
+    etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+    return '*' in etags or etag in etags
+
+
+def conditional_post(etag_func):
+    """Answer If-None-Match with 304 Not Modified before the view runs.
+
+    Works like django.views.decorators.http.condition, but for the app's POST read endpoints, where
+    Django would answer 412. etag_func(request) must only do cheap version lookups and returns None
+    when no ETag can be computed, in which case the view runs as usual. Async views are supported;
+    etag_func stays sync and runs in a thread for them.
+
+    The version lookups read the primary, and a view that gets an ETag does too: the ETag has to
+    describe the body it is sent with, and cached bodies are built on the primary. Otherwise a
+    replica that has not caught up with a write yet would answer 304 to a client holding the old body.
+    """
+    def primary_etag(request):
+        with primary_reads():
+            return etag_func(request)
+
+    def not_modified(etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    def tagged(response, etag):
+        if etag is not None and response is not None and response.status_code == 200:
+            response.setdefault('ETag', etag)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def ainner(request, *args, **kwargs):
+                etag = await sync_to_async(primary_etag)(request) if request.method == 'POST' else None
+                if etag is None:
+                    return await view(request, *args, **kwargs)
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+                with primary_reads():
+                    return tagged(await view(request, *args, **kwargs), etag)
+            return ainner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            etag = primary_etag(request) if request.method == 'POST' else None
+            if etag is None:
+                return view(request, *args, **kwargs)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            with primary_reads():
+                return tagged(view(request, *args, **kwargs), etag)
+        return inner
+    return decorator
+
+
+def user_profile_etag(request):
+    request_data = request_json(request)
+    if not has_secret_key(request) or not request_data or "user_id" not in request_data:
+        return None
+    user_id = request_data["user_id"]
+    # Hashes the cached response data, so a cache hit answers without touching the database
+    user_profile_details = cached_user_profile_details(user_id)
+    if user_profile_details is None:
+        return None
+    return make_etag('UserProfile', user_id, json.dumps(user_profile_details, sort_keys=True, default=str))
+
+
+def booking_details_etag(request):
+    request_data = request_json(request)
+    if not has_secret_key(request) or not request_data or "user_id" not in request_data:
+        return None
+    user_id = request_data["user_id"]
+    # The history lists every order of the user: count, newest id and last update catch inserts,
+    # deletes and update() calls, the user's cache tag version (bumped by every save and delete)
+    # catches edits that leave updated alone
+    orders_version = OrderBooking.objects.filter(user_id=user_id).order_by() \
+        .aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated'))
+    return make_etag('BookingDetails', user_id, sparse_key(request_data), orders_version['count'],
+                     orders_version['last_id'], orders_version['updated'], *tag_versions([user_tag(user_id)]))
+
+
+def house_shifting_summary_etag(request):
+    request_data = request_json(request)
+    if not request_data:
+        return None
+    version = HouseShiftingProducts.objects.filter(id=request_data.get("house_shifting_product_id")) \
+        .values_list('house_shifting_details_id', 'updated', 'house_shifting_details__updated').first()
+    # Mirror the view's own id check so a mismatched pair never gets an ETag
+    if version is None or str(version[0]) != request_data.get("house_shifting_details_id"):
+        return None
+    return make_etag('HouseShiftingSummary', request_data.get("house_shifting_product_id"),
+                     sparse_key(request_data), *version)
+
+
+def vehicle_shifting_summary_etag(request):
+    request_data = request_json(request)
+    if not request_data:
+        return None
+    version = ChosenShiftingVehicle.objects.filter(id=request_data.get("chosen_shifting_vehicle_id")) \
+        .values_list('vehicle_shifting_details_id', 'updated', 'vehicle_shifting_details__updated').first()
+    if version is None or str(version[0]) != request_data.get("vehicle_shifting_details_id"):
+        return None
+    return make_etag('VehicleShiftingSummary', request_data.get("chosen_shifting_vehicle_id"),
+                     sparse_key(request_data), *version)
+
+
+def warehouse_summary_etag(request):
+    request_data = request_json(request)
+    if not request_data:
+        return None
+    version = WareHouseStoringProducts.objects.filter(id=request_data.get("warehouse_storing_products_id")) \
+        .values_list('warehouse_storage_detail_id', 'updated', 'warehouse_storage_detail__updated').first()
+    if version is None or str(version[0]) != request_data.get("warehouse_storage_details_id"):
+        return None
+    return make_etag('WareHouseSummary', request_data.get("warehouse_storing_products_id"),
+                     sparse_key(request_data), *version)
@@ -0,0 +1,151 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .caching import invalidate_users
+from .models import CustomUser as User
+from .models import HouseShiftingDetails
+from .models import OrderBooking
+from .models import UserBookingCounter
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+
+HOUSE_SHIFTING = 'house_shifting'
+VEHICLE_SHIFTING = 'vehicle_shifting'
+WAREHOUSE = 'warehouse'
+
+# OrderBooking id column that marks each booking kind, in the order order_booking checks them
+BOOKING_KIND_FIELDS = (
+    (HOUSE_SHIFTING, 'house_shifting_details_id'),
+    (VEHICLE_SHIFTING, 'vehicle_shifting_details_id'),
+    (WAREHOUSE, 'ware_house_storing_details_id'),
+)
+
+COUNTER_FIELDS = {
+    HOUSE_SHIFTING: 'house_shifting_bookings',
+    VEHICLE_SHIFTING: 'vehicle_shifting_bookings',
+    WAREHOUSE: 'warehouse_bookings',
+}
+
+EMPTY_IDS = ('', ' ')
+
+
+def _has_id(value):
+    return value is not None and str(value) not in EMPTY_IDS
+
+
+def booking_kind(order_booking):
+    """Return the shifting kind an OrderBooking belongs to, or None"""
+    for kind, field in BOOKING_KIND_FIELDS:
+        if _has_id(getattr(order_booking, field)):
+            return kind
+    return None
+
+
+def _kind_filters():
+    """Q filters matching booking_kind(), for use in conditional aggregation"""
+    filters = {}
+    earlier = Q()
+    for kind, field in BOOKING_KIND_FIELDS:
+        has_id = Q(**{field + '__isnull': False}) & ~Q(**{field + '__in': EMPTY_IDS})
+        filters[kind] = earlier & has_id
+        earlier = earlier & ~has_id
+    return filters
+
+
+def _seed_counter(user_id):
+    """Create the user's counter from their orders, the one being placed included; False if it exists.
+
+    A user who ordered before counters existed has no row yet, and starting it at zero would
+    undercount them until the next rebuild.
+    """
+    try:
+        with transaction.atomic():
+            _rebuild(Q(user_id=user_id), batch_size=1)
+    except IntegrityError:
+        # A concurrent first order created it, without seeing this one
+        return False
+    return True
+
+
+def record_booking(order_booking):
+    """Count a newly placed order; call inside the transaction that saves it"""
+    now = timezone.localtime(timezone.now())
+    counter = UserBookingCounter.objects.filter(user_id=order_booking.user_id).first()
+    if counter is None:
+        if _seed_counter(order_booking.user_id):
+            return
+        counter = UserBookingCounter.objects.get(user_id=order_booking.user_id)
+    updates = {'total_bookings': F('total_bookings') + 1,
+               'pending_bookings': F('pending_bookings') + 1,
+               'updated': now}
+    kind = booking_kind(order_booking)
+    if kind is not None:
+        updates[COUNTER_FIELDS[kind]] = F(COUNTER_FIELDS[kind]) + 1
+    UserBookingCounter.objects.filter(id=counter.id).update(**updates)
+    invalidate_users([order_booking.user_id])
+
+
+def _rebuild(user_filter, batch_size):
+    now = timezone.localtime(timezone.now())
+    kind_filters = _kind_filters()
+    aggregates = {COUNTER_FIELDS[kind]: Count('id', filter=kind_filter)
+                  for kind, kind_filter in kind_filters.items()}
+    totals = {row['user_id']: row for row in
+              OrderBooking.objects.filter(user_filter).order_by().values('user_id')
+              .annotate(total_bookings=Count('id'), **aggregates)}
+
+    completed = {}
+    for model in (HouseShiftingDetails, VehicleShiftingDetails, WareHouseStorageDetails):
+        rows = model.objects.filter(user_filter, completed=True, booking_id__isnull=False) \
+            .exclude(booking_id__in=EMPTY_IDS)
+        for row in rows.order_by().values('user_id').annotate(count=Count('id')):
+            completed[row['user_id']] = completed.get(row['user_id'], 0) + row['count']
+
+    existing = {counter.user_id: counter for counter in UserBookingCounter.objects.filter(user_filter)}
+
+    to_create = []
+    to_update = []
+    for user_id in set(totals) | set(existing):
+        row = totals.get(user_id, {})
+        total = row.get('total_bookings', 0)
+        completed_count = min(completed.get(user_id, 0), total)
+        counter = existing.get(user_id)
+        if counter is None:
+            counter = UserBookingCounter(user_id=user_id, created=now)
+            to_create.append(counter)
+        else:
+            to_update.append(counter)
+        counter.total_bookings = total
+        for field in COUNTER_FIELDS.values():
+            setattr(counter, field, row.get(field, 0))
+        counter.completed_bookings = completed_count
+        counter.pending_bookings = total - completed_count
+        counter.updated = now
+
+    with transaction.atomic():
+        UserBookingCounter.objects.bulk_create(to_create, batch_size=batch_size)
+        UserBookingCounter.objects.bulk_update(to_update,
+                                               ['total_bookings', 'completed_bookings', 'pending_bookings',
+                                                'updated'] + list(COUNTER_FIELDS.values()),
+                                               batch_size=batch_size)
+        invalidate_users([counter.user_id for counter in to_create + to_update])
+    return len(to_create) + len(to_update)
+
+
+def rebuild_counters(user_ids=None, batch_size=1000):
+    """Recompute counters from the booking tables in bulk and return how many rows were written.
+
+    Without user_ids every user is rebuilt, batch_size users at a time, so memory stays flat on large tables.
+    """
+    if user_ids is not None:
+        return _rebuild(Q(user_id__in=user_ids), batch_size)
+
+    written = 0
+    last_id = 0
+    while True:
+        ids = list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return written
+        written += _rebuild(Q(user_id__gte=ids[0], user_id__lte=ids[-1]), batch_size)
+        last_id = ids[-1]
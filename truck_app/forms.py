@@ -5,7 +5,6 @@ from .models import CustomUser
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
-        print("CustomUserCreationForm")
         model = CustomUser
         fields = ['phone_number', 'password1', 'password2']
 
@@ -0,0 +1,87 @@
+"""Structured logging that never blocks a request.
+
+The app loggers (truck_app, truck_app_web, v1; see LOGGING in the settings) hand their records to
+BackgroundHandler, which queues them for a thread that formats them with JsonFormatter and writes
+one JSON object per line. When the queue is full records are dropped, not waited for.
+
+Log fields with ``extra``: ``logger.info("OTP sent", extra={"register_id": register.id})``.
+Per-row events are logged at DEBUG, which SamplingFilter thins out. Never log passwords, OTPs or
+the SMS API key.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else on a record came from extra
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through only a rate (0 to 1) of the records at or below level; records above it all pass"""
+
+    def __init__(self, rate=1.0, level='DEBUG'):
+        super().__init__()
+        self.rate = rate
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def filter(self, record):
+        return record.levelno > self.level or random.random() < self.rate
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """Queue records for a QueueListener thread that writes them to stream (stderr by default).
+
+    Records that do not fit in the queue (queue_size) are counted in dropped rather than waited for.
+    The formatter set on this handler is used by the writing thread.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Freeze the message now, its arguments may change once the request moves on; the writer formats it
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # The traceback would keep the request's frames alive until the record is written
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Writes what is still queued; logging.shutdown() calls this at exit
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
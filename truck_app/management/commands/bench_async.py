@@ -0,0 +1,180 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from truck_app.models import CustomUser as User
+from truck_app.models import HouseShiftingProducts
+from truck_app.models import OrderBooking
+from truck_app.models import Register
+from truck_app import sms
+from .bench_connections import percentile
+
+STUB_OTP = "123456"
+
+
+def sms_stub(latency):
+    """A local stand-in for the SMS provider that answers every OTP request after latency seconds"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # end_headers() and the body are separate writes; with Nagle's algorithm on, the body would wait
+        # for the client's delayed ACK and every call would take ~40 ms whatever the latency
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps({"Status": "Success", "Details": "stub", "OTP": STUB_OTP}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wsgi_call(handler, factory, path, body):
+    environ = factory.post(path, body, content_type='application/json',
+                           HTTP_AUTHORIZATION=settings.SECRET_KEY).environ
+    status = []
+    response = handler(environ, lambda response_status, headers, exc_info=None: status.append(response_status))
+    try:
+        b''.join(response)
+    finally:
+        # Sends request_finished, like a WSGI server does
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_call(application, path, body):
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+             'headers': [(b'host', b'localhost'), (b'content-type', b'application/json'),
+                         (b'content-length', str(len(body)).encode()),
+                         (b'authorization', settings.SECRET_KEY.encode())],
+             'client': ('127.0.0.1', 50000), 'server': ('localhost', 80)}
+    messages = [{'type': 'http.request', 'body': body.encode(), 'more_body': False}]
+    status = []
+    finished = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = ("Compare the async/ endpoints served by the ASGI application from one event loop with the "
+            "sync endpoints served by the WSGI handler from a thread pool, in this one process, against a "
+            "local SMS stub with a fixed latency")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and server")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="WSGI worker threads, i.e. sync requests in flight (default: 8)")
+        parser.add_argument('--concurrency', type=int, default=100, help="ASGI requests in flight (default: 100)")
+        parser.add_argument('--sms-latency', type=float, default=0.2,
+                            help="Seconds the SMS stub takes to answer (default: 0.2)")
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            choices=['otp', 'verify', 'summary', 'history'], help="Endpoints to run (default: all)")
+
+    def endpoints(self):
+        register = Register.objects.filter(
+            user_phone_number__in=User.objects.values('phone_number')).order_by('id').first()
+        products = HouseShiftingProducts.objects.select_related('house_shifting_details').order_by('id').first()
+        user_id = OrderBooking.objects.values_list('user_id', flat=True).first()
+        if register is None or products is None or user_id is None:
+            raise CommandError("Needs a registered user, a house shifting booking and an order; load some data first")
+        return {
+            'otp': ('Resend_otp', 'AsyncResend_otp', {"phone_number": register.user_phone_number, "user_id": 0}),
+            'verify': ('verify_otp', 'AsyncVerify_otp', {"register_id": register.id, "otp": STUB_OTP}),
+            'summary': ('HouseShiftingSummaryDetails', 'AsyncHouseShiftingSummaryDetails', {
+                "house_shifting_details_id": str(products.house_shifting_details_id),
+                "house_shifting_product_id": str(products.id), "exclude_empty": False}),
+            'history': ('BookingDetails', 'AsyncBookingDetails', {"user_id": user_id}),
+        }
+
+    def run_wsgi(self, path, body, requests, threads):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+
+        def call(_):
+            start = time.perf_counter()
+            status = wsgi_call(handler, factory, path, body)
+            return status, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(pool.map(call, range(requests)))
+
+    def run_asgi(self, path, body, requests, concurrency):
+        from truckapp_project.asgi import application
+
+        async def run():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def call():
+                async with slots:
+                    start = time.perf_counter()
+                    status = await asgi_call(application, path, body)
+                    return status, time.perf_counter() - start
+
+            try:
+                return await asyncio.gather(*(call() for _ in range(requests)))
+            finally:
+                await sms.aclose()
+
+        return asyncio.run(run())
+
+    def handle(self, *args, **options):
+        endpoints = self.endpoints()
+        stub = sms_stub(options['sms_latency'])
+        sms_url = 'http://127.0.0.1:%s' % stub.server_address[1]
+
+        self.stdout.write("%-10s %-5s %9s %9s %9s %9s %12s %7s" % (
+            "endpoint", "mode", "in flight", "req/s", "p50 ms", "p95 ms", "cpu ms/req", "errors"))
+        try:
+            # Snapshots of the benchmark's metrics go to a directory of their own, not the app's
+            with tempfile.TemporaryDirectory() as metrics_dir, \
+                    override_settings(SMS_API_URL=sms_url, SMS_API_KEY='stub', DEBUG=False, METRICS_DIR=metrics_dir):
+                for name in options['endpoints'] or endpoints:
+                    sync_name, async_name, data = endpoints[name]
+                    body = json.dumps(data)
+                    runs = (('wsgi', reverse(sync_name), options['threads'], self.run_wsgi),
+                            ('asgi', reverse(async_name), options['concurrency'], self.run_asgi))
+                    for mode, path, in_flight, run in runs:
+                        cpu, wall = time.process_time(), time.perf_counter()
+                        results = run(path, body, options['requests'], in_flight)
+                        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+                        timings = [elapsed for status, elapsed in results]
+                        errors = sum(1 for status, elapsed in results if status != 200)
+                        self.stdout.write("%-10s %-5s %9d %9.1f %9.2f %9.2f %12.2f %7d" % (
+                            name, mode, in_flight, len(results) / wall, percentile(timings, 0.5) * 1000,
+                            percentile(timings, 0.95) * 1000, cpu / len(results) * 1000, errors))
+        finally:
+            stub.shutdown()
@@ -0,0 +1,81 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+
+from truck_app.models import OrderBooking
+from truck_app.models import UserProfile
+
+ENDPOINTS = ("/api/base/UserProfile/", "/api/base/BookingDetails/")
+
+# Without a cache UserProfile/ is served from memory and never touches the database
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Time short API calls with and without persistent database connections. "
+            "Run it against the real database: the gain is the connection handshake it saves")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and setting")
+        parser.add_argument('--user', type=int, help="User id to request (default: a user with bookings)")
+        parser.add_argument('--max-age', type=int, action='append', dest='max_ages',
+                            help="CONN_MAX_AGE values to compare (default: 0 and 60)")
+        parser.add_argument('--with-cache', action='store_true',
+                            help="Leave the response cache on, which hides most queries")
+
+    def handle(self, *args, **options):
+        user_id = options['user'] or OrderBooking.objects.values_list('user_id', flat=True).first() \
+            or UserProfile.objects.values_list('user_id', flat=True).first()
+        if user_id is None:
+            raise CommandError("No users to request; pass --user or load some data first")
+
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        client = Client()
+        body = json.dumps({"user_id": user_id})
+        database = connections['default']
+        original_max_age = database.settings_dict['CONN_MAX_AGE']
+        caches = {} if options['with_cache'] else {'CACHES': NO_CACHE}
+
+        self.stdout.write("%-28s %8s %10s %10s %10s %12s" % ("endpoint", "max age", "mean ms", "p50 ms",
+                                                              "p95 ms", "connections"))
+        try:
+            with override_settings(**caches):
+                for endpoint in ENDPOINTS:
+                    for max_age in options['max_ages'] or [0, 60]:
+                        database.close()
+                        database.settings_dict['CONN_MAX_AGE'] = max_age
+                        opened.clear()
+                        timings = []
+                        for _ in range(options['requests']):
+                            start = time.perf_counter()
+                            # The test client skips these, a WSGI/ASGI handler runs them around every request
+                            close_old_connections()
+                            response = client.post(endpoint, body, content_type='application/json',
+                                                   HTTP_AUTHORIZATION=settings.SECRET_KEY)
+                            close_old_connections()
+                            timings.append(time.perf_counter() - start)
+                            if response.status_code != 200:
+                                raise CommandError("%s answered %s" % (endpoint, response.status_code))
+                        self.stdout.write("%-28s %8s %10.2f %10.2f %10.2f %12d" % (
+                            endpoint, max_age, statistics.mean(timings) * 1000, percentile(timings, 0.5) * 1000,
+                            percentile(timings, 0.95) * 1000, len(opened)))
+        finally:
+            database.settings_dict['CONN_MAX_AGE'] = original_max_age
+            connection_created.disconnect(count_connection)
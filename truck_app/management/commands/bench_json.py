@@ -0,0 +1,100 @@
+import datetime
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from truck_app import responses
+from truck_app.summaries import INVENTORY_CATEGORIES
+
+
+def summary_payload(rng):
+    """A house shifting summary response with a sparse inventory, like the app usually sends"""
+    payload = {'status_code': 200,
+               'message': 'User House Shifting Details',
+               "user_id": rng.randint(1, 100000),
+               "house_shifting_details_id": str(rng.randint(1, 100000)),
+               "shifting_type": "House Shifting",
+               "moving_datetime": "2023-06-15 10:30:00",
+               "pickup_location": "Koramangala, Bengaluru, Karnataka",
+               "pickup_address": "No 12, 4th Cross, 5th Block, Koramangala",
+               "pickup_floor": "3",
+               "pickup_lift": "Yes",
+               "drop_location": "Whitefield, Bengaluru, Karnataka",
+               "drop_address": "Flat 402, Prestige Shantiniketan, Whitefield",
+               "drop_floor": "4",
+               "drop_lift": "No",
+               "product_amount": str(rng.randint(1000, 50000))}
+    for category, fields in INVENTORY_CATEGORIES.items():
+        payload[category] = {field: (str(rng.randint(1, 4)) if rng.random() < 0.1 else None) for field in fields}
+    return payload
+
+
+def booking_details_payload(rng, bookings):
+    """A BookingDetails response: OrderBooking.values() rows with datetimes"""
+    now = timezone.now()
+    rows = []
+    for index in range(bookings):
+        created = now - datetime.timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+        rows.append({"id": index + 1,
+                     "user_id": 1,
+                     "booking_id": "APM00%s" % (index + 1),
+                     "house_shifting_details_id": str(rng.randint(1, 100000)),
+                     "house_shifting_product_id": str(rng.randint(1, 100000)),
+                     "vehicle_shifting_details_id": None,
+                     "chosen_shifting_vehicle_details_id": "",
+                     "ware_house_storing_details_id": None,
+                     "ware_house_storing_products_id": None,
+                     "booking_datetime": created.strftime("%Y-%m-%d %H:%M:%S"),
+                     "shifting_type": "House Shifting",
+                     "payment_method": "COD",
+                     "total_amount": Decimal(rng.randint(100000, 5000000)) / 100,
+                     "created": created,
+                     "updated": created})
+    return {'status_code': 200, 'message': 'user booking details', "booking_details": rows}
+
+
+def time_encoder(encode, payload, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(payload)
+    return (time.perf_counter() - start) / iterations
+
+
+class Command(BaseCommand):
+    help = "Compare stdlib json and the fast encoder used by FastJsonResponse on realistic API payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=50,
+                            help="Rows in the BookingDetails payload")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if responses.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, FastJsonResponse falls back to stdlib json"))
+            return
+
+        rng = random.Random(options['seed'])
+        payloads = {"summary": summary_payload(rng),
+                    "booking_details": booking_details_payload(rng, options['bookings'])}
+
+        def stdlib(data):
+            return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+        def fast(data):
+            return responses.orjson.dumps(data, default=responses._default, option=responses.ORJSON_OPTIONS)
+
+        self.stdout.write("%-16s %8s %12s %12s %8s" % ("payload", "bytes", "stdlib us", "fast us", "speedup"))
+        for name, payload in payloads.items():
+            if json.loads(stdlib(payload)) != json.loads(fast(payload)):
+                self.stdout.write(self.style.ERROR("%s: encoders disagree" % name))
+            stdlib_time = time_encoder(stdlib, payload, options['iterations'])
+            fast_time = time_encoder(fast, payload, options['iterations'])
+            self.stdout.write("%-16s %8d %12.1f %12.1f %7.1fx" % (name, len(stdlib(payload)),
+                                                                  stdlib_time * 1e6, fast_time * 1e6,
+                                                                  stdlib_time / fast_time))
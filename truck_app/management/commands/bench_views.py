@@ -0,0 +1,397 @@
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings, teardown_databases
+from django.utils import timezone
+
+import truck_app.views
+import truck_app_web.views
+import v1.views
+from truck_app.caching import local_cache
+from truck_app.counters import rebuild_counters
+from truck_app.models import ChosenShiftingVehicle
+from truck_app.models import CustomUser as User
+from truck_app.models import HouseShiftingProducts
+from truck_app.models import OrderBooking
+from truck_app.models import Register
+from truck_app.models import WareHouseStoringProducts
+from truck_app.revenue import rollup_revenue
+from truck_app.synthetic import PASSWORD, generate
+from .bench_async import sms_stub
+from .bench_connections import percentile
+from .loadtest import address, change, git_commit, inventory, moving_datetime, setup_test_databases
+
+# The admin pages only answer user id 9
+ADMIN_ID = 9
+ADMIN_PHONE_NUMBER = '9000000009'
+ADMIN_PASSWORD = 'Admin@bench1'
+
+# Data ends on a fixed day so every run reads the same rows
+DEFAULT_UNTIL = '2025-12-31'
+
+# Templates resolve static files without a collectstatic manifest
+BENCH_STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench_views',
+                            'OPTIONS': {'MAX_ENTRIES': 100000}}}
+
+# Views left out: they call external SMS APIs directly
+SKIPPED = {'v1.views.register': "sends SMS through Twilio", 'truck_app_web.views.testing': "calls the 2factor API"}
+
+
+def seed(users, until):
+    """The admin user and users synthetic users with their bookings, unless a kept database has them"""
+    if User.objects.filter(phone_number__startswith='5').count() >= users:
+        return
+    if not User.objects.filter(id=ADMIN_ID).exists():
+        User.objects.create_superuser(ADMIN_PHONE_NUMBER, password=ADMIN_PASSWORD, id=ADMIN_ID, first_name="Admin")
+    generate(users, seed=1, until=until)
+    rebuild_counters()
+    rollup_revenue()
+
+
+class Fixture:
+    """The seeded rows the requests point at: the customer with the most orders and one booking of each kind"""
+
+    def __init__(self):
+        user_id = OrderBooking.objects.values('user_id').annotate(orders=Count('id')).order_by('-orders', 'user_id') \
+            .values_list('user_id', flat=True).first()
+        if user_id is None:
+            raise CommandError("The database has no orders to benchmark with")
+        self.admin = User.objects.get(id=ADMIN_ID)
+        self.user = User.objects.get(id=user_id)
+        self.register = Register.objects.filter(user_phone_number=self.user.phone_number).first()
+        self.house = HouseShiftingProducts.objects.filter(house_shifting_details__user=self.user).first() \
+            or HouseShiftingProducts.objects.order_by('id').first()
+        self.vehicle = ChosenShiftingVehicle.objects.filter(vehicle_shifting_details__user=self.user).first() \
+            or ChosenShiftingVehicle.objects.order_by('id').first()
+        self.warehouse = WareHouseStoringProducts.objects.filter(warehouse_storage_detail__user=self.user).first() \
+            or WareHouseStoringProducts.objects.order_by('id').first()
+        # Registrations need numbers nobody has; synthetic users start with 5
+        self.new_phone_numbers = ('4%09d' % index for index in itertools.count())
+
+
+class Requests:
+    """Builds a fresh request per call, as the middleware would leave it"""
+
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.factory = RequestFactory()
+
+    def prepare(self, request, user=None):
+        request.user = user or AnonymousUser()
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def get(self, path, data=None, admin=False):
+        return lambda: self.prepare(self.factory.get(path, data), self.fixture.admin if admin else None)
+
+    def form(self, path, data, admin=False):
+        return lambda: self.prepare(self.factory.post(path, data), self.fixture.admin if admin else None)
+
+    def api(self, path, data):
+        """POST a JSON body; data may be a callable, for bodies that must differ per call"""
+        return lambda: self.prepare(self.factory.post(path, json.dumps(data() if callable(data) else data),
+                                                      content_type='application/json',
+                                                      HTTP_AUTHORIZATION=settings.SECRET_KEY))
+
+
+def cases(fixture):
+    """(name, view, request builder, view arguments) for every view; variants carry a [label]"""
+    f, r = fixture, Requests(fixture)
+    rng = random.Random(1)
+    user_id = f.user.id
+    house = {"house_shifting_details_id": str(f.house.house_shifting_details_id),
+             "house_shifting_product_id": str(f.house.id)}
+    vehicle = {"vehicle_shifting_details_id": str(f.vehicle.vehicle_shifting_details_id),
+               "chosen_shifting_vehicle_id": str(f.vehicle.id)}
+    warehouse = {"warehouse_storage_details_id": str(f.warehouse.warehouse_storage_detail_id),
+                 "warehouse_storing_products_id": str(f.warehouse.id)}
+    sparse = {"fields": ["pickup_location", "drop_location", "moving_datetime", "sofa", "bed"], "exclude_empty": True}
+    house_details = {"user_id": user_id, "shifting_type": "1", "house_shifting_type": "2 BHK",
+                     "moving_datetime": moving_datetime(rng), **address(rng, "pickup"), **address(rng, "drop")}
+    vehicle_details = {"user_id": user_id, "shifting_type": "2", "moving_datetime": moving_datetime(rng),
+                       **address(rng, "pickup"), **address(rng, "drop")}
+    warehouse_details = {"user_id": user_id, "shifting_type": "3", "moving_datetime": moving_datetime(rng),
+                         "storing_days": "30", **address(rng, "pickup")}
+    products = inventory(rng)
+    vehicle_choice = {"vehicle_shifting_details_id": f.vehicle.vehicle_shifting_details_id, "vehicle_name": "Tata Ace",
+                      "vehicle_model": "Mini Truck", "vehicle_image": "vehicles/mini_truck.png",
+                      "vehicle_amount": "1200"}
+    password = {"password1": PASSWORD, "password2": PASSWORD}
+
+    def registration():
+        phone_number = next(f.new_phone_numbers)
+        return {"user_name": "Bench User", "phone_number": phone_number, "email": "%s@example.com" % phone_number,
+                "terms_condition": "1", "privacy_policy": "1", **password}
+
+    app, web = truck_app.views, truck_app_web.views
+    return [
+        (app.webpage, r.get('/'), ()),
+        (app.login, r.api('/api/base/Login/', {"phone_number": f.user.phone_number, "password": PASSWORD}), ()),
+        (app.register, r.api('/api/base/Register/', registration), ()),
+        (app.verify_otp, r.api('/api/base/verify_otp/', {"register_id": f.register.id, "otp": f.register.otp}), ()),
+        (app.resend_otp, r.api('/api/base/Resend_otp/', {"phone_number": f.user.phone_number, "user_id": user_id}),
+         ()),
+        (app.verify_phone_number, r.api('/api/base/VerifyPhoneNumber/', {"phone_number": f.user.phone_number}), ()),
+        (app.reset_password, r.api('/api/base/ResetPassword/', {"register_id": f.register.id,
+                                                                "phone_number": f.user.phone_number, **password}), ()),
+        (app.user_profile, r.api('/api/base/UserProfile/', {"user_id": user_id}), ()),
+        (app.booking_details, r.api('/api/base/BookingDetails/', {"user_id": user_id}), ()),
+        ((app.booking_details, 'sparse'), r.api('/api/base/BookingDetails/', {"user_id": user_id, **sparse}), ()),
+        ((app.user_booking_details, 'house'), r.api('/api/base/UserBookingDetails/', {"user_id": user_id, **house}),
+         ()),
+        ((app.user_booking_details, 'vehicle'), r.api('/api/base/UserBookingDetails/', {
+            "user_id": user_id, "vehicle_shifting_details_id": vehicle["vehicle_shifting_details_id"],
+            "chosen_shifting_vehicle_details_id": vehicle["chosen_shifting_vehicle_id"]}), ()),
+        ((app.user_booking_details, 'warehouse'), r.api('/api/base/UserBookingDetails/', {
+            "user_id": user_id, "warehouse_storing_details_id": warehouse["warehouse_storage_details_id"],
+            "warehouse_storing_products_id": warehouse["warehouse_storing_products_id"]}), ()),
+        (app.house_shifting_details, r.api('/api/base/HouseShiftingDetails/', house_details), ()),
+        (app.house_shifting_products, r.api('/api/base/HouseShiftingProducts/', {
+            "house_shifting_details_id": f.house.house_shifting_details_id, **products}), ()),
+        (app.house_shifting_summary_details, r.api('/api/base/HouseShiftingSummaryDetails/', house), ()),
+        ((app.house_shifting_summary_details, 'sparse'), r.api('/api/base/HouseShiftingSummaryDetails/',
+                                                               {**house, **sparse}), ()),
+        (app.vehicle_shifting_details, r.api('/api/base/VehicleShiftingDetails/', vehicle_details), ()),
+        (app.chosen_shifting_vehicle, r.api('/api/base/ChooseShiftingVehicle/', vehicle_choice), ()),
+        (app.vehicle_shifting_summary_details, r.api('/api/base/VehicleShiftingSummaryDetails/', vehicle), ()),
+        (app.warehouse_storage_details, r.api('/api/base/WareHouseStorageDetails/', warehouse_details), ()),
+        (app.warehouse_storing_products, r.api('/api/base/WareHouseStoringProducts/', {
+            "warehouse_storage_detail_id": f.warehouse.warehouse_storage_detail_id, **products}), ()),
+        (app.warehouse_summary_details, r.api('/api/base/WareHouseSummaryDetails/', warehouse), ()),
+        ((app.warehouse_summary_details, 'sparse'), r.api('/api/base/WareHouseSummaryDetails/',
+                                                          {**warehouse, **sparse}), ()),
+        (app.order_booking, r.api('/api/base/OrderBooking/', {
+            "user_id": user_id, "payment_method": "COD", "booking_datetime": moving_datetime(rng),
+            "shifting_type": "House Shifting", "total_amount": "12000", **house}), ()),
+
+        (v1.views.webpage, r.get('/api/v1/'), ()),
+        (v1.views.login, r.api('/api/v1/Login/', {"phone_number": f.user.phone_number, "password": PASSWORD}), ()),
+        (v1.views.user_profile, r.api('/api/v1/UserProfile/', {"user_id": user_id}), ()),
+        (v1.views.house_shifting_details, r.api('/api/v1/HouseShiftingDetails/', house_details), ()),
+        (v1.views.house_shifting_products, r.api('/api/v1/HouseShiftingProducts/', {
+            "house_shifting_details_id": f.house.house_shifting_details_id, **products}), ()),
+        (v1.views.house_shifting_summary_details, r.api('/api/v1/HouseShiftingSummaryDetails/', house), ()),
+        (v1.views.vehicle_shifting_details, r.api('/api/v1/VehicleShiftingDetails/', vehicle_details), ()),
+        (v1.views.chosen_shifting_vehicle, r.api('/api/v1/ChooseShiftingVehicle/', vehicle_choice), ()),
+        (v1.views.vehicle_shifting_summary_details, r.api('/api/v1/VehicleShiftingSummaryDetails/', vehicle), ()),
+        (v1.views.warehouse_storage_details, r.api('/api/v1/WareHouseStorageDetails/', warehouse_details), ()),
+        (v1.views.warehouse_selected_vehicle, r.api('/api/v1/WareHouseSelectedVehicle/', {
+            "warehouse_storage_detail_id": f.warehouse.warehouse_storage_detail_id, "vehicle_name": "Tata Ace",
+            "vehicle_type": "Mini Truck"}), ()),
+        (v1.views.warehouse_storing_products, r.api('/api/v1/WareHouseStoringProducts/', {
+            "warehouse_storage_detail_id": f.warehouse.warehouse_storage_detail_id, **products}), ()),
+        (v1.views.warehouse_summary_details, r.api('/api/v1/WareHouseSummaryDetails/', warehouse), ()),
+
+        (web.login, r.get('/web/login/'), ()),
+        ((web.login, 'post'), r.form('/web/login/', {"phone_number": ADMIN_PHONE_NUMBER,
+                                                     "password": ADMIN_PASSWORD}), ()),
+        (web.logout_view, r.get('/web/logout/', admin=True), ()),
+        (web.dashboard, r.get('/web/Dashboard/', admin=True), ()),
+        (web.revenue_chart, r.get('/web/RevenueChart/', admin=True), ()),
+        ((web.revenue_chart, 'weeks'), r.get('/web/RevenueChart/', {"period": "week"}, admin=True), ()),
+        (web.customer_details, r.get('/web/CustomerDetails/', admin=True), ()),
+        (web.export_bookings, r.get('/web/Export/house_shifting/', admin=True), ('house_shifting',)),
+        (web.live_board, r.get('/web/LiveBoard/', admin=True), ()),
+        (web.live_board_events, r.get('/web/LiveBoard/events/', admin=True), ()),
+        (web.house_shifting, r.get('/web/HouseShifting/', admin=True), ()),
+        (web.vehicle_shifting, r.get('/web/VehicleShifting/', admin=True), ()),
+        (web.warehouse_shifting, r.get('/web/WarehouseShifting/', admin=True), ()),
+        (web.house_shifting_details, r.get('/web/HouseShifting_Details/', admin=True),
+         (f.house.house_shifting_details_id,)),
+        (web.vehicle_shifting_details, r.get('/web/VehicleShifting_Details/', admin=True),
+         (f.vehicle.vehicle_shifting_details_id,)),
+        (web.warehouse_shifting_details, r.get('/web/WarehouseShifting_Details/', admin=True),
+         (f.warehouse.warehouse_storage_detail_id,)),
+        (web.verify_phone_number, r.get('/web/Verify_Phone_Number/'), ()),
+        (web.change_new_password, r.get('/web/ChangeNewPassword/'), (f.user.phone_number,)),
+    ]
+
+
+def case_name(view):
+    view, label = view if isinstance(view, tuple) else (view, None)
+    name = '%s.%s' % (view.__module__, view.__name__)
+    return '%s [%s]' % (name, label) if label else name
+
+
+def clear_caches():
+    local_cache.clear()
+    caches['default'].clear()
+
+
+def call(view, make_request, args):
+    response = view(make_request(), *args)
+    if response is not None and response.streaming:
+        # Streamed exports do their work while the server sends them
+        for chunk in response.streaming_content:
+            pass
+    return response
+
+
+def measure(view, make_request, args, repeat, warmup, cold):
+    """Time repeat calls, then count the queries and memory of one more under tracemalloc"""
+    for _ in range(warmup):
+        call(view, make_request, args)
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            clear_caches()
+        start = time.perf_counter()
+        call(view, make_request, args)
+        timings.append(time.perf_counter() - start)
+    if cold:
+        clear_caches()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            response = call(view, make_request, args)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'calls': repeat,
+            'mean_ms': statistics.mean(timings) * 1000,
+            'median_ms': statistics.median(timings) * 1000,
+            'min_ms': min(timings) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'queries': len(queries),
+            'peak_kb': peak / 1024,
+            'retained_kb': retained / 1024,
+            'status': getattr(response, 'status_code', None)}
+
+
+class Command(BaseCommand):
+    help = ("Call every view of truck_app.views, v1.views and truck_app_web.views directly with RequestFactory on "
+            "a seeded test database, and report per-call time, queries and memory allocated. Results are saved "
+            "as JSON; --compare shows the change against an earlier run, e.g. one on the previous commit")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help="Synthetic users to seed (default: 2000)")
+        parser.add_argument('--until', default=DEFAULT_UNTIL,
+                            help="Day the seeded data ends on (default: %s)" % DEFAULT_UNTIL)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed calls per view (default: 20)")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed calls first (default: 2)")
+        parser.add_argument('--cold', action='store_true', help="Clear the caches before every call")
+        parser.add_argument('--view', action='append', dest='views',
+                            help="Only views whose name contains this (can be repeated)")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the seeded test database between runs")
+        parser.add_argument('--output', help="Where to save the results (default: benchmarks/<commit>-<time>.json)")
+        parser.add_argument('--compare', help="Results of an earlier run to compare with")
+        parser.add_argument('--threshold', type=float, default=10,
+                            help="Percent slower median that counts as a regression when comparing (default: 10)")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as results:
+                    baseline = json.load(results)
+            except (OSError, ValueError) as error:
+                raise CommandError("Cannot read %s: %s" % (options['compare'], error))
+        try:
+            until = timezone.make_aware(datetime.datetime.strptime(options['until'], '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError("--until must be a date like 2025-12-31")
+
+        verbosity = options['verbosity']
+        old_config = setup_test_databases(verbosity, options['keepdb'])
+        stub = sms_stub(0)
+        try:
+            with tempfile.TemporaryDirectory() as metrics_dir, \
+                    override_settings(SMS_API_URL='http://127.0.0.1:%s' % stub.server_address[1], SMS_API_KEY='stub',
+                                      DEBUG=False, CACHES=BENCH_CACHES, STATICFILES_STORAGE=BENCH_STATICFILES_STORAGE,
+                                      METRICS_DIR=metrics_dir):
+                local_cache.clear()
+                seed(options['users'], until)
+                # The views log every OTP and login; thousands of lines would bury the report
+                logging.disable(logging.INFO)
+                try:
+                    result = self.run(options)
+                finally:
+                    logging.disable(logging.NOTSET)
+        finally:
+            stub.shutdown()
+            teardown_databases(old_config, verbosity, keepdb=options['keepdb'])
+
+        self.report(result, baseline, options['threshold'])
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', '%s-%s.json' % (
+            result['commit'] or 'uncommitted', result['started'].replace(':', '')))
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as results:
+            json.dump(result, results, indent=2)
+        self.stdout.write("Saved to %s" % output)
+
+    def run(self, options):
+        fixture = Fixture()
+        views = {}
+        for view, make_request, args in cases(fixture):
+            name = case_name(view)
+            if options['views'] and not any(part in name for part in options['views']):
+                continue
+            view = view[0] if isinstance(view, tuple) else view
+            try:
+                views[name] = measure(view, make_request, args, options['repeat'], options['warmup'],
+                                      options['cold'])
+            except Exception as error:
+                views[name] = {'error': '%s: %s' % (type(error).__name__, error)}
+        return {'started': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'options': {key: options[key] for key in ('users', 'until', 'repeat', 'warmup', 'cold')},
+                'skipped': SKIPPED,
+                'views': views}
+
+    def report(self, result, baseline=None, threshold=10):
+        old_views = baseline['views'] if baseline else {}
+        header = "%-62s %9s %9s %8s %9s" % ("view", "median ms", "p95 ms", "queries", "peak KB")
+        if baseline:
+            header += " %8s %8s %8s" % ("time chg", "queries", "KB chg")
+        self.stdout.write(header)
+        regressions = []
+        for name, stats in result['views'].items():
+            if 'error' in stats:
+                self.stdout.write("%-62s %s" % (name, stats['error']))
+                continue
+            line = "%-62s %9.2f %9.2f %8d %9.1f" % (name, stats['median_ms'], stats['p95_ms'], stats['queries'],
+                                                     stats['peak_kb'])
+            old = old_views.get(name)
+            if old and 'error' not in old:
+                line += " %8s %8s %8s" % (change(stats['median_ms'], old['median_ms']),
+                                          "%+d" % (stats['queries'] - old['queries']),
+                                          change(stats['peak_kb'], old['peak_kb']))
+                # Medians: a single slow call (a GC pause, a disk flush) should not count as a regression
+                if stats['queries'] > old['queries'] or \
+                        stats['median_ms'] > old['median_ms'] * (1 + threshold / 100):
+                    regressions.append(name)
+                    line += " !"
+            self.stdout.write(line)
+        for name, reason in result['skipped'].items():
+            self.stdout.write("%-62s skipped: %s" % (name, reason))
+        if baseline:
+            if baseline.get('options') != result['options']:
+                self.stdout.write(self.style.WARNING("The runs used different options: %s then %s" % (
+                    baseline.get('options'), result['options'])))
+            self.stdout.write("Compared with %s (%s): %d regressions" % (
+                baseline['started'], baseline.get('commit') or 'uncommitted', len(regressions)))
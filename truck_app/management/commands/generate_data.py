@@ -0,0 +1,54 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from truck_app.counters import rebuild_counters
+from truck_app.revenue import rollup_revenue
+from truck_app.search import rebuild_index
+from truck_app.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = ("Generate synthetic users with Register and UserProfile rows and their house shifting, vehicle "
+            "shifting and warehouse bookings, reproducibly from a seed, for performance tests. Never run it "
+            "against production: the rows are indistinguishable from real ones apart from phone numbers starting "
+            "with 5")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help="Users to add (default: 10000)")
+        parser.add_argument('--seed', type=int, default=1, help="Seed for the random generator (default: 1)")
+        parser.add_argument('--until', help="Date (YYYY-MM-DD) the data ends on; pass it for the same rows on "
+                                            "every run (default: now)")
+        parser.add_argument('--days', type=int, default=365, help="Days over which users join (default: 365)")
+        parser.add_argument('--bookings-per-user', type=float, default=1.5,
+                            help="Mean bookings per user (default: 1.5)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users written per transaction")
+        parser.add_argument('--index-search', action='store_true',
+                            help="Also rebuild the admin search index")
+
+    def handle(self, *args, **options):
+        until = None
+        if options['until']:
+            try:
+                until = timezone.make_aware(datetime.datetime.strptime(options['until'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError("--until must be a date like 2024-03-31")
+
+        def progress(totals):
+            if options['verbosity'] > 1:
+                self.stdout.write(", ".join("%s %s" % (count, model.__name__)
+                                            for model, count in totals.items()))
+
+        totals = generate(options['users'], seed=options['seed'], until=until, days=options['days'],
+                          bookings_per_user=options['bookings_per_user'], batch_size=options['batch_size'],
+                          progress=progress)
+        for model, count in totals.items():
+            self.stdout.write("%10d %s" % (count, model.__name__))
+
+        # bulk_create skips the signals that keep these in step
+        self.stdout.write("Rebuilt %s booking counters" % rebuild_counters())
+        self.stdout.write("Rolled up %s orders" % rollup_revenue())
+        if options['index_search']:
+            self.stdout.write("Indexed %s bookings and customers" % rebuild_index())
+        self.stdout.write(self.style.SUCCESS("Generated %s users" % options['users']))
@@ -0,0 +1,373 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import django
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, get_internal_wsgi_application
+from django.db import connection, connections
+from django.test.testcases import QuietWSGIRequestHandler
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+
+from truck_app.summaries import INVENTORY_CATEGORIES
+from .bench_async import sms_stub
+from .bench_connections import percentile
+
+FLOWS = ('house', 'vehicle', 'warehouse')
+
+# Steps in the order a user goes through them, as reported
+STEPS = ('register', 'verify_otp',
+         'house_details', 'house_products', 'house_summary',
+         'vehicle_details', 'vehicle_choice', 'vehicle_summary',
+         'warehouse_details', 'warehouse_products', 'warehouse_summary',
+         'order', 'history')
+
+LOCATIONS = ("Koramangala, Bengaluru", "Whitefield, Bengaluru", "Andheri East, Mumbai", "Powai, Mumbai",
+             "Gachibowli, Hyderabad", "Velachery, Chennai", "Salt Lake, Kolkata", "Dwarka, New Delhi",
+             "Hinjewadi, Pune", "Sector 62, Noida")
+VEHICLES = (("Tata Ace", "Mini Truck"), ("Mahindra Bolero Pickup", "Pickup"), ("Ashok Leyland Dost", "Pickup"),
+            ("Eicher Pro 2049", "Truck"), ("Tata 407", "Truck"))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def setup_test_databases(verbosity, keepdb):
+    """Create the test databases like manage.py test does; returns what teardown_databases needs"""
+    # Tables straight from the models, like the schema the migrations lead to: quicker to build, and
+    # independent of the migration history (which has two leaf nodes in truck_app)
+    for alias in connections:
+        connections[alias].settings_dict.setdefault('TEST', {})['MIGRATE'] = False
+    return setup_databases(verbosity, interactive=False, keepdb=keepdb)
+
+
+class RequestHandler(QuietWSGIRequestHandler):
+    # Headers and body go out in separate writes; with Nagle's algorithm on, each keep-alive response
+    # would wait for the client's delayed ACK (~40 ms) before its body is sent
+    disable_nagle_algorithm = True
+
+
+def serve():
+    """Serve the WSGI application on a free local port from a thread per request, like runserver"""
+    server = ThreadedWSGIServer(('127.0.0.1', 0), RequestHandler, allow_reuse_address=False)
+    server.set_app(get_internal_wsgi_application())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def inventory(rng):
+    """A sparse inventory payload: a few items of a few categories, the rest "0" """
+    chosen = rng.sample(sorted(INVENTORY_CATEGORIES), rng.randint(2, 5))
+    data = {"product_amount": str(rng.randrange(1500, 40000, 50))}
+    for category, items in INVENTORY_CATEGORIES.items():
+        data[category] = {item: str(rng.randint(1, 3) if category in chosen and rng.random() < 0.4 else 0)
+                          for item in items}
+    return data
+
+
+def address(rng, prefix):
+    return {prefix + "_location": rng.choice(LOCATIONS),
+            prefix + "_address": "%d, %d Cross, %d Main" % (rng.randint(1, 999), rng.randint(1, 20), rng.randint(1, 40)),
+            prefix + "_floor": str(rng.randint(0, 12)),
+            prefix + "_lift": rng.choice(("Yes", "No"))}
+
+
+def moving_datetime(rng):
+    moving = datetime.now() + timedelta(days=rng.randint(1, 30), hours=rng.randint(0, 23))
+    return moving.strftime("%d/%m/%Y %H:%M")
+
+
+class FunnelFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Thread-safe per-step response times and error reasons"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.funnels = Counter()
+
+    def record(self, step, elapsed, error=None):
+        with self.lock:
+            self.timings[step].append(elapsed)
+            if error:
+                self.errors[step][error] += 1
+
+    def finished(self, flow, completed):
+        with self.lock:
+            self.funnels[(flow, completed)] += 1
+
+
+class Funnel:
+    """One user's way from registering to a booking in their history, over HTTP"""
+
+    def __init__(self, base_url, session, recorder, rng, phone_number, flow):
+        self.base_url = base_url
+        self.session = session
+        self.recorder = recorder
+        self.rng = rng
+        self.phone_number = phone_number
+        self.flow = flow
+
+    def call(self, step, url_name, data, expect=None, headers=None):
+        """POST data to url_name and return the JSON body; raises FunnelFailed when the step did not succeed"""
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.base_url + reverse(url_name), data=json.dumps(data), headers=headers,
+                                         timeout=60)
+            body = response.json() if response.status_code == 200 else None
+        except (requests.RequestException, ValueError) as error:
+            self.recorder.record(step, time.perf_counter() - start, type(error).__name__)
+            raise FunnelFailed(step)
+        error = None
+        if body is None:
+            error = "HTTP %s" % response.status_code
+        elif body.get("status_code", body.get("status", 200)) != 200:
+            error = "status %s: %s" % (body.get("status_code", body.get("status")), body.get("message"))
+        elif expect and body.get(expect) in (None, ""):
+            error = "no %s: %s" % (expect, body.get("message"))
+        self.recorder.record(step, time.perf_counter() - start, error)
+        if error:
+            raise FunnelFailed(step)
+        return body
+
+    def run(self):
+        rng = self.rng
+        password = "Load@%06d" % rng.randrange(10 ** 6)
+        registered = self.call('register', 'Register', {
+            "user_name": "Load Test %s" % self.phone_number[-4:], "phone_number": self.phone_number,
+            "email": "load%s@example.com" % self.phone_number, "password1": password, "password2": password,
+            "terms_condition": "1", "privacy_policy": "1"}, expect='register_id')
+        user_id = registered["user_id"]
+        verified = self.call('verify_otp', 'verify_otp', {"register_id": registered["register_id"],
+                                                          "otp": registered["otp"]})
+        if verified.get("message") != "OTP verified successfully.":
+            raise FunnelFailed('verify_otp')
+        order = getattr(self, self.flow)(user_id)
+        self.call('order', 'OrderBooking', {"user_id": user_id, "booking_datetime": moving_datetime(rng),
+                                            "payment_method": "COD", **order}, expect='Booking_id')
+        self.call('history', 'BookingDetails', {"user_id": user_id}, expect='booking_details',
+                  headers={"Authorization": settings.SECRET_KEY})
+
+    def house(self, user_id):
+        rng = self.rng
+        details_id = self.call('house_details', 'HouseShiftingDetails', {
+            "user_id": user_id, "shifting_type": "1", "house_shifting_type": rng.choice(("1 BHK", "2 BHK", "3 BHK")),
+            "moving_datetime": moving_datetime(rng), **address(rng, "pickup"), **address(rng, "drop")},
+            expect='house_shifting_details_id')["house_shifting_details_id"]
+        products = inventory(rng)
+        product_id = self.call('house_products', 'HouseShiftingProducts', {
+            "house_shifting_details_id": details_id, **products},
+            expect='house_shifting_product_id')["house_shifting_product_id"]
+        self.call('house_summary', 'HouseShiftingSummaryDetails', {
+            "house_shifting_details_id": str(details_id), "house_shifting_product_id": str(product_id)},
+            expect='house_shifting_details_id')
+        return {"house_shifting_details_id": details_id, "house_shifting_product_id": product_id,
+                "shifting_type": "House Shifting", "total_amount": products["product_amount"]}
+
+    def vehicle(self, user_id):
+        rng = self.rng
+        details_id = self.call('vehicle_details', 'VehicleShiftingDetails', {
+            "user_id": user_id, "shifting_type": "2", "moving_datetime": moving_datetime(rng),
+            **address(rng, "pickup"), **address(rng, "drop")},
+            expect='vehicle_shifting_details_id')["vehicle_shifting_details_id"]
+        vehicle_name, vehicle_model = rng.choice(VEHICLES)
+        amount = str(rng.randrange(800, 9000, 50))
+        chosen_id = self.call('vehicle_choice', 'ChooseShiftingVehicle', {
+            "vehicle_shifting_details_id": details_id, "vehicle_name": vehicle_name, "vehicle_model": vehicle_model,
+            "vehicle_image": "vehicles/%s.png" % vehicle_model.lower().replace(" ", "_"), "vehicle_amount": amount},
+            expect='chosen_shifting_vehicle_id')["chosen_shifting_vehicle_id"]
+        self.call('vehicle_summary', 'VehicleShiftingSummaryDetails', {
+            "vehicle_shifting_details_id": str(details_id), "chosen_shifting_vehicle_id": str(chosen_id)},
+            expect='vehicle_shifting_details_id')
+        return {"vehicle_shifting_details_id": details_id, "chosen_shifting_vehicle_details_id": chosen_id,
+                "shifting_type": "Vehicle Shifting", "total_amount": amount}
+
+    def warehouse(self, user_id):
+        rng = self.rng
+        details_id = self.call('warehouse_details', 'WareHouseStorageDetails', {
+            "user_id": user_id, "shifting_type": "3", "moving_datetime": moving_datetime(rng),
+            "storing_days": str(rng.randint(7, 180)), **address(rng, "pickup")},
+            expect='warehouse_storage_detail_id')["warehouse_storage_detail_id"]
+        products = inventory(rng)
+        products_id = self.call('warehouse_products', 'WareHouseStoringProducts', {
+            "warehouse_storage_detail_id": details_id, **products},
+            expect='warehouse_storing_products')["warehouse_storing_products"]
+        self.call('warehouse_summary', 'WareHouseSummaryDetails', {
+            "warehouse_storage_details_id": str(details_id), "warehouse_storing_products_id": str(products_id)},
+            expect='warehouse_storing_details_id')
+        return {"warehouse_storing_details_id": details_id, "warehouse_storing_products_id": products_id,
+                "shifting_type": "WareHouse Storage", "total_amount": products["product_amount"]}
+
+
+def step_results(recorder, duration):
+    steps = {}
+    for step in STEPS:
+        timings = recorder.timings.get(step)
+        if not timings:
+            continue
+        errors = recorder.errors[step]
+        steps[step] = {'requests': len(timings),
+                       'errors': sum(errors.values()),
+                       'error_reasons': dict(errors.most_common(5)),
+                       'per_second': len(timings) / duration,
+                       'mean_ms': sum(timings) / len(timings) * 1000,
+                       'p50_ms': percentile(timings, 0.5) * 1000,
+                       'p95_ms': percentile(timings, 0.95) * 1000,
+                       'p99_ms': percentile(timings, 0.99) * 1000,
+                       'max_ms': max(timings) * 1000}
+    return steps
+
+
+def change(new, old):
+    return "%+.0f%%" % ((new - old) / old * 100) if old else "-"
+
+
+class Command(BaseCommand):
+    help = ("Load test the booking funnel over HTTP: concurrent users register, verify their OTP, book a house "
+            "shifting, vehicle shifting or warehouse storage, read its summary, place the order and read their "
+            "booking history. By default the app is served from this process against a fresh test database with "
+            "the SMS provider stubbed; the results are saved as JSON for --compare")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--funnels', type=int, default=200, help="Users to take through the funnel (default: 200)")
+        parser.add_argument('--concurrency', type=int, default=10, help="Users in the funnel at once (default: 10)")
+        parser.add_argument('--flow', action='append', dest='flows', choices=FLOWS,
+                            help="Booking kinds, taken in turn (default: all)")
+        parser.add_argument('--seed', type=int, default=1, help="Seed for the generated bookings (default: 1)")
+        parser.add_argument('--sms-latency', type=float, default=0.2,
+                            help="Seconds the SMS stub takes to answer (default: 0.2)")
+        parser.add_argument('--url', help="Load test the app already served at this URL instead, e.g. a gunicorn "
+                                          "node; it sends real SMS unless its SMS_API_URL points at a stub")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database between runs")
+        parser.add_argument('--output', help="Where to save the results (default: loadtests/<time>.json)")
+        parser.add_argument('--compare', help="Results of an earlier run to compare with")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as results:
+                    baseline = json.load(results)
+            except (OSError, ValueError) as error:
+                raise CommandError("Cannot read %s: %s" % (options['compare'], error))
+
+        if options['url']:
+            result = self.run(options['url'].rstrip('/'), options)
+        else:
+            result = self.run_locally(options)
+
+        self.report(result, baseline)
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'loadtests',
+                                                   '%s.json' % result['started'].replace(':', ''))
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as results:
+            json.dump(result, results, indent=2)
+        self.stdout.write("Saved to %s" % output)
+
+    def run_locally(self, options):
+        verbosity = options['verbosity']
+        old_config = setup_test_databases(verbosity, options['keepdb'])
+        stub = sms_stub(options['sms_latency'])
+        try:
+            with tempfile.TemporaryDirectory() as metrics_dir, \
+                    override_settings(SMS_API_URL='http://127.0.0.1:%s' % stub.server_address[1], SMS_API_KEY='stub',
+                                      DEBUG=False, METRICS_DIR=metrics_dir):
+                server = serve()
+                try:
+                    return self.run('http://127.0.0.1:%s' % server.server_address[1], options)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+        finally:
+            stub.shutdown()
+            connection.close()
+            teardown_databases(old_config, verbosity, keepdb=options['keepdb'])
+
+    def run(self, base_url, options):
+        flows = options['flows'] or FLOWS
+        recorder = Recorder()
+        local = threading.local()
+        # Fresh phone numbers, so repeated runs against one database register new users
+        first_phone = random.SystemRandom().randrange(10 ** 9 - options['funnels'])
+
+        def run_funnel(index):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                local.session.headers['Content-Type'] = 'application/json'
+            flow = flows[index % len(flows)]
+            rng = random.Random('%s-%s' % (options['seed'], index))
+            funnel = Funnel(base_url, local.session, recorder, rng, '6%09d' % (first_phone + index), flow)
+            try:
+                funnel.run()
+            except FunnelFailed:
+                recorder.finished(flow, False)
+            else:
+                recorder.finished(flow, True)
+
+        started = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(run_funnel, range(options['funnels'])))
+        duration = time.perf_counter() - start
+
+        completed = sum(count for (flow, done), count in recorder.funnels.items() if done)
+        return {'started': started.isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'target': options['url'] or 'local',
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'options': {key: options[key] for key in ('funnels', 'concurrency', 'seed', 'sms_latency')},
+                'flows': list(flows),
+                'duration': duration,
+                'funnels': {'completed': completed,
+                            'failed': options['funnels'] - completed,
+                            'bookings_per_second': completed / duration,
+                            'by_flow': {flow: {'completed': recorder.funnels[(flow, True)],
+                                               'failed': recorder.funnels[(flow, False)]} for flow in flows}},
+                'steps': step_results(recorder, duration)}
+
+    def report(self, result, baseline=None):
+        funnels = result['funnels']
+        self.stdout.write("%d funnels in %.1fs with %d users at once: %d completed, %d failed, %.2f bookings/s" % (
+            result['options']['funnels'], result['duration'], result['options']['concurrency'],
+            funnels['completed'], funnels['failed'], funnels['bookings_per_second']))
+        header = "%-18s %8s %7s %8s %9s %9s %9s %9s" % ("step", "requests", "errors", "req/s", "mean ms", "p50 ms",
+                                                        "p95 ms", "p99 ms")
+        if baseline:
+            header += " %8s %8s" % ("p50 chg", "p95 chg")
+        self.stdout.write(header)
+        for step, stats in result['steps'].items():
+            line = "%-18s %8d %7d %8.1f %9.1f %9.1f %9.1f %9.1f" % (
+                step, stats['requests'], stats['errors'], stats['per_second'], stats['mean_ms'], stats['p50_ms'],
+                stats['p95_ms'], stats['p99_ms'])
+            old = baseline and baseline['steps'].get(step)
+            if old:
+                line += " %8s %8s" % (change(stats['p50_ms'], old['p50_ms']), change(stats['p95_ms'], old['p95_ms']))
+            self.stdout.write(line)
+            for reason, count in stats['error_reasons'].items():
+                self.stdout.write("    %5d x %s" % (count, reason))
+        if baseline:
+            self.stdout.write("Baseline %s (%s): %.2f bookings/s" % (
+                baseline['started'], baseline.get('commit') or 'no commit', baseline['funnels']['bookings_per_second']))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from truck_app.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user booking counters from OrderBooking and the shifting details tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild this user id (can be repeated)")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Users aggregated and written per batch")
+
+    def handle(self, *args, **options):
+        written = rebuild_counters(user_ids=options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("Rebuilt %s booking counters" % written))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from truck_app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Index every booking and customer for the admin search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--clear', action='store_true', help="Drop the whole index first")
+
+    def handle(self, *args, **options):
+        written = rebuild_index(batch_size=options['batch_size'], clear=options['clear'])
+        self.stdout.write(self.style.SUCCESS("Indexed %s bookings and customers" % written))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from truck_app.completion import reconcile_completion
+
+
+class Command(BaseCommand):
+    help = "Mark shifting details completed (or pending again) from their completed_date; meant to run from cron"
+
+    def handle(self, *args, **options):
+        changed = reconcile_completion()
+        self.stdout.write(self.style.SUCCESS("Reconciled completion of %s shifting details" % changed))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from truck_app.revenue import reset_revenue, rollup_revenue
+
+
+class Command(BaseCommand):
+    help = "Fold new OrderBooking rows into the DailyRevenue rollup used by the dashboard income chart"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop the rollup and rebuild it from the first order")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset_revenue()
+        rolled_up = rollup_revenue(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("Rolled up %s orders" % rolled_up))
@@ -0,0 +1,364 @@
+"""Request, database and SMS metrics in the Prometheus text format.
+
+MetricsMiddleware records, per URL name: a latency histogram, the status codes, a response size
+histogram, and the number and time of the database queries each request ran. truck_app.sms times
+the calls to the SMS provider.
+
+Every worker process keeps its own values and writes a snapshot of them to
+METRICS_DIR/<host>-<pid>-<start>.json every METRICS_FLUSH_INTERVAL seconds (and at exit), replacing
+the file atomically. The /metrics view sums the snapshots of all processes, so whichever worker
+answers the scrape reports the whole host. After a flush, the snapshots of the host's exited
+processes are added to METRICS_DIR/aggregate.json and deleted, so the totals never go down while
+the directory stays one file per live process; clear METRICS_DIR when deploying. METRICS_DIR
+defaults to truckapp-metrics in the system temp directory, outside the source tree.
+"""
+import atexit
+import contextvars
+import glob
+import hmac
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are then kept rather than folded
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+UNRESOLVED = 'unresolved'
+
+HOST = socket.gethostname()
+AGGREGATE = 'aggregate.json'
+SNAPSHOT_NAME = re.compile(r'(?P<host>.+)-(?P<pid>\d+)-\d+\.json(?:\.tmp)?')
+# Snapshots written before the host was part of the name
+LEGACY_SNAPSHOT_NAME = re.compile(r'(?P<pid>\d+)-\d+\.json(?:\.tmp)?')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+
+REQUESTS = Counter('http_requests_total', "Requests answered, by URL name, method and status",
+                   ('view', 'method', 'status'))
+LATENCY = Histogram('http_request_duration_seconds', "Time to build the response, by URL name",
+                    ('view', 'method'), LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', "Body size of non-streaming responses, by URL name",
+                          ('view',), SIZE_BUCKETS)
+QUERIES = Histogram('http_request_db_queries', "Database queries run per request, by URL name",
+                    ('view',), QUERY_COUNT_BUCKETS)
+QUERY_TIME = Counter('http_request_db_seconds_total', "Time spent in database queries, by URL name", ('view',))
+SMS_LATENCY = Histogram('sms_request_duration_seconds', "Calls to the SMS provider, by operation and outcome",
+                        ('operation', 'outcome'), LATENCY_BUCKETS)
+
+METRICS = {metric.name: metric for metric in (REQUESTS, LATENCY, RESPONSE_SIZE, QUERIES, QUERY_TIME, SMS_LATENCY)}
+
+
+class Store:
+    """This process's values: counters as floats, histograms as [per bucket counts..., +Inf count, sum]"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.pid = os.getpid()
+        self.started = time.time_ns()
+        self.dirty = False
+        self.flusher = None
+        # Held while writing the snapshot file, which the flusher thread and a scrape may both do
+        self.flush_lock = threading.Lock()
+
+    def inc(self, metric, labels, amount=1):
+        with self.lock:
+            key = (metric.name, labels)
+            self.values[key] = self.values.get(key, 0) + amount
+            self.dirty = True
+
+    def observe(self, metric, labels, value):
+        with self.lock:
+            key = (metric.name, labels)
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(metric.buckets) + 2)
+            entry[bisect_left(metric.buckets, value)] += 1
+            entry[-1] += value
+            self.dirty = True
+
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return [[name, list(labels), value] for (name, labels), value in self.values.items()]
+
+
+_store = Store()
+
+
+def store():
+    """The current process's Store, a fresh one in a process forked after values were recorded"""
+    global _store
+    if _store.pid != os.getpid():
+        _store = Store()
+    if _store.flusher is None:
+        _store.flusher = threading.Thread(target=_flush_periodically, args=(_store,), name='metrics-flusher',
+                                          daemon=True)
+        _store.flusher.start()
+    return _store
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'truckapp-metrics')
+
+
+def flush(current=None):
+    """Write the process's snapshot file, replacing the previous one in a single rename"""
+    current = current or _store
+    if current.pid != os.getpid():
+        return
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '%s-%d-%d.json' % (HOST, current.pid, current.started))
+    with current.flush_lock:
+        _write(path, current.snapshot())
+    fold_stopped()
+
+
+def _write(path, data):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as snapshot:
+        json.dump(data, snapshot)
+    os.replace(temporary, path)
+
+
+def _load(path):
+    try:
+        with open(path) as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(totals, entries):
+    for name, labels, value in entries:
+        key = (name, tuple(labels))
+        if isinstance(value, list):
+            total = totals.setdefault(key, [0] * len(value))
+            for index, amount in enumerate(value):
+                total[index] += amount
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _load_aggregate(directory):
+    """The folded totals as {"folded": [snapshot names], "values": [[name, labels, value]...]}"""
+    return _load(os.path.join(directory, AGGREGATE)) or {'folded': [], 'values': []}
+
+
+def _stopped(name):
+    """Whether the snapshot file name belongs to an exited process of this host"""
+    match = SNAPSHOT_NAME.fullmatch(name)
+    # Another host's pids mean nothing here. Old <pid>-<start> names come from the time each host
+    # wrote to its own checkout, so they are taken to be this host's.
+    if match is None:
+        match = LEGACY_SNAPSHOT_NAME.fullmatch(name)
+    elif match.group('host') != HOST:
+        return False
+    if match is None:
+        return False
+    try:
+        os.kill(int(match.group('pid')), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:  # PermissionError: running as another user
+        return False
+    return False
+
+
+def fold_stopped():
+    """Add the snapshots of this host's exited processes to the aggregate file and delete them.
+
+    One process folds at a time; the others skip it. Scrapes take no lock: the aggregate names the
+    snapshots it holds and replaces the previous one before they are deleted, and merged_snapshots
+    reads it after the snapshots.
+    """
+    if fcntl is None:
+        return
+    directory = metrics_dir()
+    with open(os.path.join(directory, 'fold.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        names = [name for name in os.listdir(directory) if _stopped(name)]
+        if not names:
+            return
+        aggregate = _load_aggregate(directory)
+        totals = {}
+        _add(totals, aggregate['values'])
+        # Names stay listed until their file is gone, for scrapes that read it before the delete
+        folded = [name for name in aggregate['folded'] if os.path.exists(os.path.join(directory, name))]
+        for name in names:
+            entries = _load(os.path.join(directory, name)) if name.endswith('.json') else None
+            if entries is not None:
+                _add(totals, entries)
+                folded.append(name)
+        _write(os.path.join(directory, AGGREGATE),
+               {'folded': folded, 'values': [[name, list(labels), value] for (name, labels), value in totals.items()]})
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def _flush_periodically(current):
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+        if current.dirty:
+            flush(current)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _store.values and _store.pid == os.getpid():
+        flush(_store)
+
+
+def merged_snapshots():
+    directory = metrics_dir()
+    snapshots = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        name = os.path.basename(path)
+        if name != AGGREGATE:
+            entries = _load(path)
+            if entries is not None:
+                snapshots[name] = entries
+    # Read last: a snapshot folded since it was read is skipped here, one deleted before is in the aggregate
+    aggregate = _load_aggregate(directory)
+    totals = {}
+    _add(totals, aggregate['values'])
+    for name in set(snapshots).difference(aggregate['folded']):
+        _add(totals, snapshots[name])
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs) if pairs else ''
+
+
+def render(totals):
+    lines = []
+    for metric in METRICS.values():
+        series = sorted((labels, value) for (name, labels), value in totals.items() if name == metric.name)
+        lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+        lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+        for labels, value in series:
+            if metric.kind == 'counter':
+                lines.append('%s%s %s' % (metric.name, _labels(metric.labelnames, labels), value))
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric.buckets) + ['+Inf'], value[:-1]):
+                cumulative += count
+                lines.append('%s_bucket%s %s' % (metric.name, _labels(metric.labelnames, labels, [('le', bound)]),
+                                                 cumulative))
+            lines.append('%s_sum%s %s' % (metric.name, _labels(metric.labelnames, labels), value[-1]))
+            lines.append('%s_count%s %s' % (metric.name, _labels(metric.labelnames, labels), cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """All processes' metrics in the Prometheus text format; needs "Bearer <METRICS_TOKEN>" when one is set"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        return HttpResponseForbidden()
+    flush()
+    return HttpResponse(render(merged_snapshots()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Query count and time of the current request; ORM calls from async views run in threads that copy it
+_request_queries = contextvars.ContextVar('truck_app_request_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    totals = _request_queries.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # First in the list: connection.execute_wrapper() blocks pop the last one when they end
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+def connect_signals():
+    connection_created.connect(install_query_counter, dispatch_uid='metrics_query_counter')
+
+
+@contextmanager
+def measure_request():
+    """Count the queries run for the request within the block: yields [count, seconds]"""
+    totals = [0, 0.0]
+    token = _request_queries.set(totals)
+    try:
+        yield totals
+    finally:
+        _request_queries.reset(token)
+
+
+def observe_request(request, response, duration, queries):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None and match.view_name else UNRESOLVED
+    current = store()
+    current.inc(REQUESTS, (view, request.method, str(response.status_code)))
+    current.observe(LATENCY, (view, request.method), duration)
+    if not response.streaming:
+        current.observe(RESPONSE_SIZE, (view,), len(response.content))
+    current.observe(QUERIES, (view,), queries[0])
+    current.inc(QUERY_TIME, (view,), queries[1])
+
+
+@contextmanager
+def timed_sms(operation):
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        store().observe(SMS_LATENCY, (operation, outcome), time.perf_counter() - start)
@@ -14,3 +14,393 @@
 #
 #         response = self.get_response(request)
 #         return response
+
+
+import asyncio
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from . import metrics
+from . import sms
+from .profiling import StackSampler, logged_queries
+from .responses import FastJsonResponse
+from .summaries import SparseOptionsError
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are gzipped without it
+    brotli = None
+
+# No text/html: the pages carry CSRF tokens, and compressing them next to reflected input lets an
+# attacker recover a token from the compressed sizes (BREACH)
+DEFAULT_COMPRESSION_CONTENT_TYPES = (
+    'application/json',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'image/svg+xml',
+)
+
+
+def accepted_encodings(accept_encoding):
+    """Codings the client accepts, ignoring any it refuses with q=0"""
+    accepted = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor()
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress JSON, CSS, JavaScript and CSV responses with brotli when available, gzip otherwise.
+
+    Like django.middleware.gzip.GZipMiddleware, but only for the content types in
+    COMPRESSION_CONTENT_TYPES and only above COMPRESSION_MIN_SIZE bytes.
+    Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 860)
+        self.content_types = frozenset(getattr(settings, 'COMPRESSION_CONTENT_TYPES',
+                                               DEFAULT_COMPRESSION_CONTENT_TYPES))
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            # The compressed size is unknown until the whole stream is sent
+            if encoding == 'br':
+                response.streaming_content = brotli_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed_content = brotli.compress(response.content, quality=5)
+            else:
+                compressed_content = compress_string(response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # The body now differs byte for byte, so a strong ETag becomes weak (RFC 7232 section 2.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class ConnectionSlot:
+    """One async request's share of ConnectionLimitMiddleware's slots.
+
+    An async view awaiting another service (the SMS provider) can hand the slot and its database
+    connection back for the wait with ``async with connection_released(request)``.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.held = False
+
+    async def acquire(self, wait):
+        self.held = await self.limiter.aacquire(wait)
+        return self.held
+
+    async def release(self):
+        if self.held:
+            self.held = False
+            await self.limiter.arelease()
+
+    @asynccontextmanager
+    async def released(self):
+        await self.release()
+        try:
+            yield
+        finally:
+            # The request has already done work the client is waiting for, so it queues rather than failing
+            await self.acquire(None)
+
+
+def connection_released(request):
+    slot = getattr(request, 'connection_slot', None)
+    return slot.released() if slot is not None else nullcontext()
+
+
+class ConnectionLimitMiddleware:
+    """Cap the database connections one worker process uses at once.
+
+    With CONN_MAX_AGE every thread keeps its own connection between requests, so a threaded worker
+    could hold one per thread. At most DB_MAX_CONNECTIONS_PER_WORKER requests run at a time; the
+    others wait up to DB_CONNECTION_WAIT seconds for a slot and then get a 503. After a request, a
+    thread closes its connection if more threads than the cap are holding one open.
+
+    Under ASGI every request runs its ORM calls in a thread of its own, which ends with the request,
+    so async requests always close their connection when they finish.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = getattr(settings, 'DB_MAX_CONNECTIONS_PER_WORKER', 10)
+        self.wait = getattr(settings, 'DB_CONNECTION_WAIT', 5)
+        self.slots = threading.BoundedSemaphore(self.limit)
+        self.holders_lock = threading.Lock()
+        self.holders = set()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def busy_response(self):
+        response = FastJsonResponse({'status_code': 503, 'message': 'Server busy, retry shortly'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.slots.acquire(timeout=self.wait):
+            return self.busy_response()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.release()
+            raise
+        if response.streaming:
+            # A streamed body keeps reading the database until the server closes the response
+            response._resource_closers.append(self.release)
+        else:
+            self.release()
+        return response
+
+    async def __acall__(self, request):
+        slot = ConnectionSlot(self)
+        if not await slot.acquire(self.wait):
+            return self.busy_response()
+        request.connection_slot = slot
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await slot.release()
+            raise
+        if response.streaming:
+            # Closed from the request's thread by the ASGI handler
+            response._resource_closers.append(partial(self.release, close=True))
+            slot.held = False
+        else:
+            await slot.release()
+        return response
+
+    async def aacquire(self, wait):
+        if self.slots.acquire(blocking=False):
+            return True
+        # Wait in a worker thread, not on the event loop
+        waiting = asyncio.ensure_future(sync_to_async(self.slots.acquire, thread_sensitive=False)(timeout=wait))
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # The thread keeps waiting after the request is cancelled (the client went away); a slot
+            # it gets then has no request to release it
+            waiting.add_done_callback(self.release_abandoned)
+            raise
+
+    def release_abandoned(self, waiting):
+        if not waiting.cancelled() and waiting.exception() is None and waiting.result():
+            self.slots.release()
+
+    async def arelease(self):
+        await sync_to_async(self.release_connections)(close=True)
+        self.slots.release()
+
+    def release(self, close=False):
+        self.release_connections(close)
+        self.slots.release()
+
+    def release_connections(self, close=False):
+        thread_id = threading.get_ident()
+        holding = any(connection.connection is not None for connection in connections.all(initialized_only=True))
+        with self.holders_lock:
+            if holding and not close and (thread_id in self.holders or len(self.holders) < self.limit):
+                self.holders.add(thread_id)
+                return
+            self.holders.discard(thread_id)
+        if holding:
+            for connection in connections.all(initialized_only=True):
+                connection.close()
+
+
+class ProfilingMiddleware:
+    """Profile opted-in requests into PROFILE_DIR.
+
+    A request is profiled when its X-Profile header equals PROFILE_TOKEN, or at random for a
+    PROFILE_SAMPLE_RATE share of requests. It runs under the stack sampler or, with
+    "X-Profile-Mode: deterministic" (or PROFILE_MODE), under cProfile. Two files named after the
+    X-Profile-Id response header are written: <id>.folded (flamegraph input) or <id>.prof (pstats),
+    and <id>.json with the request, its timing and the SQL of every query it ran.
+
+    With neither setting the middleware removes itself from the chain. Requests served by the ASGI
+    application pass through unprofiled: the event loop thread runs other requests at the same time.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.token = getattr(settings, 'PROFILE_TOKEN', '')
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        if not self.token and not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.mode = getattr(settings, 'PROFILE_MODE', 'sampling')
+        self.interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+        self.directory = getattr(settings, 'PROFILE_DIR', 'profiles')
+        self.counter = itertools.count()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.get_response(request)
+        if not self.wanted(request):
+            return self.get_response(request)
+        mode = request.headers.get('X-Profile-Mode', self.mode)
+        if mode == 'deterministic':
+            profiler, extension = cProfile.Profile(), '.prof'
+        else:
+            mode, profiler, extension = 'sampling', StackSampler(interval=self.interval), '.folded'
+        start = time.perf_counter()
+        with logged_queries() as queries:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        profile_id = '%s-%d-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(self.counter))
+        path = os.path.join(self.directory, profile_id)
+        os.makedirs(self.directory, exist_ok=True)
+        if mode == 'deterministic':
+            profiler.dump_stats(path + extension)
+        else:
+            with open(path + extension, 'w') as folded:
+                folded.write(profiler.folded())
+        match = request.resolver_match
+        with open(path + '.json', 'w') as summary:
+            json.dump({'id': profile_id,
+                       'method': request.method,
+                       'path': request.path,
+                       'view': match.view_name if match else None,
+                       'status': response.status_code,
+                       'mode': mode,
+                       'duration_ms': duration * 1000,
+                       'query_count': len(queries.queries),
+                       'query_ms': queries.duration_ms,
+                       'queries': queries.queries}, summary, indent=1)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def wanted(self, request):
+        header = request.headers.get('X-Profile')
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return random.random() < self.sample_rate
+
+
+class SmsNotConfiguredMiddleware(MiddlewareMixin):
+    """Answer a view that sends an OTP without SMS_API_KEY set with a JSON 503 rather than a 500"""
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, sms.SmsNotConfigured):
+            return FastJsonResponse({'status_code': 503, 'message': 'SMS not configured'}, status=503)
+        return None
+
+
+class SparseOptionsErrorMiddleware(MiddlewareMixin):
+    """Answer a request with malformed fields or exclude_empty (truck_app.summaries) with a JSON 400"""
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, SparseOptionsError):
+            return FastJsonResponse({'status_code': 400, 'message': str(exception)}, status=400)
+        return None
+
+
+class MetricsMiddleware:
+    """Record each request's latency, status, response size and queries in truck_app.metrics"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with metrics.measure_request() as queries:
+            response = self.get_response(request)
+        metrics.observe_request(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with metrics.measure_request() as queries:
+            response = await self.get_response(request)
+        metrics.observe_request(request, response, time.perf_counter() - start, queries)
+        return response
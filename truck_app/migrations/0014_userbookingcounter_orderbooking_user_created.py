@@ -0,0 +1,38 @@
+# Generated by Django 4.1.13 on 2026-10-19 13:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('truck_app', '0013_houseshiftingdetails_booking_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBookingCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_bookings', models.PositiveIntegerField(default=0)),
+                ('house_shifting_bookings', models.PositiveIntegerField(default=0)),
+                ('vehicle_shifting_bookings', models.PositiveIntegerField(default=0)),
+                ('warehouse_bookings', models.PositiveIntegerField(default=0)),
+                ('completed_bookings', models.PositiveIntegerField(default=0)),
+                ('pending_bookings', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(blank=True, null=True)),
+                ('updated', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='orderbooking',
+            index=models.Index(fields=['user', 'created'], name='orderbooking_user_created'),
+        ),
+        migrations.AddField(
+            model_name='userbookingcounter',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='booking_counter', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.13 on 2026-10-19 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('truck_app', '0015_dailyrevenue_rollupcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='houseshiftingdetails',
+            index=models.Index(fields=['created', 'id'], name='houseshifting_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='houseshiftingdetails',
+            index=models.Index(fields=['completed', 'created'], name='houseshifting_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='houseshiftingdetails',
+            index=models.Index(fields=['booking_id'], name='houseshifting_booking_id'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicleshiftingdetails',
+            index=models.Index(fields=['created', 'id'], name='vehicleshifting_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicleshiftingdetails',
+            index=models.Index(fields=['completed', 'created'], name='vehicleshifting_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicleshiftingdetails',
+            index=models.Index(fields=['booking_id'], name='vehicleshifting_booking_id'),
+        ),
+        migrations.AddIndex(
+            model_name='warehousestoragedetails',
+            index=models.Index(fields=['created', 'id'], name='warehouse_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='warehousestoragedetails',
+            index=models.Index(fields=['completed', 'created'], name='warehouse_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='warehousestoragedetails',
+            index=models.Index(fields=['booking_id'], name='warehouse_booking_id'),
+        ),
+    ]
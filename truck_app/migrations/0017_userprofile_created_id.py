@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('truck_app', '0016_shifting_details_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['created', 'id'], name='userprofile_created_id'),
+        ),
+    ]
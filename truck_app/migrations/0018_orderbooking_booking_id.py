@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('truck_app', '0017_userprofile_created_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderbooking',
+            index=models.Index(fields=['booking_id'], name='orderbooking_booking_id'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.13 on 2026-10-19 14:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def add_fulltext_index(apps, schema_editor):
+    # Only MySQL has FULLTEXT; other databases search through SearchToken
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE truck_app_searchdocument ADD FULLTEXT INDEX searchdocument_text_ft (text)')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE truck_app_searchdocument DROP INDEX searchdocument_text_ft')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('truck_app', '0018_orderbooking_booking_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('text', models.TextField()),
+                ('updated', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='truck_app.searchdocument')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_kind_object'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'document'), name='searchtoken_token_document'),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
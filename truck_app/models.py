@@ -73,6 +73,10 @@ class UserProfile(models.Model):
     created = models.DateTimeField()
     updated = models.DateTimeField()
 
+    class Meta:
+        # Admin customer list, newest first
+        indexes = [models.Index(fields=['created', 'id'], name='userprofile_created_id')]
+
 
 class HouseShiftingDetails(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -94,6 +98,12 @@ class HouseShiftingDetails(models.Model):
     created = models.DateTimeField(null=True, blank=True)
     updated = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # Admin lists: newest first, optionally by status, and booking id lookups
+        indexes = [models.Index(fields=['created', 'id'], name='houseshifting_created_id'),
+                   models.Index(fields=['completed', 'created'], name='houseshifting_status_created'),
+                   models.Index(fields=['booking_id'], name='houseshifting_booking_id')]
+
 
 class HouseShiftingSelectedVehicle(models.Model):
     house_shifting_details = models.ForeignKey(HouseShiftingDetails, on_delete=models.CASCADE)
@@ -203,6 +213,12 @@ class VehicleShiftingDetails(models.Model):
     created = models.DateTimeField(null=True, blank=True)
     updated = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # Admin lists: newest first, optionally by status, and booking id lookups
+        indexes = [models.Index(fields=['created', 'id'], name='vehicleshifting_created_id'),
+                   models.Index(fields=['completed', 'created'], name='vehicleshifting_status_created'),
+                   models.Index(fields=['booking_id'], name='vehicleshifting_booking_id')]
+
 
 class ChosenShiftingVehicle(models.Model):
     vehicle_shifting_details = models.ForeignKey(VehicleShiftingDetails, on_delete=models.CASCADE)
@@ -231,6 +247,12 @@ class WareHouseStorageDetails(models.Model):
     created = models.DateTimeField(null=True, blank=True)
     updated = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # Admin lists: newest first, optionally by status, and booking id lookups
+        indexes = [models.Index(fields=['created', 'id'], name='warehouse_created_id'),
+                   models.Index(fields=['completed', 'created'], name='warehouse_status_created'),
+                   models.Index(fields=['booking_id'], name='warehouse_booking_id')]
+
 
 class WareHouseSelectedVehicle(models.Model):
     warehouse_storage_detail = models.ForeignKey(WareHouseStorageDetails, on_delete=models.CASCADE)
@@ -335,3 +357,70 @@ class OrderBooking(models.Model):
     total_amount = models.CharField(max_length=100, null=True, blank=True)
     created = models.DateTimeField(null=True, blank=True)
     updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created'], name='orderbooking_user_created'),
+            models.Index(fields=['booking_id'], name='orderbooking_booking_id'),
+        ]
+
+
+class UserBookingCounter(models.Model):
+    """Denormalized per-user booking totals, kept in step with OrderBooking writes."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='booking_counter')
+    total_bookings = models.PositiveIntegerField(default=0)
+    house_shifting_bookings = models.PositiveIntegerField(default=0)
+    vehicle_shifting_bookings = models.PositiveIntegerField(default=0)
+    warehouse_bookings = models.PositiveIntegerField(default=0)
+    completed_bookings = models.PositiveIntegerField(default=0)
+    pending_bookings = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(null=True, blank=True)
+
+
+class DailyRevenue(models.Model):
+    """Order revenue per day, shifting type and payment method, filled by the rollup_revenue command."""
+    day = models.DateField()
+    shifting_type = models.CharField(max_length=100)
+    payment_method = models.CharField(max_length=100)
+    order_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'shifting_type', 'payment_method'],
+                                    name='dailyrevenue_day_type_method'),
+        ]
+
+
+class RollupCheckpoint(models.Model):
+    """Last source row id folded into a rollup table."""
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(null=True, blank=True)
+
+
+class SearchDocument(models.Model):
+    """Searchable text of one booking or customer, kept in step with saves by truck_app.search."""
+    kind = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    text = models.TextField()
+    updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='searchdocument_kind_object'),
+        ]
+
+
+class SearchToken(models.Model):
+    """One prefix of a token of a SearchDocument; a prefix query is an equality lookup on token."""
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='tokens')
+    token = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'document'], name='searchtoken_token_document'),
+        ]
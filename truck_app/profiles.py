@@ -0,0 +1,58 @@
+from functools import partial
+
+from django.utils.crypto import salted_hmac
+
+from .caching import cached, user_key
+from .models import OrderBooking
+from .models import UserBookingCounter
+from .models import UserProfile
+
+# UserProfile.password is plaintext, so it stays out of the cached details (the shared cache
+# tier may write them to disk); the response reads it per request with profile_password
+PROFILE_FIELDS = ("user_name", "user_phone_number", "user_email")
+
+
+def password_digest(password):
+    """Keyed digest of a profile password, cached in its place so the ETag still follows it"""
+    return salted_hmac("truck_app.profiles.password_digest", password or "").hexdigest()
+
+
+def profile_password(user_id):
+    """The profile's password as the UserProfile/ response reports it, read without the cache"""
+    password = UserProfile.objects.filter(user_id=user_id).values_list("password", flat=True).first()
+    return "null" if password is None else password
+
+
+def user_profile_details(user_id):
+    """Booking counts and profile fields of the UserProfile/ response, or None without a profile.
+
+    password_digest stands in for the password, which the response adds with profile_password.
+    """
+    user_profile = UserProfile.objects.filter(user_id=user_id).first()
+    if user_profile is None:
+        return None
+    booking_counter = UserBookingCounter.objects.filter(user_id=user_id).first()
+    if booking_counter is not None:
+        booking_count = booking_counter.total_bookings
+    else:
+        # No counter row yet: the user has never booked, or counters were not rebuilt since the upgrade
+        booking_counter = UserBookingCounter()
+        booking_count = OrderBooking.objects.filter(user=user_id).count()
+
+    details = {"booking_count": booking_count,
+               "house_shifting_booking_count": booking_counter.house_shifting_bookings,
+               "vehicle_shifting_booking_count": booking_counter.vehicle_shifting_bookings,
+               "warehouse_booking_count": booking_counter.warehouse_bookings,
+               "completed_booking_count": booking_counter.completed_bookings,
+               "pending_booking_count": booking_counter.pending_bookings}
+    for field in PROFILE_FIELDS:
+        value = getattr(user_profile, field)
+        details[field] = "null" if value is None else value
+    details["password_digest"] = password_digest(user_profile.password)
+    return details
+
+
+def cached_user_profile_details(user_id):
+    """user_profile_details, served from the cache until the user's profile, counters or bookings change"""
+    # Not 'user_profile': values cached under that name still hold the plaintext password
+    return cached(user_key('user_profile_details', user_id), partial(user_profile_details, user_id))
@@ -0,0 +1,81 @@
+"""Helpers for looking inside a request: a stack sampling profiler and a database query log."""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler:
+    """Sample one thread's stack every interval seconds from a background thread.
+
+    Far cheaper for the sampled thread than cProfile, and the result is in the folded stack format
+    ("outer;inner;innermost count" per line) that flamegraph.pl, speedscope and inferno read.
+    enable() and disable() mirror cProfile.Profile.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def folded(self):
+        return ''.join('%s %d\n' % (stack, count) for stack, count in self.stacks.most_common())
+
+
+class QueryLog:
+    """Database execute wrapper recording each query's SQL (without parameters) and duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'alias': context['connection'].alias,
+                                 'sql': sql,
+                                 'many': many,
+                                 'duration_ms': (time.perf_counter() - start) * 1000})
+
+    @property
+    def duration_ms(self):
+        return sum(query['duration_ms'] for query in self.queries)
+
+
+@contextmanager
+def logged_queries():
+    """Record the queries run in this thread, on every database, inside the block"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
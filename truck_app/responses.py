@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, stdlib json is used without it
+    orjson = None
+
+_django_encoder = DjangoJSONEncoder()
+
+if orjson is not None:
+    # Datetimes are passed through to DjangoJSONEncoder so the wire format stays the same as JsonResponse
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def use_fast_encoder():
+    return orjson is not None and getattr(settings, 'FAST_JSON_ENCODER', True)
+
+
+def _default(value):
+    """orjson hook for dates, times, Decimals, UUIDs and lazy strings"""
+    return _django_encoder.default(value)
+
+
+def dumps(data):
+    """Encode data to JSON bytes with orjson when installed, stdlib json otherwise"""
+    if use_fast_encoder():
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in JsonResponse replacement that encodes with orjson when it is installed.
+
+    A custom encoder or json_dumps_params always goes through stdlib json, exactly like JsonResponse.
+    """
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        if encoder is DjangoJSONEncoder and not json_dumps_params:
+            content = dumps(data)
+        else:
+            content = json.dumps(data, cls=encoder, **(json_dumps_params or {}))
+        super().__init__(content=content, **kwargs)
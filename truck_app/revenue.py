@@ -0,0 +1,150 @@
+import datetime
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .counters import booking_kind
+from .models import DailyRevenue
+from .models import OrderBooking
+from .models import RollupCheckpoint
+from .routers import primary_reads
+
+CHECKPOINT_NAME = 'daily_revenue'
+ROLLED_UP_KEY = 'truck_app:revenue_rolled_up'
+UNKNOWN = 'unknown'
+
+# Orders younger than this are left for the next run, so rows committed out of id order are not skipped
+SETTLE_SECONDS = 60
+
+
+def parse_amount(value):
+    """OrderBooking.total_amount is free text from the app ("1200", "1,200.50", "Rs 900"); 0 if unreadable"""
+    if not value:
+        return Decimal(0)
+    cleaned = re.sub(r"[^0-9.]", "", str(value))
+    try:
+        return Decimal(cleaned) if cleaned else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def order_day(order, now):
+    """Day an order's revenue is filed under.
+
+    Orders saved without created (rows from before the column was filled) fall back to updated, and
+    without either to the day of the run that first sees them, so their revenue is still counted.
+    """
+    placed = order.created or order.updated
+    return timezone.localdate(placed) if placed is not None else now.date()
+
+
+def _rollup_key(order, now):
+    return (order_day(order, now),
+            booking_kind(order) or UNKNOWN,
+            (order.payment_method or UNKNOWN)[:100])
+
+
+def _apply(totals, now):
+    for (day, shifting_type, payment_method), (order_count, amount) in totals.items():
+        revenue, created = DailyRevenue.objects.get_or_create(day=day,
+                                                              shifting_type=shifting_type,
+                                                              payment_method=payment_method,
+                                                              defaults={'created': now, 'updated': now})
+        DailyRevenue.objects.filter(id=revenue.id).update(order_count=F('order_count') + order_count,
+                                                          total_amount=F('total_amount') + amount,
+                                                          updated=now)
+
+
+def rollup_revenue(batch_size=5000):
+    """Fold orders placed since the last run into DailyRevenue and return how many were added.
+
+    Each batch and the checkpoint move together in one transaction, so an interrupted run neither
+    loses nor double counts orders, and a batch another run has already folded is dropped.
+    """
+    now = timezone.localtime(timezone.now())
+    settled_before = now - datetime.timedelta(seconds=SETTLE_SECONDS)
+    checkpoint, created = RollupCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME,
+                                                                 defaults={'updated': now})
+    rolled_up = 0
+    while True:
+        orders = list(OrderBooking.objects.filter(id__gt=checkpoint.last_id)
+                      .order_by('id')
+                      .only('id', 'created', 'updated', 'payment_method', 'total_amount', 'house_shifting_details_id',
+                            'vehicle_shifting_details_id', 'ware_house_storing_details_id')[:batch_size])
+        settled = []
+        for order in orders:
+            if order.created is not None and order.created > settled_before:
+                break
+            settled.append(order)
+        if not settled:
+            return rolled_up
+
+        totals = defaultdict(lambda: [0, Decimal(0)])
+        for order in settled:
+            key = _rollup_key(order, now)
+            totals[key][0] += 1
+            totals[key][1] += parse_amount(order.total_amount)
+
+        with transaction.atomic():
+            current = RollupCheckpoint.objects.select_for_update().get(id=checkpoint.id)
+            if current.last_id != checkpoint.last_id:
+                # The rollup command and a dashboard request ran at once: go on from where the other stopped
+                checkpoint = current
+                continue
+            _apply(totals, now)
+            checkpoint.last_id = settled[-1].id
+            checkpoint.updated = now
+            checkpoint.save(update_fields=['last_id', 'updated'])
+        rolled_up += len(settled)
+        if len(settled) < len(orders):
+            return rolled_up
+
+
+def maybe_rollup_revenue():
+    """Run rollup_revenue at most once per REVENUE_ROLLUP_INTERVAL seconds across workers.
+
+    The dashboard calls it, so the income chart is current even when the rollup_revenue command is
+    not scheduled; the first call on a database folds every order placed so far.
+    """
+    interval = getattr(settings, 'REVENUE_ROLLUP_INTERVAL', 300)
+    if cache.add(ROLLED_UP_KEY, 1, timeout=interval):
+        # The dashboard reads under replica_reads; the checkpoint must come from the primary
+        with primary_reads():
+            return rollup_revenue()
+    return None
+
+
+def reset_revenue():
+    """Drop the rollup so the next rollup_revenue run rebuilds it from the first order"""
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        RollupCheckpoint.objects.filter(name=CHECKPOINT_NAME).delete()
+
+
+def monthly_revenue(year):
+    """Revenue of each month of year, January first, as floats for the dashboard chart"""
+    months = [0.0] * 12
+    rows = DailyRevenue.objects.filter(day__year=year) \
+        .annotate(month=TruncMonth('day')).values('month').annotate(amount=Sum('total_amount'))
+    for row in rows:
+        months[row['month'].month - 1] = float(row['amount'])
+    return months
+
+
+def weekly_revenue(weeks=12, today=None):
+    """(week start, revenue) for the last weeks weeks, oldest first, including empty weeks"""
+    today = today or timezone.localdate()
+    this_week = today - datetime.timedelta(days=today.weekday())
+    first_week = this_week - datetime.timedelta(weeks=weeks - 1)
+    rows = DailyRevenue.objects.filter(day__gte=first_week) \
+        .annotate(week=TruncWeek('day')).values('week').annotate(amount=Sum('total_amount'))
+    amounts = {row['week']: float(row['amount']) for row in rows}
+    return [(week, amounts.get(week, 0.0))
+            for week in (first_week + datetime.timedelta(weeks=index) for index in range(weeks))]
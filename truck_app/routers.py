@@ -0,0 +1,177 @@
+"""Read replica routing.
+
+Writes always go to the primary ('default'). Reads go to a random alias of DATABASE_REPLICAS only
+inside views decorated with replica_reads (summaries, booking history, admin lists, exports), and
+only while the request's user has not written recently:
+
+* once a request writes, its later reads use the primary;
+* ReplicaRoutingMiddleware then remembers the user (session cookie, or user_id of an API request)
+  for REPLICA_STICKY_SECONDS, so the user's next requests read their own writes from the primary
+  instead of a replica that may still be catching up.
+
+Code that reads in order to write (reconcile_completion) and the ETag lookups of conditional_post
+read the primary even inside replica_reads, through primary_reads().
+
+To try it locally, run with truckapp_project.settings_sqlite_replica, which reads from a copy of
+the SQLite database; truck_app.tests.ReplicaRouterTests does the same with a temporary one.
+"""
+import contextvars
+import json
+import random
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+STICKY_PREFIX = 'truck_app:replica_sticky'
+
+_routing = contextvars.ContextVar('truck_app_replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, sticky_key=None):
+        self.sticky_key = sticky_key
+        self.read_replica = False
+        self.wrote = False
+        self._sticky = None
+
+    @property
+    def sticky(self):
+        # Looked up on the first routed read, so requests that never read a replica pay nothing
+        if self._sticky is None:
+            self._sticky = bool(self.sticky_key) and cache.get('%s:%s' % (STICKY_PREFIX, self.sticky_key)) is not None
+        return self._sticky
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def routing(read_replica, state=None):
+    """Read from a replica (or from the primary) within the block, keeping the request's write state"""
+    state = state or _routing.get() or RoutingState()
+    token = _routing.set(state)
+    previous, state.read_replica = state.read_replica, read_replica
+    try:
+        yield state
+    finally:
+        state.read_replica = previous
+        _routing.reset(token)
+
+
+def primary_reads():
+    return routing(False)
+
+
+def _routed_stream(chunks, state):
+    # The body of a streaming response is read after the view, and the middleware, returned
+    chunks = iter(chunks)
+    while True:
+        with routing(True, state):
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def replica_reads(view):
+    """Let the view's reads go to a replica when the request and its user have not just written"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def ainner(request, *args, **kwargs):
+            # The ORM calls of an async view run in threads that copy this context, state included
+            with routing(True):
+                return await view(request, *args, **kwargs)
+        return ainner
+
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        with routing(True) as state:
+            response = view(request, *args, **kwargs)
+        if getattr(response, 'streaming', False):
+            response.streaming_content = _routed_stream(response.streaming_content, state)
+        return response
+    return inner
+
+
+def sticky_key(request):
+    """Who the request is for: the session of an admin page, or the user_id of an API request"""
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        return 'session:%s' % session_key
+    if request.content_type == 'application/json' and request.body:
+        try:
+            user_id = json.loads(request.body).get('user_id')
+        except (ValueError, AttributeError):
+            return None
+        if user_id not in (None, ''):
+            return 'user:%s' % user_id
+    return None
+
+
+class ReplicaRoutingMiddleware:
+    """Track whether a request wrote and keep its user on the primary for REPLICA_STICKY_SECONDS after"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        state = RoutingState(sticky_key(request))
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote and state.sticky_key:
+            cache.set('%s:%s' % (STICKY_PREFIX, state.sticky_key), 1,
+                      timeout=getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        state = RoutingState(sticky_key(request))
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote and state.sticky_key:
+            await cache.aset('%s:%s' % (STICKY_PREFIX, state.sticky_key), 1,
+                             timeout=getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+        return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        aliases = replicas()
+        if state is None or not aliases or not state.read_replica or state.wrote or state.sticky:
+            return 'default'
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {'default', *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
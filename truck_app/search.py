@@ -0,0 +1,271 @@
+"""Admin search over bookings and customers.
+
+Every booking (a row of the three shifting details tables) and every customer (UserProfile) has a
+SearchDocument with its normalized searchable text: booking id, pickup and drop locations and
+addresses, and the customer's name, phone number and email. post_save/post_delete receivers rewrite
+the document of the row that changed, so the index follows the tables; the rebuild_search_index
+command fills it for rows written before it existed or by queryset.update(). Saves are indexed once
+their transaction commits, so a failed index write never rolls back or fails the booking itself.
+
+Every term of a query is a prefix. On MySQL the document text has a FULLTEXT index and is matched
+with MATCH ... AGAINST in boolean mode. Elsewhere (or with SEARCH_BACKEND = 'tokens') each document
+also stores the leading prefixes of its tokens as SearchToken rows, so a term is an indexed equality
+lookup rather than a LIKE scan.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import HouseShiftingDetails
+from .models import SearchDocument
+from .models import SearchToken
+from .models import UserProfile
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+
+CUSTOMER = 'customer'
+
+BOOKING_MODELS = {
+    'house_shifting': HouseShiftingDetails,
+    'vehicle_shifting': VehicleShiftingDetails,
+    'warehouse_shifting': WareHouseStorageDetails,
+}
+BOOKING_KINDS = {model: kind for kind, model in BOOKING_MODELS.items()}
+
+BOOKING_FIELDS = ('booking_id', 'pickup_location', 'pickup_address', 'drop_location', 'drop_address')
+CUSTOMER_FIELDS = ('user_name', 'user_phone_number', 'user_email')
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+logger = logging.getLogger(__name__)
+
+# Digits kept of a phone number stored with its country code, so the local number matches too
+LOCAL_PHONE_DIGITS = 10
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold()) if text else []
+
+
+def document_tokens(values):
+    """Distinct tokens of values, in order"""
+    tokens = []
+    for value in values:
+        for token in tokenize(value):
+            tokens.append(token)
+            if token.isdigit() and len(token) > LOCAL_PHONE_DIGITS:
+                tokens.append(token[-LOCAL_PHONE_DIGITS:])
+    return list(dict.fromkeys(tokens))
+
+
+def token_prefixes(tokens):
+    """Every prefix of each token from SEARCH_MIN_PREFIX to SEARCH_MAX_PREFIX characters"""
+    shortest = getattr(settings, 'SEARCH_MIN_PREFIX', 2)
+    longest = getattr(settings, 'SEARCH_MAX_PREFIX', 20)
+    prefixes = set()
+    for token in tokens:
+        for length in range(shortest, min(len(token), longest) + 1):
+            prefixes.add(token[:length])
+    return prefixes
+
+
+def use_fulltext(using=None):
+    backend = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        using = using or router.db_for_write(SearchDocument)
+        return connections[using].vendor == 'mysql'
+    return backend == 'fulltext'
+
+
+def index_document(kind, object_id, tokens):
+    """Store the tokens of one document, writing only the prefixes that changed"""
+    with transaction.atomic():
+        document, created = SearchDocument.objects.update_or_create(
+            kind=kind, object_id=object_id, defaults={'text': ' '.join(tokens), 'updated': timezone.now()})
+        if use_fulltext():
+            return document
+        wanted = token_prefixes(tokens)
+        stored = set() if created else set(document.tokens.values_list('token', flat=True))
+        if stored - wanted:
+            document.tokens.filter(token__in=stored - wanted).delete()
+        # A concurrent save of the same row may have stored some of them already
+        SearchToken.objects.bulk_create([SearchToken(document=document, token=token)
+                                         for token in wanted - stored], ignore_conflicts=True)
+    return document
+
+
+def remove_document(kind, object_id):
+    SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def customer_profile(user_id):
+    return UserProfile.objects.filter(user_id=user_id).order_by('id').first()
+
+
+def booking_values(detail, profile):
+    values = [getattr(detail, field, None) for field in BOOKING_FIELDS]
+    if profile is not None:
+        values += [getattr(profile, field) for field in CUSTOMER_FIELDS]
+    return values
+
+
+def index_booking(detail, profile=None):
+    if profile is None:
+        profile = customer_profile(detail.user_id)
+    return index_document(BOOKING_KINDS[type(detail)], detail.id, document_tokens(booking_values(detail, profile)))
+
+
+def index_customer(profile, with_bookings=True):
+    """Index a customer and, since bookings carry the customer's name and phone, their bookings"""
+    index_document(CUSTOMER, profile.id, document_tokens(getattr(profile, field) for field in CUSTOMER_FIELDS))
+    if with_bookings:
+        for model in BOOKING_MODELS.values():
+            for detail in model.objects.filter(user_id=profile.user_id):
+                index_booking(detail, profile)
+
+
+def query_terms(query):
+    shortest = getattr(settings, 'SEARCH_MIN_PREFIX', 2)
+    longest = getattr(settings, 'SEARCH_MAX_PREFIX', 20)
+    return list(dict.fromkeys(term[:longest] for term in tokenize(query) if len(term) >= shortest))
+
+
+def search(query, kind=None):
+    """SearchDocuments matching every term of query as a prefix, newest documents first.
+
+    Terms shorter than SEARCH_MIN_PREFIX are ignored; a query with no usable term matches nothing.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return SearchDocument.objects.none()
+    documents = SearchDocument.objects.all()
+    if kind is not None:
+        documents = documents.filter(kind=kind)
+    if use_fulltext():
+        # Terms are \w+ only, so they cannot carry boolean mode operators
+        documents = documents.extra(where=['MATCH (text) AGAINST (%s IN BOOLEAN MODE)'],
+                                    params=[' '.join('+%s*' % term for term in terms)])
+    else:
+        matched = SearchToken.objects.filter(token__in=terms).values('document_id') \
+            .annotate(matched=Count('id')).filter(matched=len(terms)).values('document_id')
+        documents = documents.filter(id__in=matched)
+    return documents.order_by('-id')
+
+
+def search_ids(query, kind):
+    """Subquery of the ids of the kind's rows matching query, for filter(id__in=...).
+
+    Every match stays reachable: the admin lists page over the rows themselves, not over a capped id list.
+    """
+    return search(query, kind).order_by().values('object_id')
+
+
+def _chunks(queryset, size):
+    """Lists of up to size rows of queryset in id order, each read with a seek past the last"""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id')[:size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _first_profiles(user_ids):
+    """customer_profile() of each user, in one query"""
+    profiles = {}
+    for profile in UserProfile.objects.filter(user_id__in=user_ids).order_by('-id'):
+        profiles[profile.user_id] = profile
+    return profiles
+
+
+def _write_documents(kind, documents, replace):
+    """Store {object_id: tokens} of one kind in bulk; replace drops the rows' current documents first"""
+    now = timezone.now()
+    with transaction.atomic():
+        if replace:
+            SearchDocument.objects.filter(kind=kind, object_id__in=documents).delete()
+        # Conflicts are documents a concurrent save has just written, which are as fresh as these
+        SearchDocument.objects.bulk_create([SearchDocument(kind=kind, object_id=object_id, text=' '.join(tokens),
+                                                           updated=now)
+                                            for object_id, tokens in documents.items()], ignore_conflicts=True)
+        if use_fulltext():
+            return
+        document_ids = dict(SearchDocument.objects.filter(kind=kind, object_id__in=documents)
+                            .values_list('object_id', 'id'))
+        SearchToken.objects.bulk_create([SearchToken(document_id=document_ids[object_id], token=token)
+                                         for object_id, tokens in documents.items()
+                                         for token in token_prefixes(tokens)],
+                                        batch_size=5000, ignore_conflicts=True)
+
+
+def rebuild_index(batch_size=500, clear=False):
+    """Index every booking and customer; returns the number of documents written.
+
+    Rows are indexed batch_size at a time, each batch in one transaction with bulk inserts. clear
+    drops the whole index first, which also forgets rows deleted without signals (raw SQL).
+    """
+    if clear:
+        SearchDocument.objects.all().delete()
+    elif use_fulltext():
+        # Left over from the token backend
+        SearchToken.objects.all().delete()
+    written = 0
+    for profiles in _chunks(UserProfile.objects.all(), batch_size):
+        _write_documents(CUSTOMER, {profile.id: document_tokens(getattr(profile, field) for field in CUSTOMER_FIELDS)
+                                    for profile in profiles}, replace=not clear)
+        written += len(profiles)
+    for kind, model in BOOKING_MODELS.items():
+        for details in _chunks(model.objects.all(), batch_size):
+            profiles = _first_profiles({detail.user_id for detail in details})
+            _write_documents(kind, {detail.id: document_tokens(booking_values(detail, profiles.get(detail.user_id)))
+                                    for detail in details}, replace=not clear)
+            written += len(details)
+    return written
+
+
+def index_after_commit(index, instance):
+    """Run index(instance) once the current transaction commits.
+
+    Two saves of one row can race to create its document; the loser retries, now as an update. Any
+    other failure only leaves the document stale until the next save or rebuild_search_index.
+    """
+    def run():
+        try:
+            try:
+                index(instance)
+            except IntegrityError:
+                index(instance)
+        except Exception:
+            logger.exception("Search index update failed", extra={'model': type(instance).__name__,
+                                                                  'object_id': instance.pk})
+    transaction.on_commit(run)
+
+
+def booking_saved(sender, instance, **kwargs):
+    index_after_commit(index_booking, instance)
+
+
+def booking_deleted(sender, instance, **kwargs):
+    remove_document(BOOKING_KINDS[sender], instance.id)
+
+
+def customer_saved(sender, instance, **kwargs):
+    index_after_commit(index_customer, instance)
+
+
+def customer_deleted(sender, instance, **kwargs):
+    remove_document(CUSTOMER, instance.id)
+
+
+def connect_signals():
+    for model in BOOKING_MODELS.values():
+        post_save.connect(booking_saved, sender=model, dispatch_uid='search_%s_saved' % model.__name__)
+        post_delete.connect(booking_deleted, sender=model, dispatch_uid='search_%s_deleted' % model.__name__)
+    post_save.connect(customer_saved, sender=UserProfile, dispatch_uid='search_UserProfile_saved')
+    post_delete.connect(customer_deleted, sender=UserProfile, dispatch_uid='search_UserProfile_deleted')
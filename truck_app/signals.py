@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent once committed, after shifting details rows were changed with queryset.update(), which
+# bypasses post_save. sender is the model; arguments: ids (changed primary keys), values (the
+# field values written)
+shifting_details_updated = Signal()
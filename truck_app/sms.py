@@ -0,0 +1,76 @@
+"""OTP messages through the 2factor.in SMS API.
+
+send_otp is for the sync views; asend_otp is for the async views and awaits the provider with
+aiohttp, so waiting on it holds no thread. Without aiohttp it falls back to send_otp in a thread.
+"""
+import asyncio
+import json
+import weakref
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import checks
+
+from .metrics import timed_sms
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is optional, asend_otp then runs send_otp in a thread
+    aiohttp = None
+
+COUNTRY_CODE = "+91"
+
+# Keep-alive connections to the provider: one requests session, one aiohttp session per event loop
+_session = requests.Session()
+_async_sessions = weakref.WeakKeyDictionary()
+
+
+class SmsNotConfigured(Exception):
+    """SMS_API_KEY is empty; SmsNotConfiguredMiddleware answers the request with a 503"""
+
+
+def check_api_key(app_configs, **kwargs):
+    if settings.SMS_API_KEY:
+        return []
+    return [checks.Warning("SMS_API_KEY is not set", hint="Export SMS_API_KEY; until then the OTP endpoints answer 503.",
+                           id='truck_app.W001')]
+
+
+def otp_url(phone_number):
+    if not settings.SMS_API_KEY:
+        raise SmsNotConfigured("SMS_API_KEY is not set; export it to send OTP messages")
+    return "%s/%s/SMS/%s%s/AUTOGEN2/%s" % (settings.SMS_API_URL, settings.SMS_API_KEY, COUNTRY_CODE,
+                                           phone_number, settings.SMS_OTP_TEMPLATE)
+
+
+def send_otp(phone_number):
+    """Send an auto generated OTP to phone_number and return it"""
+    with timed_sms('otp'):
+        response = _session.get(otp_url(phone_number), timeout=getattr(settings, 'SMS_TIMEOUT', 10))
+        return json.loads(response.text)["OTP"]
+
+
+def _async_session(loop):
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=getattr(settings, 'SMS_TIMEOUT', 10)))
+        _async_sessions[loop] = session
+    return session
+
+
+async def aclose():
+    """Close the running event loop's session; for loops that end, like a benchmark's"""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def asend_otp(phone_number):
+    """send_otp for coroutines"""
+    if aiohttp is None:
+        return await sync_to_async(send_otp, thread_sensitive=False)(phone_number)
+    url = otp_url(phone_number)
+    with timed_sms('otp'):
+        async with _async_session(asyncio.get_running_loop()).get(url) as response:
+            return json.loads(await response.text())["OTP"]
@@ -0,0 +1,219 @@
+"""Sparse summary and booking history responses.
+
+The summary endpoints and BookingDetails/ accept two optional request keys:
+
+* ``fields``: a list (or comma separated string) of response keys to return, e.g.
+  ``["pickup_location", "drop_location", "sofa"]``. Inventory categories are selected by name.
+  Ids, status_code and message are always returned (and id and booking_id on each booking).
+* ``exclude_empty``: true to drop inventory items that were not chosen, and categories left empty.
+  On BookingDetails/ it drops null and blank values from each booking.
+
+Any other type for either key raises SparseOptionsError, which SparseOptionsErrorMiddleware answers
+with a JSON 400.
+
+Only the selected columns are read from the database. Empty values are returned as null.
+Sparse responses are cached (truck_app.caching) until one of the rows they were read from changes.
+"""
+from functools import partial
+
+from .caching import cached, rows_key, user_key
+from .models import ChosenShiftingVehicle
+from .models import HouseShiftingDetails
+from .models import HouseShiftingProducts
+from .models import OrderBooking
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+from .models import WareHouseStoringProducts
+
+# Inventory columns of HouseShiftingProducts / WareHouseStoringProducts, grouped as in the summary responses
+INVENTORY_CATEGORIES = {
+    "sofa": ["single_sofa", "double_sofa", "three_seater", "four_seater", "five_seater", "six_seater",
+             "recliner"],
+    "bed": ["single_bed_storage", "single_bed_dismantallable", "double_bed_storage", "double_bed_dismantallable",
+            "bunk_dismantallabel", "folding_cot_dismantallabel"],
+    "mattress": ["single_mattress_foldable", "single_mattress_non_foldable", "double_mattress_foldable",
+                 "double_mattress_nonfoldable"],
+    "chairs": ["dining_table_chairs", "baby_chairs", "rocking_chair", "plastic_floding_chair", "office_chair"],
+    "tables": ["bed_side_table", "dressing_table", "study_or_computer_table", "center_table", "dining_table",
+               "tea_poy"],
+    "accessories": ["tv_stand", "book_self", "mirror", "shoe_rack", "mandir", "iron_trunk_chest"],
+    "tv": ["tv_size_upto_20", "tv_size_29to43", "tv_size_49to55", "tv_size_above55", "home_theater"],
+    "ac": ["ac_split", "ac_window", "cooler", "ceiling_fan", "table_fan", "exhaust_fan"],
+    "fridge": ["mini_fridge", "small_fridge", "medium_fridge", "large_fridge", "large_above450_ltrs_fridge"],
+    "bathroom": ["washing_machine", "geyser", "bath_tub"],
+    "kitchen_utility": ["gas_stove", "water_purifier", "microwave_otg", "chimney", "dish_washer", "gas_cylinder"],
+    "others": ["inverter_ups", "treadmill", "piano_guitar"],
+    "home_utility": ["sewing_mechine", "vaccum_cleaner", "lamp", "plants", "iron_board", "dish_antenna"],
+    "cartons": ["service_carton_box", "self_carton_box"],
+    "gunny_bags": ["gunny_bags"],
+}
+
+HOUSE_SHIFTING_ADDRESS_FIELDS = ["shifting_type", "moving_datetime", "pickup_location", "pickup_address",
+                                 "pickup_floor", "pickup_lift", "drop_location", "drop_address", "drop_floor",
+                                 "drop_lift"]
+VEHICLE_SHIFTING_ADDRESS_FIELDS = ["moving_datetime", "pickup_location", "pickup_address", "pickup_floor",
+                                   "pickup_lift", "drop_location", "drop_address", "drop_floor", "drop_lift"]
+WAREHOUSE_ADDRESS_FIELDS = ["shifting_type", "moving_datetime", "pickup_location", "pickup_address",
+                            "pickup_floor", "pickup_lift", "storing_days"]
+CHOSEN_VEHICLE_FIELDS = ["vehicle_name", "vehicle_model", "vehicle_image", "vehicle_amount"]
+
+BOOKING_FIELDS = [field.attname for field in OrderBooking._meta.concrete_fields]
+
+
+class SparseOptionsError(ValueError):
+    pass
+
+
+def wants_sparse(request_data):
+    return "fields" in request_data or "exclude_empty" in request_data
+
+
+def sparse_options(request_data):
+    """Return (fields, exclude_empty) from a request body; fields is None when every field is wanted"""
+    fields = request_data.get("fields")
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",")]
+    elif fields is not None and not (isinstance(fields, list) and all(isinstance(field, str) for field in fields)):
+        raise SparseOptionsError("fields must be a list of field names or a comma separated string")
+    fields = {field for field in fields if field} if fields else None
+    exclude_empty = request_data.get("exclude_empty")
+    if exclude_empty is None:
+        exclude_empty = False
+    elif not isinstance(exclude_empty, bool):
+        raise SparseOptionsError("exclude_empty must be true or false")
+    return fields, exclude_empty
+
+
+def sparse_key(request_data):
+    """Part of the ETag that tells sparse representations of the same rows apart"""
+    if not wants_sparse(request_data):
+        return ""
+    fields, exclude_empty = sparse_options(request_data)
+    return "%s:%s" % (",".join(sorted(fields or ())), exclude_empty)
+
+
+def _selected(names, fields):
+    return [name for name in names if fields is None or name in fields]
+
+
+def _inventory(row, categories, exclude_empty):
+    inventory = {}
+    for category in categories:
+        items = {}
+        for field in INVENTORY_CATEGORIES[category]:
+            value = row[field] or None
+            if value is not None or not exclude_empty:
+                items[field] = value
+        if items or not exclude_empty:
+            inventory[category] = items
+    return inventory
+
+
+def _products_summary(model, details_relation, details_id, products_id, address_fields, fields, exclude_empty):
+    address = _selected(address_fields, fields)
+    categories = _selected(INVENTORY_CATEGORIES, fields)
+    columns = [details_relation + "_id", details_relation + "__user_id"]
+    columns += ["%s__%s" % (details_relation, field) for field in address]
+    if fields is None or "product_amount" in fields:
+        columns.append("product_amount")
+    for category in categories:
+        columns += INVENTORY_CATEGORIES[category]
+
+    row = model.objects.filter(id=products_id).values(*columns).first()
+    if row is None or str(row[details_relation + "_id"]) != details_id:
+        return None
+
+    summary = {"user_id": row[details_relation + "__user_id"]}
+    if "product_amount" in row:
+        summary["product_amount"] = row["product_amount"] or None
+    for field in address:
+        summary[field] = row["%s__%s" % (details_relation, field)]
+    summary.update(_inventory(row, categories, exclude_empty))
+    return summary
+
+
+def house_shifting_summary(house_shifting_details_id, house_shifting_product_id, fields, exclude_empty):
+    summary = _products_summary(HouseShiftingProducts, "house_shifting_details", house_shifting_details_id,
+                                house_shifting_product_id, HOUSE_SHIFTING_ADDRESS_FIELDS, fields, exclude_empty)
+    if summary is None:
+        return None
+    return {'status_code': 200,
+            'message': 'User House Shifting Details',
+            "house_shifting_details_id": house_shifting_details_id,
+            "house_shifting_product_id": house_shifting_product_id,
+            **summary}
+
+
+def warehouse_summary(warehouse_storage_detail_id, warehouse_storing_products_id, fields, exclude_empty):
+    summary = _products_summary(WareHouseStoringProducts, "warehouse_storage_detail", warehouse_storage_detail_id,
+                                warehouse_storing_products_id, WAREHOUSE_ADDRESS_FIELDS, fields, exclude_empty)
+    if summary is None:
+        return None
+    return {'status_code': 200,
+            'message': 'User Ware House Storing Products Details',
+            "warehouse_storing_details_id": warehouse_storage_detail_id,
+            "warehouse_storing_products_id": warehouse_storing_products_id,
+            **summary}
+
+
+def vehicle_shifting_summary(vehicle_shifting_details_id, chosen_shifting_vehicle_id, fields, exclude_empty):
+    address = _selected(VEHICLE_SHIFTING_ADDRESS_FIELDS, fields)
+    vehicle = _selected(CHOSEN_VEHICLE_FIELDS, fields)
+    columns = ["vehicle_shifting_details_id", "vehicle_shifting_details__user_id"]
+    columns += ["vehicle_shifting_details__" + field for field in address] + vehicle
+
+    row = ChosenShiftingVehicle.objects.filter(id=chosen_shifting_vehicle_id).values(*columns).first()
+    if row is None or str(row["vehicle_shifting_details_id"]) != vehicle_shifting_details_id:
+        return None
+
+    summary = {'status_code': 200,
+               'message': 'User Vehicle Shifting Details',
+               "user_id": row["vehicle_shifting_details__user_id"],
+               "vehicle_shifting_details_id": row["vehicle_shifting_details_id"],
+               "chosen_shifting_vehicle_id": chosen_shifting_vehicle_id}
+    for field in address:
+        summary[field] = row["vehicle_shifting_details__" + field]
+    for field in vehicle:
+        # The full response reports a missing vehicle value as "Empty"
+        value = row[field]
+        if value is not None or not exclude_empty:
+            summary[field] = "Empty" if value is None else value
+    return summary
+
+
+def booking_history(user, fields, exclude_empty):
+    """OrderBooking rows of user, newest first, limited to the requested columns"""
+    columns = ["id", "booking_id"] + [field for field in _selected(BOOKING_FIELDS, fields)
+                                      if field not in ("id", "booking_id")]
+    bookings = OrderBooking.objects.filter(user=user).order_by('-created').values(*columns)
+    if not exclude_empty:
+        return list(bookings)
+    return [{key: value for key, value in booking.items() if value is not None and value != ""}
+            for booking in bookings]
+
+
+# Rows each summary reads: (details model, item model)
+SUMMARY_ROWS = {
+    "house_shifting_summary": (HouseShiftingDetails, HouseShiftingProducts),
+    "vehicle_shifting_summary": (VehicleShiftingDetails, ChosenShiftingVehicle),
+    "warehouse_summary": (WareHouseStorageDetails, WareHouseStoringProducts),
+}
+
+
+def cached_summary(summary, details_id, item_id, request_data):
+    """summary(details_id, item_id, ...) for the sparse options of request_data, cached until either row changes"""
+    fields, exclude_empty = sparse_options(request_data)
+    details_model, item_model = SUMMARY_ROWS[summary.__name__]
+    # The summaries compare ids as strings, so an int id gives a different answer than its string
+    key = rows_key(summary.__name__, (details_model, details_id), (item_model, item_id),
+                   parts=[type(details_id).__name__, sparse_key(request_data)])
+    return cached(key, partial(summary, details_id, item_id, fields, exclude_empty))
+
+
+def cached_booking_history(user, request_data):
+    """booking_history for the sparse options of request_data, cached until the user's bookings change"""
+    fields, exclude_empty = sparse_options(request_data)
+    if user is None:
+        return booking_history(user, fields, exclude_empty)
+    return cached(user_key('booking_history', user.id, sparse_key(request_data)),
+                  partial(booking_history, user, fields, exclude_empty))
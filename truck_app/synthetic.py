@@ -0,0 +1,217 @@
+"""Reproducible synthetic customers and bookings, for performance tests at production volume.
+
+generate() writes users with their Register and UserProfile rows and, for each, a few bookings: house
+shifting details with a sparse inventory, vehicle shifting details with the chosen vehicle, or warehouse
+storage with the stored products, most of them ordered. Rows go in with bulk_create, a batch of users at
+a time. Ids are assigned here, continuing from each table's current maximum, so related rows can point
+at each other on every backend: nothing else should write to these tables meanwhile.
+
+The same seed, user count and until date always give the same rows, and a second run continues the first.
+Synthetic phone numbers start with 5, which no Indian mobile number does. bulk_create sends no signals:
+rebuild the booking counters, the revenue rollup and the search index afterwards (generate_data does).
+"""
+import datetime
+import random
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ChosenShiftingVehicle
+from .models import CustomUser as User
+from .models import HouseShiftingDetails
+from .models import HouseShiftingProducts
+from .models import OrderBooking
+from .models import Register
+from .models import UserProfile
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+from .models import WareHouseStoringProducts
+from .summaries import INVENTORY_CATEGORIES
+
+PHONE_PREFIX = '5'
+PASSWORD = 'Synthetic@123'
+
+# In the order they are written: rows only point at models earlier in the list
+MODELS = (User, Register, UserProfile, HouseShiftingDetails, HouseShiftingProducts, VehicleShiftingDetails,
+          ChosenShiftingVehicle, WareHouseStorageDetails, WareHouseStoringProducts, OrderBooking)
+
+FIRST_NAMES = ("Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Krishna", "Ishaan", "Rohan",
+               "Ananya", "Diya", "Aadhya", "Saanvi", "Pari", "Anika", "Navya", "Meera", "Kavya", "Priya")
+LAST_NAMES = ("Sharma", "Verma", "Iyer", "Reddy", "Nair", "Patel", "Gupta", "Singh", "Das", "Mehta", "Rao",
+              "Kulkarni", "Menon", "Joshi", "Chatterjee")
+LOCATIONS = ("Koramangala, Bengaluru", "Whitefield, Bengaluru", "Andheri East, Mumbai", "Powai, Mumbai",
+             "Gachibowli, Hyderabad", "Velachery, Chennai", "Salt Lake, Kolkata", "Dwarka, New Delhi",
+             "Hinjewadi, Pune", "Sector 62, Noida")
+HOUSE_TYPES = ("1 RK", "1 BHK", "2 BHK", "3 BHK", "4 BHK", "Villa")
+VEHICLES = (("Tata Ace", "Mini Truck", 800, 2500), ("Mahindra Bolero Pickup", "Pickup", 1500, 4000),
+            ("Ashok Leyland Dost", "Pickup", 1500, 4500), ("Eicher Pro 2049", "Truck", 3000, 9000),
+            ("Tata 407", "Truck", 3500, 12000))
+
+# Share of each booking kind, of bookings never ordered (the user left before paying) and of past orders
+# the admin marked completed
+KIND_WEIGHTS = (('house', 5), ('vehicle', 3), ('warehouse', 2))
+ABANDONED = 0.15
+COMPLETED = 0.9
+
+
+class Ids:
+    """Next free id per model, from the tables' current maximum"""
+
+    def __init__(self):
+        self.next = {model: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1 for model in MODELS}
+
+    def take(self, model):
+        value = self.next[model]
+        self.next[model] += 1
+        return value
+
+
+def first_index():
+    """Index of the next synthetic user, after those generated by earlier runs"""
+    last = User.objects.filter(phone_number__startswith=PHONE_PREFIX, phone_number__regex=r'^5[0-9]{9}$') \
+        .order_by('-phone_number').values_list('phone_number', flat=True).first()
+    return int(last[1:]) + 1 if last else 0
+
+
+def inventory(rng):
+    """Item counts of a few categories; items not chosen are left null"""
+    chosen = rng.sample(sorted(INVENTORY_CATEGORIES), rng.randint(1, 5))
+    items = {}
+    for category in chosen:
+        for item in INVENTORY_CATEGORIES[category]:
+            if rng.random() < 0.35:
+                items[item] = str(rng.randint(1, 4))
+    return items
+
+
+def address(rng, prefix):
+    return {prefix + '_location': rng.choice(LOCATIONS),
+            prefix + '_address': "%d, %d Cross, %d Main" % (rng.randint(1, 999), rng.randint(1, 20),
+                                                            rng.randint(1, 40)),
+            prefix + '_floor': str(rng.randint(0, 12)),
+            prefix + '_lift': rng.choice(("Yes", "No"))}
+
+
+class Batch:
+    """Rows of a batch of users, per model"""
+
+    def __init__(self, ids, until, days, bookings_per_user, password_hash):
+        self.ids = ids
+        self.until = until
+        self.days = days
+        self.bookings_per_user = bookings_per_user
+        self.password_hash = password_hash
+        self.rows = defaultdict(list)
+
+    def add(self, model, **fields):
+        row = model(id=self.ids.take(model), **fields)
+        self.rows[model].append(row)
+        return row
+
+    def add_user(self, rng, index):
+        joined = self.until - datetime.timedelta(seconds=rng.uniform(0, self.days * 86400))
+        name = "%s %s" % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+        phone_number = '%s%09d' % (PHONE_PREFIX, index)
+        email = "%s.%s@example.com" % (name.lower().replace(' ', '.'), index)
+        user = self.add(User, phone_number=phone_number, password=self.password_hash, first_name=name, email=email,
+                        is_active=True, date_joined=joined)
+        self.add(Register, user_name=name, user_phone_number=phone_number, user_email=email, password1=PASSWORD,
+                 password2=PASSWORD, terms_condition=True, privacy_policy=True, otp='%06d' % rng.randrange(10 ** 6),
+                 registered_datetime=joined, is_verified=True if rng.random() < 0.95 else None, created=joined,
+                 updated=joined)
+        self.add(UserProfile, user=user, user_name=name, user_phone_number=phone_number, user_email=email,
+                 password=PASSWORD, terms_condition=True, privacy_policy=True, user_created=joined, created=joined,
+                 updated=joined)
+        # Most users book once or not at all, a few book often
+        for _ in range(min(int(rng.expovariate(1 / self.bookings_per_user)), 50)):
+            created = joined + (self.until - joined) * rng.random()
+            kind = rng.choices([kind for kind, weight in KIND_WEIGHTS], [weight for kind, weight in KIND_WEIGHTS])[0]
+            getattr(self, 'add_' + kind)(rng, user, created)
+
+    def booking(self, rng, created, **extra):
+        """Fields shared by the shifting details tables; moving date, completion and the order's fields"""
+        moving = created + datetime.timedelta(days=rng.randint(1, 30), hours=rng.randint(0, 12))
+        ordered = rng.random() >= ABANDONED
+        completed = ordered and moving < self.until and rng.random() < COMPLETED
+        fields = {'moving_datetime': moving.strftime("%Y-%m-%d %H:%M:%S"), 'completed': completed or None,
+                  'completed_date': moving + datetime.timedelta(hours=rng.randint(3, 10)) if completed else None,
+                  'created': created, 'updated': created, **address(rng, 'pickup'), **extra}
+        return fields, ordered, moving
+
+    def order(self, user, details, created, moving, shifting_type, amount, **ids):
+        order = self.add(OrderBooking, user=user, booking_datetime=moving.strftime("%Y-%m-%d %H:%M:%S"),
+                         shifting_type=shifting_type, payment_method="COD", total_amount=amount, created=created,
+                         updated=created, **{field: str(value) for field, value in ids.items()})
+        order.booking_id = details.booking_id = "APM00%s" % order.id
+
+    def add_house(self, rng, user, created):
+        fields, ordered, moving = self.booking(rng, created, **address(rng, 'drop'))
+        details = self.add(HouseShiftingDetails, user=user, shifting_type="House Shifting",
+                           house_shifting_type=rng.choice(HOUSE_TYPES), order_placed_datetime=created, **fields)
+        amount = str(rng.randrange(3000, 60000, 50))
+        products = self.add(HouseShiftingProducts, house_shifting_details=details, product_amount=amount,
+                            created=created, updated=created, **inventory(rng))
+        if ordered:
+            self.order(user, details, created, moving, details.shifting_type, amount,
+                       house_shifting_details_id=details.id, house_shifting_product_id=products.id)
+
+    def add_vehicle(self, rng, user, created):
+        fields, ordered, moving = self.booking(rng, created, **address(rng, 'drop'))
+        details = self.add(VehicleShiftingDetails, user=user, shifting_type="Vehicle Shifting",
+                           order_place_datetime=created, **fields)
+        name, model, lowest, highest = rng.choice(VEHICLES)
+        amount = str(rng.randrange(lowest, highest, 50))
+        chosen = self.add(ChosenShiftingVehicle, vehicle_shifting_details=details, vehicle_name=name,
+                          vehicle_model=model, vehicle_image="vehicles/%s.png" % model.lower().replace(' ', '_'),
+                          vehicle_amount=amount, order_place_datetime=created, created=created, updated=created)
+        if ordered:
+            self.order(user, details, created, moving, details.shifting_type, amount,
+                       vehicle_shifting_details_id=details.id, chosen_shifting_vehicle_details_id=chosen.id)
+
+    def add_warehouse(self, rng, user, created):
+        fields, ordered, moving = self.booking(rng, created, storing_days=str(rng.choice((7, 15, 30, 60, 90, 180))))
+        details = self.add(WareHouseStorageDetails, user=user, shifting_type="Warehouse Storage",
+                           order_place_datetime=created, **fields)
+        amount = str(rng.randrange(2000, 40000, 50))
+        products = self.add(WareHouseStoringProducts, warehouse_storage_detail=details, product_amount=amount,
+                            created=created, updated=created, **inventory(rng))
+        if ordered:
+            self.order(user, details, created, moving, details.shifting_type, amount,
+                       ware_house_storing_details_id=details.id, ware_house_storing_products_id=products.id)
+
+    def save(self):
+        with transaction.atomic():
+            for model in MODELS:
+                model.objects.bulk_create(self.rows[model], batch_size=1000)
+        return {model: len(self.rows[model]) for model in MODELS}
+
+
+def generate(users, seed=1, until=None, days=365, bookings_per_user=1.5, batch_size=1000, progress=None):
+    """Write users synthetic users and their bookings; returns the number of rows written per model.
+
+    Users join over the days before until (default: now) and book between joining and until.
+    progress, when given, is called with the running totals after each batch.
+    """
+    until = until or timezone.now()
+    ids = Ids()
+    password_hash = make_password(PASSWORD)
+    start = first_index()
+    totals = dict.fromkeys(MODELS, 0)
+    for batch_start in range(start, start + users, batch_size):
+        batch = Batch(ids, until, days, bookings_per_user, password_hash)
+        for index in range(batch_start, min(batch_start + batch_size, start + users)):
+            # One generator per user: a user's rows do not depend on the batch size or on earlier runs
+            batch.add_user(random.Random('%s-%s' % (seed, index)), index)
+        for model, written in batch.save().items():
+            totals[model] += written
+        if progress:
+            progress(totals)
+    # Backends with sequences (PostgreSQL) would otherwise hand out the ids just written
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), MODELS):
+            cursor.execute(sql)
+    return totals
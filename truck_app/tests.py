@@ -1,3 +1,795 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import logging
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import uuid
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from . import metrics
+from . import responses
+from .caching import local_cache
+from .completion import reconcile_completion
+from .conditional import conditional_post, house_shifting_summary_etag
+from .counters import rebuild_counters, record_booking
+from .logs import BackgroundHandler, JsonFormatter, SamplingFilter
+from .middleware import CompressionMiddleware, ProfilingMiddleware
+from .models import CustomUser
+from .models import DailyRevenue
+from .models import HouseShiftingDetails
+from .models import HouseShiftingProducts
+from .models import OrderBooking
+from .models import Register
+from .models import RollupCheckpoint
+from .models import UserBookingCounter
+from .models import UserProfile
+from .models import VehicleShiftingDetails
+from .models import WareHouseStorageDetails
+from .profiles import cached_user_profile_details
+from .responses import FastJsonResponse
+from .revenue import CHECKPOINT_NAME, SETTLE_SECONDS, maybe_rollup_revenue, parse_amount, rollup_revenue
+from .routers import ReplicaRoutingMiddleware, primary_reads, replica_reads, routing
+from .search import CUSTOMER, rebuild_index, search_ids
+from .signals import shifting_details_updated
+from .sms import check_api_key
+from .summaries import SparseOptionsError, cached_summary, house_shifting_summary, sparse_options
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'truck_app_tests'}}
+
+ETAG = '"v1"'
+
+
+def setUpModule():
+    # The requests' metrics snapshots go to a directory of their own rather than METRICS_DIR
+    metrics_dir = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(metrics_dir.cleanup)
+    override = override_settings(METRICS_DIR=metrics_dir.name)
+    override.enable()
+    unittest.addModuleCleanup(override.disable)
+
+
+def make_user(phone_number='9000000001'):
+    return CustomUser.objects.create_user(phone_number, password='Secret@123')
+
+
+def make_profile(user, password='Secret@123'):
+    now = timezone.now()
+    return UserProfile.objects.create(user=user, user_name='Kumar', user_phone_number=user.phone_number,
+                                      user_email='kumar@example.com', password=password, user_created=now,
+                                      created=now, updated=now)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedSummaryTests(TestCase):
+    def setUp(self):
+        local_cache.clear()
+        caches['default'].clear()
+        now = timezone.now()
+        self.details = HouseShiftingDetails.objects.create(user=make_user(), pickup_location='Chennai',
+                                                           created=now, updated=now)
+        self.products = HouseShiftingProducts.objects.create(house_shifting_details=self.details,
+                                                             product_amount='1200', single_sofa='1',
+                                                             created=now, updated=now)
+
+    def summary(self, request_data=None):
+        return cached_summary(house_shifting_summary, str(self.details.id), self.products.id, request_data or {})
+
+    def test_served_from_cache_until_the_row_is_saved(self):
+        self.assertEqual(self.summary()['product_amount'], '1200')
+
+        # update() sends no signal, so the cached summary is still served
+        HouseShiftingProducts.objects.filter(id=self.products.id).update(product_amount='1500')
+        self.assertEqual(self.summary()['product_amount'], '1200')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products.product_amount = '1800'
+            self.products.save()
+        self.assertEqual(self.summary()['product_amount'], '1800')
+
+    def test_invalidated_by_the_details_row(self):
+        self.assertEqual(self.summary()['pickup_location'], 'Chennai')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.details.pickup_location = 'Madurai'
+            self.details.save()
+        self.assertEqual(self.summary()['pickup_location'], 'Madurai')
+
+    def test_invalidated_by_set_based_updates(self):
+        self.assertEqual(self.summary()['pickup_location'], 'Chennai')
+        with self.captureOnCommitCallbacks(execute=True):
+            HouseShiftingDetails.objects.filter(id=self.details.id).update(pickup_location='Salem')
+            shifting_details_updated.send(sender=HouseShiftingDetails, ids=[self.details.id],
+                                          values={'pickup_location': 'Salem'})
+        self.assertEqual(self.summary()['pickup_location'], 'Salem')
+
+    def test_not_invalidated_before_commit(self):
+        self.assertEqual(self.summary()['product_amount'], '1200')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.products.product_amount = '1800'
+            self.products.save()
+            self.assertEqual(self.summary()['product_amount'], '1200')
+        self.assertTrue(callbacks)
+
+    def test_sparse_options_are_cached_apart(self):
+        self.assertIn('pickup_location', self.summary())
+        sparse = self.summary({'fields': 'product_amount'})
+        self.assertEqual(sparse['product_amount'], '1200')
+        self.assertNotIn('pickup_location', sparse)
+
+    def test_integer_details_id_is_not_the_string_id(self):
+        # The view compares ids as strings, so an int id never matches; the cache must not mix them up
+        self.assertIsNotNone(self.summary())
+        self.assertIsNone(cached_summary(house_shifting_summary, self.details.id, self.products.id, {}))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedProfileTests(TestCase):
+    def setUp(self):
+        local_cache.clear()
+        caches['default'].clear()
+        self.user = make_user()
+        self.profile = make_profile(self.user)
+
+    def user_profile(self, **headers):
+        return self.client.post('/UserProfile/', json.dumps({'user_id': self.user.id}), content_type='application/json',
+                                HTTP_AUTHORIZATION=settings.SECRET_KEY, **headers)
+
+    def test_password_is_not_cached(self):
+        details = cached_user_profile_details(self.user.id)
+        self.assertNotIn('password', details)
+        self.assertNotIn('Secret@123', json.dumps(details))
+
+    def test_response_still_reports_the_password(self):
+        body = self.user_profile().json()
+        self.assertEqual(body['password'], 'Secret@123')
+        self.assertNotIn('password_digest', body)
+
+    def test_password_change_changes_the_etag(self):
+        etag = self.user_profile()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.password = 'Changed@123'
+            self.profile.save()
+        response = self.user_profile(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['password'], 'Changed@123')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReconcileCompletionTests(TestCase):
+    def setUp(self):
+        local_cache.clear()
+        self.user = make_user()
+        self.now = timezone.now()
+        self.past = self.now - datetime.timedelta(days=1)
+        self.future = self.now + datetime.timedelta(days=1)
+
+    def test_completes_due_rows_and_reopens_future_ones(self):
+        due = HouseShiftingDetails.objects.create(user=self.user, completed=False, completed_date=self.past)
+        unset = VehicleShiftingDetails.objects.create(user=self.user, completed=None, completed_date=self.past)
+        moved = WareHouseStorageDetails.objects.create(user=self.user, completed=True, completed_date=self.future)
+        upcoming = HouseShiftingDetails.objects.create(user=self.user, completed=False, completed_date=self.future)
+        undated = HouseShiftingDetails.objects.create(user=self.user, completed=False)
+
+        self.assertEqual(reconcile_completion(self.now), 3)
+
+        for row, completed in ((due, True), (unset, True), (moved, False), (upcoming, False), (undated, False)):
+            row.refresh_from_db()
+            self.assertIs(row.completed, completed)
+        self.assertEqual(reconcile_completion(self.now), 0)
+
+    def test_rebuilds_the_counters_of_booked_rows(self):
+        details = HouseShiftingDetails.objects.create(user=self.user, booking_id='TRK1', completed=False,
+                                                      completed_date=self.past)
+        OrderBooking.objects.create(user=self.user, booking_id='TRK1', house_shifting_details_id=str(details.id),
+                                    created=self.now)
+
+        reconcile_completion(self.now)
+
+        counter = UserBookingCounter.objects.get(user=self.user)
+        self.assertEqual((counter.total_bookings, counter.completed_bookings, counter.pending_bookings), (1, 1, 0))
+
+    def test_announces_the_changed_rows_on_commit(self):
+        due = HouseShiftingDetails.objects.create(user=self.user, completed=False, completed_date=self.past)
+        received = []
+
+        def receiver(sender, ids, values, **kwargs):
+            received.append((sender, ids, values))
+        shifting_details_updated.connect(receiver)
+        self.addCleanup(shifting_details_updated.disconnect, receiver)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_completion(self.now)
+            self.assertEqual(received, [])
+        self.assertEqual(received, [(HouseShiftingDetails, [due.id], {'completed': True})])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RollupRevenueTests(TestCase):
+    def setUp(self):
+        local_cache.clear()
+        caches['default'].clear()
+        self.user = make_user()
+        self.settled = timezone.now() - datetime.timedelta(seconds=SETTLE_SECONDS * 2)
+
+    def order(self, total_amount, payment_method='cash', created=None, **kind):
+        kind = kind or {'house_shifting_details_id': '1'}
+        return OrderBooking.objects.create(user=self.user, total_amount=total_amount, payment_method=payment_method,
+                                           created=created or self.settled, **kind)
+
+    def revenue(self):
+        return {(row.shifting_type, row.payment_method): (row.order_count, row.total_amount)
+                for row in DailyRevenue.objects.all()}
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount('1,200.50'), Decimal('1200.50'))
+        self.assertEqual(parse_amount('Rs 900'), Decimal('900'))
+        for value in (None, '', 'free', '1.2.3'):
+            self.assertEqual(parse_amount(value), Decimal(0), value)
+
+    def test_rolls_up_by_day_kind_and_payment_method(self):
+        self.order('1,200.50')
+        self.order('Rs 800')
+        self.order('500', payment_method='upi', vehicle_shifting_details_id='2')
+        self.order('300', payment_method=None, ware_house_storing_details_id='3')
+
+        self.assertEqual(rollup_revenue(), 4)
+        self.assertEqual(self.revenue(), {
+            ('house_shifting', 'cash'): (2, Decimal('2000.50')),
+            ('vehicle_shifting', 'upi'): (1, Decimal('500')),
+            ('warehouse', 'unknown'): (1, Decimal('300')),
+        })
+        self.assertEqual(set(DailyRevenue.objects.values_list('day', flat=True)), {timezone.localdate(self.settled)})
+
+    def test_runs_are_incremental(self):
+        self.order('100')
+        self.assertEqual(rollup_revenue(), 1)
+        self.assertEqual(rollup_revenue(), 0)
+        last = self.order('250')
+        self.assertEqual(rollup_revenue(), 1)
+        self.assertEqual(self.revenue(), {('house_shifting', 'cash'): (2, Decimal('350'))})
+        self.assertEqual(RollupCheckpoint.objects.get(name=CHECKPOINT_NAME).last_id, last.id)
+
+    def test_recent_orders_wait_for_the_next_run(self):
+        self.order('100')
+        recent = self.order('900', created=timezone.now())
+        later = self.order('50')
+
+        # Stops at the first unsettled order, so the settled one behind it is not skipped either
+        self.assertEqual(rollup_revenue(), 1)
+        self.assertEqual(self.revenue(), {('house_shifting', 'cash'): (1, Decimal('100'))})
+
+        OrderBooking.objects.filter(id=recent.id).update(created=self.settled)
+        self.assertEqual(rollup_revenue(), 2)
+        self.assertEqual(self.revenue(), {('house_shifting', 'cash'): (3, Decimal('1050'))})
+        self.assertEqual(RollupCheckpoint.objects.get(name=CHECKPOINT_NAME).last_id, later.id)
+
+    def test_orders_without_created_are_counted(self):
+        updated = self.settled - datetime.timedelta(days=3)
+        OrderBooking.objects.create(user=self.user, total_amount='700', payment_method='cash',
+                                    house_shifting_details_id='1', updated=updated)
+        OrderBooking.objects.create(user=self.user, total_amount='300', payment_method='cash',
+                                    house_shifting_details_id='1')
+
+        self.assertEqual(rollup_revenue(), 2)
+        days = dict(DailyRevenue.objects.values_list('day', 'total_amount'))
+        self.assertEqual(days, {timezone.localdate(updated): Decimal('700'), timezone.localdate(): Decimal('300')})
+
+    def test_a_batch_folded_by_another_run_is_dropped(self):
+        first = self.order('100')
+        self.order('200')
+        # Another run moved the checkpoint past the first order after this one read it
+        checkpoint = RollupCheckpoint.objects.create(name=CHECKPOINT_NAME, updated=timezone.now())
+        select_for_update = RollupCheckpoint.objects.select_for_update
+
+        def moved(*args, **kwargs):
+            RollupCheckpoint.objects.filter(id=checkpoint.id, last_id=0).update(last_id=first.id)
+            return select_for_update(*args, **kwargs)
+        with mock.patch.object(RollupCheckpoint.objects, 'select_for_update', moved):
+            self.assertEqual(rollup_revenue(batch_size=1), 1)
+        self.assertEqual(self.revenue(), {('house_shifting', 'cash'): (1, Decimal('200'))})
+
+    def test_maybe_rollup_runs_once_per_interval(self):
+        self.order('100')
+        self.assertEqual(maybe_rollup_revenue(), 1)
+        self.order('50')
+        self.assertIsNone(maybe_rollup_revenue())
+        self.assertEqual(self.revenue(), {('house_shifting', 'cash'): (1, Decimal('100'))})
+
+    def test_small_batches_give_the_same_totals(self):
+        for amount in ('10', '20', '30', '40', '50'):
+            self.order(amount)
+        self.assertEqual(rollup_revenue(batch_size=2), 5)
+        self.assertEqual(self.revenue(), {('house_shifting', 'cash'): (5, Decimal('150'))})
+
+
+class ConditionalPostTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def view(self, etag=ETAG, status=200):
+        def read_endpoint(request):
+            self.calls += 1
+            return HttpResponse('{}', status=status)
+        return conditional_post(lambda request: etag)(read_endpoint)
+
+    def post(self, view, **headers):
+        return view(self.factory.post('/', '{}', content_type='application/json', **headers))
+
+    def test_tags_a_fresh_response(self):
+        response = self.post(self.view())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], ETAG)
+        self.assertEqual(self.calls, 1)
+
+    def test_matching_tag_is_not_modified(self):
+        # django's condition() answers a POST with 412 Precondition Failed; these read endpoints want 304
+        for if_none_match in (ETAG, 'W/' + ETAG, '"other", ' + ETAG, '*'):
+            response = self.post(self.view(), HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(response.status_code, 304, if_none_match)
+            self.assertEqual(response['ETag'], ETAG)
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_tag_runs_the_view(self):
+        response = self.post(self.view(), HTTP_IF_NONE_MATCH='"v0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], ETAG)
+        self.assertEqual(self.calls, 1)
+
+    def test_without_an_etag_the_view_runs_untagged(self):
+        response = self.post(self.view(etag=None), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_errors_are_not_tagged(self):
+        response = self.post(self.view(status=400))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_get_is_not_conditional(self):
+        response = self.view()(self.factory.get('/', HTTP_IF_NONE_MATCH=ETAG))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    async def test_async_view(self):
+        async def read_endpoint(request):
+            self.calls += 1
+            return HttpResponse('{}')
+        view = conditional_post(lambda request: ETAG)(read_endpoint)
+        self.assertEqual((await self.post(view, HTTP_IF_NONE_MATCH=ETAG)).status_code, 304)
+        self.assertEqual((await self.post(view)).status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    def test_summary_etag_skips_bodies_that_are_not_objects(self):
+        for body in ('[1, 2]', '"text"', '3', 'not json'):
+            request = self.factory.post('/', body, content_type='application/json',
+                                        HTTP_AUTHORIZATION=settings.SECRET_KEY)
+            self.assertIsNone(house_shifting_summary_etag(request), body)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BookingDetailsEtagTests(TestCase):
+    def setUp(self):
+        local_cache.clear()
+        caches['default'].clear()
+        self.user = make_user()
+        self.order = OrderBooking.objects.create(user=self.user, total_amount='1200', created=timezone.now(),
+                                                 updated=timezone.now())
+
+    def booking_details(self, **headers):
+        return self.client.post('/BookingDetails/', json.dumps({'user_id': self.user.id}),
+                                content_type='application/json', HTTP_AUTHORIZATION=settings.SECRET_KEY, **headers)
+
+    def assert_changed(self, etag):
+        response = self.booking_details(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_validates_without_a_counter_row(self):
+        self.assertFalse(UserBookingCounter.objects.filter(user=self.user).exists())
+        etag = self.booking_details()['ETag']
+        self.assertEqual(self.booking_details(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_order_edits_change_the_etag(self):
+        etag = self.booking_details()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            # A save that leaves updated alone, like the booking_id the COD flow sets after insert
+            self.order.total_amount = '1500'
+            self.order.save()
+        response = self.assert_changed(etag)
+        self.assertEqual(response.json()['booking_details'][0]['total_amount'], '1500')
+
+    def test_set_based_updates_change_the_etag(self):
+        etag = self.booking_details()['ETag']
+        OrderBooking.objects.filter(id=self.order.id).update(payment_method='UPI',
+                                                             updated=timezone.now() + datetime.timedelta(seconds=1))
+        self.assert_changed(etag)
+
+    def test_new_and_deleted_orders_change_the_etag(self):
+        etag = self.booking_details()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderBooking.objects.create(user=self.user, total_amount='300', created=timezone.now())
+        etag = self.assert_changed(etag)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assert_changed(etag)
+
+
+@override_settings(CACHES=TEST_CACHES, DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    """Routing against a real second SQLite database, registered as the 'replica' alias for the class.
+
+    It is added after TestCase has wrapped the declared databases, so its rows outlive each test.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = connections.configure_settings(
+            {**connections.settings, 'replica': {'ENGINE': 'django.db.backends.sqlite3',
+                                                 'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3')}}
+        )['replica']
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(RollupCheckpoint)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        # The same row on both databases, as a replica that has not caught up yet
+        RollupCheckpoint.objects.create(name='orders', last_id=2)
+        RollupCheckpoint.objects.using('replica').all().delete()
+        RollupCheckpoint.objects.using('replica').create(name='orders', last_id=1)
+
+    def last_id(self):
+        return RollupCheckpoint.objects.get(name='orders').last_id
+
+    def request(self, view, user_id):
+        request = self.factory.post('/', json.dumps({'user_id': user_id}), content_type='application/json')
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_replica_reads_read_the_replica(self):
+        self.assertEqual(self.last_id(), 2)
+        self.assertEqual(replica_reads(lambda request: self.last_id())(None), 1)
+
+    def test_a_write_keeps_the_request_on_the_primary(self):
+        with routing(True):
+            self.assertEqual(self.last_id(), 1)
+            RollupCheckpoint.objects.create(name='revenue')
+            self.assertEqual(self.last_id(), 2)
+
+    def test_a_write_keeps_the_user_on_the_primary(self):
+        read = replica_reads(lambda request: HttpResponse(self.last_id()))
+        self.assertEqual(self.request(read, 7).content, b'1')
+
+        self.request(lambda request: RollupCheckpoint.objects.create(name='revenue') and HttpResponse(), 7)
+
+        self.assertEqual(self.request(read, 7).content, b'2')
+        self.assertEqual(self.request(read, 8).content, b'1')
+
+    def test_primary_reads_read_the_primary(self):
+        with routing(True):
+            with primary_reads():
+                self.assertEqual(self.last_id(), 2)
+            self.assertEqual(self.last_id(), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        local_cache.clear()
+        caches['default'].clear()
+        now = timezone.now()
+        self.user = make_user()
+        self.details = HouseShiftingDetails.objects.create(user=self.user, pickup_location='Chennai',
+                                                           created=now, updated=now)
+        self.products = HouseShiftingProducts.objects.create(house_shifting_details=self.details,
+                                                             product_amount='1200', single_sofa='1',
+                                                             created=now, updated=now)
+
+    def post(self, path, data):
+        return self.client.post(path, json.dumps(data), content_type='application/json')
+
+    def test_summary_matches_the_sync_view(self):
+        data = {'house_shifting_details_id': str(self.details.id), 'house_shifting_product_id': self.products.id}
+        full = self.post('/async/HouseShiftingSummaryDetails/', data).json()
+        self.assertEqual(full, self.post('/HouseShiftingSummaryDetails/', data).json())
+        self.assertIn('pickup_location', json.dumps(full))
+
+        sparse = self.post('/async/HouseShiftingSummaryDetails/', {**data, 'fields': ['product_amount']}).json()
+        self.assertEqual(sparse, self.post('/HouseShiftingSummaryDetails/', {**data, 'fields': ['product_amount']}).json())
+        self.assertEqual(sparse['product_amount'], '1200')
+        self.assertNotIn('pickup_location', sparse)
+
+    @override_settings(SMS_API_KEY='')
+    def test_otp_without_an_api_key_is_a_503(self):
+        now = timezone.now()
+        Register.objects.create(user_name='Kumar', user_phone_number=self.user.phone_number,
+                                user_email='kumar@example.com', registered_datetime=now, created=now, updated=now)
+        self.assertEqual([message.id for message in check_api_key(None)], ['truck_app.W001'])
+        data = {'phone_number': self.user.phone_number, 'user_id': self.user.id}
+        for path in ('/Resend_otp/', '/async/Resend_otp/'):
+            response = self.post(path, data)
+            self.assertEqual(response.status_code, 503, path)
+            self.assertEqual(response.json(), {'status_code': 503, 'message': 'SMS not configured'})
+
+
+class FoldStoppedTests(TestCase):
+    def setUp(self):
+        # Write out what earlier tests recorded, so the flusher thread leaves this test's directory alone
+        metrics.flush()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @staticmethod
+    def exited_pid():
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def snapshot(self, name, value):
+        with open(os.path.join(self.directory, name), 'w') as snapshot:
+            json.dump([['truckapp_sms_requests_total', ['otp'], value]], snapshot)
+
+    def test_folds_this_hosts_exited_processes_and_legacy_names(self):
+        pid, started = self.exited_pid(), time.time_ns()
+        self.snapshot('%s-%d-%d.json' % (metrics.HOST, pid, started), 1)
+        self.snapshot('%d-%d.json' % (pid, started), 2)
+        self.snapshot('%s-%d-%d.json' % (metrics.HOST, os.getpid(), started), 4)
+        self.snapshot('other.host-%d-%d.json' % (pid, started), 8)
+
+        metrics.fold_stopped()
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([
+            metrics.AGGREGATE, 'fold.lock', '%s-%d-%d.json' % (metrics.HOST, os.getpid(), started),
+            'other.host-%d-%d.json' % (pid, started)]))
+        self.assertEqual(metrics.merged_snapshots(), {('truckapp_sms_requests_total', ('otp',)): 15})
+
+    def test_defaults_outside_the_source_tree(self):
+        with override_settings(METRICS_DIR=None):
+            directory = metrics.metrics_dir()
+        self.assertEqual(os.path.commonpath([directory, tempfile.gettempdir()]), tempfile.gettempdir())
+        self.assertNotEqual(os.path.commonpath([directory, settings.BASE_DIR]), str(settings.BASE_DIR))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SparseOptionsTests(TestCase):
+    def test_accepted_options(self):
+        self.assertEqual(sparse_options({}), (None, False))
+        self.assertEqual(sparse_options({'fields': 'sofa, bed,', 'exclude_empty': True}), ({'sofa', 'bed'}, True))
+        self.assertEqual(sparse_options({'fields': ['sofa'], 'exclude_empty': None}), ({'sofa'}, False))
+        self.assertEqual(sparse_options({'fields': []}), (None, False))
+
+    def test_rejected_options(self):
+        for request_data in ({'fields': 5}, {'fields': {'sofa': 1}}, {'fields': ['sofa', 5]},
+                             {'exclude_empty': 'true'}, {'exclude_empty': 1}):
+            with self.assertRaises(SparseOptionsError, msg=request_data):
+                sparse_options(request_data)
+
+    def test_endpoints_answer_400(self):
+        data = json.dumps({'house_shifting_details_id': '1', 'house_shifting_product_id': 1, 'fields': 5})
+        for path in ('/HouseShiftingSummaryDetails/', '/async/HouseShiftingSummaryDetails/'):
+            response = self.client.post(path, data, content_type='application/json')
+            self.assertEqual(response.status_code, 400, path)
+            self.assertEqual(response.json()['status_code'], 400)
+
+
+class CompressionTests(TestCase):
+    def compressed(self, content_type):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(b'<p>truck</p>' * 200,
+                                                                        content_type=content_type))
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        return response.get('Content-Encoding')
+
+    def test_html_is_not_compressed(self):
+        self.assertIsNone(self.compressed('text/html; charset=utf-8'))
+        self.assertIn(self.compressed('application/json'), ('br', 'gzip'))
+
+    @override_settings(COMPRESSION_CONTENT_TYPES=None)
+    def test_defaults_leave_html_out(self):
+        del settings.COMPRESSION_CONTENT_TYPES
+        self.assertIsNone(self.compressed('text/html'))
+        self.assertIn(self.compressed('text/css'), ('br', 'gzip'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BookingCounterTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def order(self, **ids):
+        return OrderBooking.objects.create(user=self.user, created=timezone.now(), **ids)
+
+    def counts(self):
+        counter = UserBookingCounter.objects.get(user=self.user)
+        return (counter.total_bookings, counter.house_shifting_bookings, counter.vehicle_shifting_bookings,
+                counter.warehouse_bookings, counter.completed_bookings, counter.pending_bookings)
+
+    def test_first_order_seeds_the_counter_from_earlier_orders(self):
+        self.order(house_shifting_details_id='1')
+        self.order(vehicle_shifting_details_id='2')
+        record_booking(self.order(ware_house_storing_details_id='3'))
+        self.assertEqual(self.counts(), (3, 1, 1, 1, 0, 3))
+
+        record_booking(self.order(house_shifting_details_id=' ', vehicle_shifting_details_id='4'))
+        self.assertEqual(self.counts(), (4, 1, 2, 1, 0, 4))
+
+    def test_rebuild_counts_completed_bookings(self):
+        details = HouseShiftingDetails.objects.create(user=self.user, booking_id='TRK1', completed=True)
+        self.order(house_shifting_details_id=str(details.id), booking_id='TRK1')
+        self.order(house_shifting_details_id='9')
+        self.assertEqual(rebuild_counters([self.user.id]), 1)
+        self.assertEqual(self.counts(), (2, 2, 0, 0, 1, 1))
+
+
+class FastJsonResponseTests(TestCase):
+    data = {'created': datetime.datetime(2025, 3, 1, 9, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2025, 3, 1), 'amount': Decimal('1250.50'), 'id': uuid.UUID(int=7),
+            'message': gettext_lazy('OTP Send successfully'), 1: 'key'}
+
+    def test_same_json_as_json_response(self):
+        expected = JsonResponse(self.data).content
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_JSON_ENCODER=fast):
+                self.assertEqual(json.loads(FastJsonResponse(self.data).content), json.loads(expected))
+
+    @unittest.skipIf(responses.orjson is None, "orjson is not installed")
+    def test_encodes_with_orjson(self):
+        with mock.patch.object(responses.orjson, 'dumps', wraps=responses.orjson.dumps) as dumps:
+            FastJsonResponse(self.data)
+            FastJsonResponse(self.data, json_dumps_params={'indent': 2})
+        self.assertEqual(dumps.call_count, 1)
+
+    def test_non_dict_needs_safe_false(self):
+        with self.assertRaises(TypeError):
+            FastJsonResponse([1, 2])
+        self.assertEqual(FastJsonResponse([1, 2], safe=False).content, b'[1,2]')
+
+
+@override_settings(SEARCH_BACKEND='tokens', SEARCH_MIN_PREFIX=2, SEARCH_MAX_PREFIX=20)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        with self.captureOnCommitCallbacks(execute=True):
+            # Stored with the country code, still found by the local number
+            self.profile = make_profile(self.user)
+            self.profile.user_phone_number = '+919000000001'
+            self.profile.save()
+            self.details = HouseShiftingDetails.objects.create(user=self.user, booking_id='TRK42',
+                                                               pickup_location='Anna Nagar, Chennai',
+                                                               drop_location='Madurai')
+
+    def matches(self, query, kind='house_shifting'):
+        return list(search_ids(query, kind).values_list('object_id', flat=True))
+
+    def test_every_term_is_a_prefix(self):
+        self.assertEqual(self.matches('chen mad'), [self.details.id])
+        self.assertEqual(self.matches('kum 90000'), [self.details.id])
+        self.assertEqual(self.matches('chennai salem'), [])
+        self.assertEqual(self.matches('c'), [])
+        self.assertEqual(self.matches('9000000001', kind=CUSTOMER), [self.profile.id])
+
+    def test_saves_and_deletes_follow_the_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.details.pickup_location = 'Salem'
+            self.details.save()
+            self.assertEqual(self.matches('salem'), [])
+        self.assertEqual(self.matches('salem'), [self.details.id])
+        self.assertEqual(self.matches('chennai'), [])
+        self.details.delete()
+        self.assertEqual(self.matches('salem'), [])
+
+    def test_rebuild_indexes_rows_written_without_signals(self):
+        HouseShiftingDetails.objects.filter(id=self.details.id).update(pickup_location='Vellore')
+        self.assertEqual(self.matches('vellore'), [])
+        self.assertEqual(rebuild_index(batch_size=1, clear=True), 2)
+        self.assertEqual(self.matches('vell'), [self.details.id])
+        self.assertEqual(self.matches('chennai'), [])
+
+
+class BackgroundLoggingTests(SimpleTestCase):
+    def logger(self, handler):
+        logger = logging.getLogger('truck_app.tests.logs')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_writes_one_json_object_per_record(self):
+        stream = io.StringIO()
+        handler = BackgroundHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        logger = self.logger(handler)
+        phone_numbers = ['9000000001']
+        logger.info("OTP sent to %s", phone_numbers, extra={'register_id': 7})
+        # The message is frozen when it is queued, not when the thread writes it
+        phone_numbers.append('9000000002')
+        try:
+            raise ValueError('bad amount')
+        except ValueError:
+            logger.exception("Rollup failed")
+        handler.close()
+
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual((first['level'], first['logger'], first['message'], first['register_id']),
+                         ('INFO', 'truck_app.tests.logs', "OTP sent to ['9000000001']", 7))
+        self.assertIn('ValueError: bad amount', second['exc'])
+
+    def test_full_queue_drops_records(self):
+        handler = BackgroundHandler(io.StringIO(), queue_size=1)
+        handler.listener.stop()
+        logger = self.logger(handler)
+        for number in range(3):
+            logger.info("record %s", number)
+        self.assertEqual(handler.dropped, 2)
+        handler.close()
+
+    def test_sampling_thins_only_debug(self):
+        sampling = SamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(logging.makeLogRecord({'levelno': logging.DEBUG})))
+        self.assertTrue(sampling.filter(logging.makeLogRecord({'levelno': logging.INFO})))
+        self.assertTrue(SamplingFilter(rate=1).filter(logging.makeLogRecord({'levelno': logging.DEBUG})))
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def middleware(self):
+        def view(request):
+            return HttpResponse(str(CustomUser.objects.count()))
+        with override_settings(PROFILE_TOKEN='secret', PROFILE_SAMPLE_RATE=0, PROFILE_DIR=self.directory):
+            return ProfilingMiddleware(view)
+
+    def test_not_loaded_without_a_token_or_sample_rate(self):
+        with override_settings(PROFILE_TOKEN='', PROFILE_SAMPLE_RATE=0):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(HttpResponse)
+
+    def test_profiles_only_requests_with_the_token(self):
+        middleware = self.middleware()
+        self.assertNotIn('X-Profile-Id', middleware(RequestFactory().get('/', HTTP_X_PROFILE='wrong')))
+        self.assertEqual(os.listdir(self.directory), [])
+
+        response = middleware(RequestFactory().get('/bookings/', HTTP_X_PROFILE='secret'))
+        path = os.path.join(self.directory, response['X-Profile-Id'])
+        with open(path + '.json') as summary:
+            summary = json.load(summary)
+        self.assertEqual((summary['path'], summary['status'], summary['mode'], summary['query_count']),
+                         ('/bookings/', 200, 'sampling', 1))
+        self.assertIn('COUNT', summary['queries'][0]['sql'])
+        self.assertTrue(os.path.exists(path + '.folded'))
+
+    def test_deterministic_mode_writes_pstats(self):
+        response = self.middleware()(RequestFactory().get('/', HTTP_X_PROFILE='secret',
+                                                          HTTP_X_PROFILE_MODE='deterministic'))
+        stats = pstats.Stats(os.path.join(self.directory, response['X-Profile-Id'] + '.prof'))
+        self.assertTrue(stats.total_calls)
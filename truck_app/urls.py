@@ -1,4 +1,5 @@
 from django.urls import path
+from . import async_views
 from . import views
 
 urlpatterns = [
@@ -24,6 +25,17 @@ urlpatterns = [
     path('WareHouseStoringProducts/', views.warehouse_storing_products, name='WareHouseStoringProducts'),
     path('WareHouseSummaryDetails/', views.warehouse_summary_details, name='WareHouseSummaryDetails'),
     path('OrderBooking/', views.order_booking, name='OrderBooking'),
+    # Coroutine versions of the I/O bound endpoints, for the ASGI server
+    path('async/Resend_otp/', async_views.resend_otp, name='AsyncResend_otp'),
+    path('async/VerifyPhoneNumber/', async_views.verify_phone_number, name='AsyncVerifyPhoneNumber'),
+    path('async/verify_otp/', async_views.verify_otp, name='AsyncVerify_otp'),
+    path('async/BookingDetails/', async_views.booking_details, name='AsyncBookingDetails'),
+    path('async/HouseShiftingSummaryDetails/', async_views.house_shifting_summary_details,
+         name='AsyncHouseShiftingSummaryDetails'),
+    path('async/VehicleShiftingSummaryDetails/', async_views.vehicle_shifting_summary_details,
+         name='AsyncVehicleShiftingSummaryDetails'),
+    path('async/WareHouseSummaryDetails/', async_views.warehouse_summary_details,
+         name='AsyncWareHouseSummaryDetails'),
 
 ]
 
@@ -1,12 +1,30 @@
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from .responses import FastJsonResponse as JsonResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
 from django.utils import timezone
+from .counters import record_booking
+from .conditional import conditional_post
+from .conditional import booking_details_etag
+from .conditional import house_shifting_summary_etag
+from .conditional import user_profile_etag
+from .conditional import vehicle_shifting_summary_etag
+from .conditional import warehouse_summary_etag
 from .functions import remove_string
-import requests
+from .profiles import cached_user_profile_details
+from .profiles import profile_password
+from .routers import replica_reads
+from .sms import send_otp
+from .summaries import cached_booking_history
+from .summaries import cached_summary
+from .summaries import house_shifting_summary
+from .summaries import vehicle_shifting_summary
+from .summaries import wants_sparse
+from .summaries import warehouse_summary
 from datetime import datetime
 from django.utils.dateparse import parse_datetime
+import logging
 import random
 import re
 
@@ -34,6 +52,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from truckapp_project import settings
 
+logger = logging.getLogger(__name__)
+
 
 def webpage(request):
     return render(request, 'truck_app/index.html')
@@ -54,7 +74,6 @@ def login(request):
             registered_user = Register.objects.filter(user_phone_number=phone_number).first()
             register_id = registered_user.id
             if user is not None:
-                print("user.password", registered_user.password1)
                 if password != registered_user.password1:
                     return JsonResponse({'status_code': 400, 'message': 'User Password is Wrong'}, safe=False)
 
@@ -69,19 +88,7 @@ def login(request):
                             user_phone_number = User.objects.values_list("phone_number", flat=True)
                             for phone_number_list in user_phone_number:
                                 if phone_number_list == phone_number:
-                                    phone_numbers = "+91" + phone_number
-                                    url_1 = "https://2factor.in/API/V1"
-                                    api_key = "/8375cfcd-077a-11ee-addf-0200cd936042"
-                                    sms = "/SMS/"
-                                    auto_generate = "/AUTOGEN2/APM_testing_OTP"
-                                    # template_name = "/APM_testing_OTP"
-                                    url = url_1 + api_key + sms + phone_numbers + auto_generate
-                                    print("url", url)
-                                    payload = {}
-                                    headers = {}
-                                    response = requests.request("GET", url, headers=headers, data=payload)
-                                    response_json = json.loads(response.text)
-                                    otp = response_json["OTP"]
+                                    otp = send_otp(phone_number)
                                     registered_user.otp = otp
                                     registered_user.save()
                                     return JsonResponse({'status_code': 500,
@@ -101,33 +108,15 @@ def resend_otp(request):
         request_data = json.loads(request.body)
         now = timezone.localtime(timezone.now())
         user_phone_number = request_data['phone_number']
-        print("user_phone_number", user_phone_number)
         user_id = request_data['user_id']
-        print("user_id",user_id)
         phone_number_list = User.objects.values_list("phone_number", flat=True)
-        print("phone_number_list", phone_number_list)
         if user_phone_number in phone_number_list:
-            print(">>>>>>>>>>>>>>>>>>")
-            phone_number = "+91" + user_phone_number
-            url_1 = "https://2factor.in/API/V1"
-            api_key = "/8375cfcd-077a-11ee-addf-0200cd936042"
-            sms = "/SMS/"
-            auto_generate = "/AUTOGEN2/APM_testing_OTP"
-            # template_name = "/APM_testing_OTP"
-            url = url_1 + api_key + sms + phone_number + auto_generate
-            print("url", url)
-            payload = {}
-            headers = {}
-
-            response = requests.request("GET", url, headers=headers, data=payload)
-
-            response_json = json.loads(response.text)
-            otp = response_json["OTP"]
-            print("otp",otp)
+            otp = send_otp(user_phone_number)
             register = Register.objects.filter(user_phone_number=user_phone_number).first()
             register.otp = otp
             register.save()
             register_id = register.id
+            logger.info("OTP resent", extra={'user_id': user_id, 'register_id': register_id})
             return JsonResponse({'status_code': 200,
                                  'message': 'OTP Send successfully',
                                  "OTP": otp,
@@ -187,21 +176,7 @@ def register(request):
             otp = None
             phone_number_list = User.objects.values_list("phone_number", flat=True)
             if user_phone_number not in phone_number_list:
-                phone_number = "+91" + user_phone_number
-                url_1 = "https://2factor.in/API/V1"
-                api_key = "/8375cfcd-077a-11ee-addf-0200cd936042"
-                sms = "/SMS/"
-                auto_generate = "/AUTOGEN2/APM_testing_OTP"
-                # template_name = "/APM_testing_OTP"
-                url = url_1 + api_key + sms + phone_number + auto_generate
-                print("url",url)
-                payload = {}
-                headers = {}
-
-                response = requests.request("GET", url, headers=headers, data=payload)
-
-                response_json = json.loads(response.text)
-                otp = response_json["OTP"]
+                otp = send_otp(user_phone_number)
 
             form = CustomUserCreationForm(request_data)
 
@@ -285,26 +260,14 @@ def verify_phone_number(request):
         phone_number = request_data["phone_number"]
         user_phone_number = User.objects.values_list("phone_number", flat=True)
         for phone_number_list in user_phone_number:
-            print("phone_number_list",phone_number_list)
+            logger.debug("Checking phone number", extra={'candidate': phone_number_list})
             if phone_number_list == phone_number:
-                print("phone_number_list--phone_number_list",phone_number_list)
-                phone_numbers = "+91" + phone_number
-                url_1 = "https://2factor.in/API/V1"
-                api_key = "/8375cfcd-077a-11ee-addf-0200cd936042"
-                sms = "/SMS/"
-                auto_generate = "/AUTOGEN2/APM_testing_OTP"
-                # template_name = "/APM_testing_OTP"
-                url = url_1 + api_key + sms + phone_numbers + auto_generate
-                print("url", url)
-                payload = {}
-                headers = {}
-                response = requests.request("GET", url, headers=headers, data=payload)
-                response_json = json.loads(response.text)
-                otp = response_json["OTP"]
+                otp = send_otp(phone_number)
                 register = Register.objects.filter(user_phone_number=phone_number).first()
                 register.otp = otp
                 register.save()
                 register_id = register.id
+                logger.info("Phone number verification OTP sent", extra={'register_id': register_id})
                 return JsonResponse({"status": 200,
                                      "register_id": register_id,
                                      "OTP": otp,
@@ -341,6 +304,7 @@ def reset_password(request):
 
 
 @csrf_exempt
+@conditional_post(user_profile_etag)
 def user_profile(request):
     """Get the user details through the user id"""
     if request.method == 'POST':
@@ -350,36 +314,16 @@ def user_profile(request):
             request_data = json.loads(request.body)
             user_id = request_data["user_id"]
 
-            # Getting the Login user's details from User(CustomUser) table
-            user_profile = UserProfile.objects.filter(user_id=user_id).first()
-            booking_count = OrderBooking.objects.filter(user=user_id).count()
-
-            if user_profile is not None:
-                user_name = user_profile.user_name
-
-                if user_name is None or "":
-                    user_name = "null"
-
-                user_phone_number = user_profile.user_phone_number
-                if user_phone_number is None or "":
-                    user_phone_number = "null"
-
-                user_email = user_profile.user_email
-                if user_email is None or "":
-                    user_email = "null"
-
-                password = user_profile.password
-                if password is None or "":
-                    password = "null"
-
+            # Profile fields and booking counts, cached until the user's rows change
+            user_profile_details = cached_user_profile_details(user_id)
+            if user_profile_details is not None:
+                profile_details = {field: value for field, value in user_profile_details.items()
+                                   if field != "password_digest"}
                 return JsonResponse({'status_code': 200,
                                      'message': 'User Details',
                                      "user_id": user_id,
-                                     "booking_count": booking_count,
-                                     "user_name": user_name,
-                                     "user_phone_number": user_phone_number,
-                                     "user_email": user_email,
-                                     "password": password}, safe=False)
+                                     **profile_details,
+                                     "password": profile_password(user_id)}, safe=False)
             else:
                 return JsonResponse({'status_code': 400, 'message': 'User Profile is None'})
         else:
@@ -389,6 +333,8 @@ def user_profile(request):
 
 
 @csrf_exempt
+@replica_reads
+@conditional_post(booking_details_etag)
 def booking_details(request):
     if request.method == "POST":
         header_secret_key = request.headers['Authorization']
@@ -403,11 +349,13 @@ def booking_details(request):
                     user_id = ''
 
                 user = User.objects.filter(id=user_id).first()
-                booking_count = OrderBooking.objects.filter(user=user).order_by('-created')
-                print("booking_count", booking_count)
-                # Convert the query set to a list of dictionaries
-                bookings = list(booking_count.values())
-                print("bookings", bookings)
+                if wants_sparse(request_data):
+                    bookings = cached_booking_history(user, request_data)
+                else:
+                    booking_count = OrderBooking.objects.filter(user=user).order_by('-created')
+                    # Convert the query set to a list of dictionaries
+                    bookings = list(booking_count.values())
+                logger.debug("Booking history", extra={'user_id': user_id, 'bookings': len(bookings)})
                 return JsonResponse({'status_code': 200,
                                      'message': 'user booking details',
                                      "booking_details": bookings}, safe=False)
@@ -416,13 +364,13 @@ def booking_details(request):
 
 
 @csrf_exempt
+@replica_reads
 def user_booking_details(request):
     if request.method == "POST":
         header_secret_key = request.headers['Authorization']
         settings_secret_key = settings.SECRET_KEY
         if header_secret_key == settings_secret_key:
             if request.body:
-                print(">>>>")
                 now = timezone.localtime(timezone.now())
                 request_data = json.loads(request.body)
 
@@ -446,22 +394,25 @@ def user_booking_details(request):
                 except:
                     vehicle_shifting_details_id = ""
 
-                print("vehicle_shifting_details_id",vehicle_shifting_details_id)
                 try:
                     chosen_shifting_vehicle_id = request_data["chosen_shifting_vehicle_details_id"]
                 except:
                     chosen_shifting_vehicle_id = ""
-                print("chosen_shifting_vehicle_id",chosen_shifting_vehicle_id)
                 try:
                     warehouse_storing_details_id = request_data["warehouse_storing_details_id"]
                 except:
                     warehouse_storing_details_id = ""
 
-                print("warehouse_storing_details_id", warehouse_storing_details_id)
                 try:
                     warehouse_storing_products_id = request_data["warehouse_storing_products_id"]
                 except:
                     warehouse_storing_products_id = ""
+                logger.debug("User booking details", extra={
+                    'user_id': user_id,
+                    'house_shifting_details_id': house_shifting_details_id,
+                    'vehicle_shifting_details_id': vehicle_shifting_details_id,
+                    'chosen_shifting_vehicle_id': chosen_shifting_vehicle_id,
+                    'warehouse_storing_details_id': warehouse_storing_details_id})
 
                 if house_shifting_details_id:
                     house_shifting_products_id = HouseShiftingProducts.objects.filter(id=house_shifting_product_id).first()
@@ -1937,14 +1888,21 @@ def house_shifting_products(request):
 
 
 @csrf_exempt
+@replica_reads
+@conditional_post(house_shifting_summary_etag)
 def house_shifting_summary_details(request):
     if request.method == "POST":
         request_data = json.loads(request.body)
-        print(">>>>>>>>>>>>>>>>>>>>>>>>>")
+        if wants_sparse(request_data):
+            summary = cached_summary(house_shifting_summary, request_data["house_shifting_details_id"],
+                                     request_data["house_shifting_product_id"], request_data)
+            if summary is None:
+                return JsonResponse({'status_code': 200, "message": "House Shifting Details id is None"})
+            return JsonResponse(summary)
         house_shifting_details_id = request_data["house_shifting_details_id"]
-        print("house_shifting_details_id",house_shifting_details_id)
         house_shifting_product_id = request_data["house_shifting_product_id"]
-        print("house_shifting_product_id",house_shifting_product_id)
+        logger.debug("House shifting summary", extra={'house_shifting_details_id': house_shifting_details_id,
+                                                      'house_shifting_product_id': house_shifting_product_id})
         house_shifting_products_id = HouseShiftingProducts.objects.filter(id=house_shifting_product_id).first()
         house_shifting_details_id_2 = house_shifting_products_id.house_shifting_details.id
         if str(house_shifting_details_id_2) == house_shifting_details_id:
@@ -2636,9 +2594,17 @@ def chosen_shifting_vehicle(request):
 
 
 @csrf_exempt
+@replica_reads
+@conditional_post(vehicle_shifting_summary_etag)
 def vehicle_shifting_summary_details(request):
     if request.method == "POST":
         request_data = json.loads(request.body)
+        if wants_sparse(request_data):
+            summary = cached_summary(vehicle_shifting_summary, request_data["vehicle_shifting_details_id"],
+                                     request_data["chosen_shifting_vehicle_id"], request_data)
+            if summary is None:
+                return JsonResponse({"message": "vehicle shifting details page"})
+            return JsonResponse(summary)
         vehicle_shifting_details_id = request_data["vehicle_shifting_details_id"]
         chosen_shifting_vehicle_id = request_data["chosen_shifting_vehicle_id"]
         chosen_shifting_vehicle_details = ChosenShiftingVehicle.objects.filter(
@@ -3029,8 +2995,16 @@ def warehouse_storing_products(request):
 
 
 @csrf_exempt
+@replica_reads
+@conditional_post(warehouse_summary_etag)
 def warehouse_summary_details(request):
     request_data = json.loads(request.body)
+    if wants_sparse(request_data):
+        summary = cached_summary(warehouse_summary, request_data["warehouse_storage_details_id"],
+                                 request_data["warehouse_storing_products_id"], request_data)
+        if summary is None:
+            return JsonResponse({'status_code': 200, "message": "WareHouse Storing Details id is None"})
+        return JsonResponse(summary)
     warehouse_storage_detail_id = request_data["warehouse_storage_details_id"]
     warehouse_storing_products_id = request_data["warehouse_storing_products_id"]
     ware_house_storing_products = WareHouseStoringProducts.objects \
@@ -3606,44 +3580,46 @@ def order_booking(request):
                 now = timezone.localtime(timezone.now())
                 booking_id = None
                 if user_id:
-                    print(">>>>>>>")
+                    logger.debug("Creating COD order", extra={'user_id': user_id})
                     user = User.objects.filter(id=user_id).first()
-                    order_booking = OrderBooking(user=user,
-                                                 booking_id=booking_id,
-                                                 booking_datetime=booking_formatted_date,
-                                                 house_shifting_details_id=house_shifting_details_id,
-                                                 house_shifting_product_id=house_shifting_product_id,
-                                                 vehicle_shifting_details_id=vehicle_shifting_details_id,
-                                                 chosen_shifting_vehicle_details_id=chosen_shifting_vehicle_details_id,
-                                                 ware_house_storing_details_id=warehouse_storing_details_id,
-                                                 ware_house_storing_products_id=warehouse_storing_products_id,
-                                                 shifting_type=shifting_type,
-                                                 payment_method=payment_method,
-                                                 total_amount=total_amount,
-                                                 created=now,
-                                                 updated=now)
-                    order_booking.save()
-                    booking_id = order_booking.id
-                    booking_details_id = OrderBooking.objects.filter(id=booking_id).first()
-                    booking_details_id.booking_id = "APM00" + str(booking_id)
-                    booking_details_id.save()
-                    if not booking_details_id.house_shifting_details_id == None or booking_details_id.house_shifting_details_id == " ":
-                        house_shifting_id = booking_details_id.house_shifting_details_id
-                        house_shifting_details = HouseShiftingDetails.objects.filter(id=house_shifting_id).first()
-                        house_shifting_details.booking_id = "APM00" + str(booking_id)
-                        house_shifting_details.save()
-                    elif not booking_details_id.vehicle_shifting_details_id == None or booking_details_id.vehicle_shifting_details_id == " ":
-                        vehicle_shifting_id = booking_details_id.vehicle_shifting_details_id
-                        vehicle_shifting_details = VehicleShiftingDetails.objects.filter(id=vehicle_shifting_id).first()
-                        vehicle_shifting_details.booking_id = "APM00" + str(booking_id)
-                        vehicle_shifting_details.save()
-                    elif not booking_details_id.ware_house_storing_details_id == None or booking_details_id.ware_house_storing_details_id == " ":
-                        ware_house_storing_id = booking_details_id.ware_house_storing_details_id
-                        warehouse_storage_details = WareHouseStorageDetails.objects.filter(id=ware_house_storing_id).first()
-                        warehouse_storage_details.booking_id = "APM00" + str(booking_id)
-                        warehouse_storage_details.save()
-                    else:
-                        shifting_id = None
+                    with transaction.atomic():
+                        order_booking = OrderBooking(user=user,
+                                                     booking_id=booking_id,
+                                                     booking_datetime=booking_formatted_date,
+                                                     house_shifting_details_id=house_shifting_details_id,
+                                                     house_shifting_product_id=house_shifting_product_id,
+                                                     vehicle_shifting_details_id=vehicle_shifting_details_id,
+                                                     chosen_shifting_vehicle_details_id=chosen_shifting_vehicle_details_id,
+                                                     ware_house_storing_details_id=warehouse_storing_details_id,
+                                                     ware_house_storing_products_id=warehouse_storing_products_id,
+                                                     shifting_type=shifting_type,
+                                                     payment_method=payment_method,
+                                                     total_amount=total_amount,
+                                                     created=now,
+                                                     updated=now)
+                        order_booking.save()
+                        booking_id = order_booking.id
+                        booking_details_id = OrderBooking.objects.filter(id=booking_id).first()
+                        booking_details_id.booking_id = "APM00" + str(booking_id)
+                        booking_details_id.save()
+                        if not booking_details_id.house_shifting_details_id == None or booking_details_id.house_shifting_details_id == " ":
+                            house_shifting_id = booking_details_id.house_shifting_details_id
+                            house_shifting_details = HouseShiftingDetails.objects.filter(id=house_shifting_id).first()
+                            house_shifting_details.booking_id = "APM00" + str(booking_id)
+                            house_shifting_details.save()
+                        elif not booking_details_id.vehicle_shifting_details_id == None or booking_details_id.vehicle_shifting_details_id == " ":
+                            vehicle_shifting_id = booking_details_id.vehicle_shifting_details_id
+                            vehicle_shifting_details = VehicleShiftingDetails.objects.filter(id=vehicle_shifting_id).first()
+                            vehicle_shifting_details.booking_id = "APM00" + str(booking_id)
+                            vehicle_shifting_details.save()
+                        elif not booking_details_id.ware_house_storing_details_id == None or booking_details_id.ware_house_storing_details_id == " ":
+                            ware_house_storing_id = booking_details_id.ware_house_storing_details_id
+                            warehouse_storage_details = WareHouseStorageDetails.objects.filter(id=ware_house_storing_id).first()
+                            warehouse_storage_details.booking_id = "APM00" + str(booking_id)
+                            warehouse_storage_details.save()
+                        else:
+                            shifting_id = None
+                        record_booking(booking_details_id)
                     booking_ids = booking_details_id.booking_id
                     return JsonResponse({"status": 200,
                                          "message": "Your order placed successfully",
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TruckAppWebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'truck_app_web'
+
+    def ready(self):
+        from .live import connect_signals
+        connect_signals()
@@ -0,0 +1,82 @@
+"""Static asset pipeline for the admin pages.
+
+The stylesheets and scripts under static/truck_app_web are kept readable in the repository.
+collectstatic minifies them and then stores them under content-hashed names with a manifest, so
+pages can reference them forever-cacheable: a changed file gets a new name.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.contrib.staticfiles.views import serve as serve_source
+from django.core.files.base import ContentFile
+from django.views.static import serve
+
+CSS_STRINGS_AND_COMMENTS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+CSS_STRINGS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+
+# Only our own assets are minified; third party files under STATIC_ROOT are left as shipped
+MINIFIED_PREFIX = 'truck_app_web/'
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+UNHASHED_CACHE_CONTROL = 'public, max-age=300'
+
+
+def minify_css(css):
+    """Drop comments and insignificant whitespace, leaving quoted strings untouched"""
+    css = CSS_STRINGS_AND_COMMENTS.sub(lambda match: match.group(1) or '', css)
+    parts = CSS_STRINGS.split(css)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[index])
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)
+        parts[index] = re.sub(r';}', '}', part)
+    return ''.join(parts).strip()
+
+
+def minify_js(js):
+    """Drop indentation, blank lines and whole-line // comments.
+
+    Line breaks are kept, so automatic semicolon insertion behaves exactly as in the source.
+    """
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+class MinifiedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            for path in paths:
+                minify = MINIFIERS.get(os.path.splitext(path)[1])
+                if minify is None or not path.startswith(MINIFIED_PREFIX):
+                    continue
+                with self.open(path) as collected:
+                    content = minify(collected.read().decode('utf-8'))
+                self.delete(path)
+                self._save(path, ContentFile(content.encode('utf-8')))
+                # Hash the minified copy rather than the source file
+                paths[path] = (self, path)
+        yield from super().post_process(paths, dry_run, **options)
+
+
+def serve_static(request, path):
+    """Serve collected files from STATIC_ROOT when no web server sits in front of the app.
+
+    Content-hashed names never change, so they are cached for a year; the unhashed copies that
+    collectstatic also writes are cached briefly. With DEBUG on, {% static %} links the unhashed
+    source files, which are served through the finders without collectstatic.
+    """
+    if settings.DEBUG:
+        return serve_source(request, path)
+    response = serve(request, path, document_root=settings.STATIC_ROOT)
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    if path in hashed_files.values():
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = UNHASHED_CACHE_CONTROL
+    return response
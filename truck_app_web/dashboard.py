@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from truck_app.models import HouseShiftingDetails
+from truck_app.models import UserProfile
+from truck_app.models import VehicleShiftingDetails
+from truck_app.models import WareHouseStorageDetails
+
+DASHBOARD_COUNTS_KEY = 'truck_app_web:dashboard_counts'
+DASHBOARD_LOCK_KEY = 'truck_app_web:dashboard_counts:lock'
+
+
+def _table_counts(model):
+    """Total and completed rows of a shifting table in one conditional aggregation query"""
+    counts = model.objects.aggregate(total=Count('id'), completed=Count('id', filter=Q(completed=True)))
+    # Pending is everything not completed, i.e. completed=False or NULL
+    counts['pending'] = counts['total'] - counts['completed']
+    return counts
+
+
+def compute_dashboard_counts():
+    house_shifting = _table_counts(HouseShiftingDetails)
+    vehicle_shifting = _table_counts(VehicleShiftingDetails)
+    warehouse_shifting = _table_counts(WareHouseStorageDetails)
+    tables = (house_shifting, vehicle_shifting, warehouse_shifting)
+    return {"house_shifting_count": house_shifting['total'],
+            "vehicle_shifting_count": vehicle_shifting['total'],
+            "warehouse_shifting_count": warehouse_shifting['total'],
+            "user_profile_count": UserProfile.objects.count(),
+            "completed_count": sum(table['completed'] for table in tables),
+            "pending_count": sum(table['pending'] for table in tables)}
+
+
+def dashboard_counts():
+    """Dashboard counters, cached for DASHBOARD_CACHE_TTL seconds.
+
+    The cached entry outlives its TTL so that, once it goes stale, a single request recomputes it
+    under a lock while concurrent requests keep serving the stale counts instead of all hitting the
+    database at once.
+    """
+    ttl = getattr(settings, 'DASHBOARD_CACHE_TTL', 30)
+    entry = cache.get(DASHBOARD_COUNTS_KEY)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['counts']
+
+    if not cache.add(DASHBOARD_LOCK_KEY, 1, timeout=ttl):
+        if entry is not None:
+            return entry['counts']
+        # Cold cache and someone else is computing: give them a moment before computing ourselves
+        for _ in range(10):
+            time.sleep(0.05)
+            entry = cache.get(DASHBOARD_COUNTS_KEY)
+            if entry is not None:
+                return entry['counts']
+        return compute_dashboard_counts()
+
+    try:
+        counts = compute_dashboard_counts()
+        cache.set(DASHBOARD_COUNTS_KEY, {'counts': counts, 'fresh_until': time.time() + ttl}, timeout=ttl * 10)
+    finally:
+        cache.delete(DASHBOARD_LOCK_KEY)
+    return counts
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from truck_app.models import HouseShiftingDetails
+from truck_app.models import OrderBooking
+from truck_app.models import VehicleShiftingDetails
+from truck_app.models import WareHouseStorageDetails
+from truck_app.signals import shifting_details_updated
+from truck_app.summaries import INVENTORY_CATEGORIES
+
+# Related rows shown on each admin detail page: (products relation, vehicle relation)
+DETAIL_RELATIONS = {
+    HouseShiftingDetails: ('houseshiftingproducts_set', 'houseshiftingselectedvehicle_set'),
+    VehicleShiftingDetails: (None, 'chosenshiftingvehicle_set'),
+    WareHouseStorageDetails: ('warehousestoringproducts_set', 'warehouseselectedvehicle_set'),
+}
+
+EMPTY_QUANTITIES = (None, '', '0')
+
+# Shown when the booking has no chosen vehicle image
+PLACEHOLDER_VEHICLE_IMAGE = ("https://blogger.googleusercontent.com/img/b/R29vZ2xl/AVvXsEgPpiVAbcdKSMPzw7U83mhydTiDULSodiM-"
+                             "R3p-gbe63NY-EvghFeeOsoOsKLtih-9-7dKf4qUm7gNTcE0RqeBJkM4j_Z9y49pAhP9M0GsByBNNEYU71b9hRAJgF4f1nr"
+                             "5uuOG074krA4Ddjt_XBfnbifumE2oHubuGhDXLrc0paMz3M_fmXJaMSgLy0g/s1080/"
+                             "WhatsApp%20Image%202023-05-01%20at%208.10.13%20PM.jpeg")
+
+
+def _first(related_manager):
+    # .all() on a prefetched relation is served from the prefetch cache, unlike .first()
+    rows = list(related_manager.all())
+    return rows[0] if rows else None
+
+
+def selected_items(products):
+    """[(category, [(item, quantity)])] for the inventory chosen in a products row"""
+    if products is None:
+        return []
+    items = []
+    for category, fields in INVENTORY_CATEGORIES.items():
+        chosen = [(field.replace('_', ' '), getattr(products, field)) for field in fields
+                  if getattr(products, field) not in EMPTY_QUANTITIES]
+        if chosen:
+            items.append((category.replace('_', ' ').title(), chosen))
+    return items
+
+
+def set_completed_date(model, detail_id, completed_date):
+    """Save the completed date posted by the datetime-local input of a detail page"""
+    if completed_date:
+        date_obj = datetime.strptime(completed_date, '%Y-%m-%dT%H:%M')
+        if model.objects.filter(id=detail_id).update(completed_date=date_obj.strftime('%Y-%m-%d %H:%M:%S')):
+            shifting_details_updated.send(sender=model, ids=[detail_id], values={'completed_date': completed_date})
+
+
+def booking_detail_context(model, detail_id):
+    """Everything an admin detail page shows for one booking, in a fixed number of queries.
+
+    The details row and its user come in one query, and the user's profile, the products and the
+    chosen vehicle in one prefetch query each. The order is looked up by booking id.
+    Returns None when the row does not exist.
+    """
+    products_relation, vehicle_relation = DETAIL_RELATIONS[model]
+    prefetches = ['user__userprofile_set', vehicle_relation]
+    if products_relation:
+        prefetches.append(products_relation)
+    detail = model.objects.select_related('user').prefetch_related(*prefetches).filter(id=detail_id).first()
+    if detail is None:
+        return None
+
+    products = _first(getattr(detail, products_relation)) if products_relation else None
+    vehicle = _first(getattr(detail, vehicle_relation))
+    order = None
+    if detail.booking_id:
+        order = OrderBooking.objects.filter(booking_id=detail.booking_id).first()
+    return {"detail": detail,
+            "user_profile": _first(detail.user.userprofile_set),
+            "products": products,
+            "selected_items": selected_items(products),
+            "vehicle": vehicle,
+            "vehicle_image": (vehicle and vehicle.vehicle_image) or PLACEHOLDER_VEHICLE_IMAGE,
+            "order": order,
+            "completed_date": detail.completed_date.strftime("%Y-%m-%dT%H:%M") if detail.completed_date else ""}
@@ -0,0 +1,116 @@
+import csv
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from truck_app.models import HouseShiftingDetails
+from truck_app.models import OrderBooking
+from truck_app.models import VehicleShiftingDetails
+from truck_app.models import WareHouseStorageDetails
+
+from .pagination import STATUS_FILTERS, filter_bookings
+
+EXPORT_MODELS = {
+    "house_shifting": HouseShiftingDetails,
+    "vehicle_shifting": VehicleShiftingDetails,
+    "warehouse_shifting": WareHouseStorageDetails,
+    "orders": OrderBooking,
+}
+
+CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Echo:
+    """File-like object whose write returns the line, so csv.writer can feed a generator"""
+    def write(self, value):
+        return value
+
+
+def export_date(value):
+    """Parse a YYYY-MM-DD filter value; empty means no bound"""
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ExportError("Invalid date %r, expected YYYY-MM-DD" % value)
+    return date
+
+
+def export_columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def export_rows(kind, start=None, end=None, status=None, search=None):
+    """Column names and a lazy, chunked row iterator for one export.
+
+    start and end are dates bounding created (both inclusive); status is all, completed or pending
+    and search is an admin list search, both only for the shifting details tables.
+    """
+    model = EXPORT_MODELS.get(kind)
+    if model is None:
+        raise ExportError("Unknown export %r, expected one of %s" % (kind, ", ".join(EXPORT_MODELS)))
+    queryset = model.objects.all()
+    if start is not None:
+        queryset = queryset.filter(created__date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created__date__lte=end)
+    if status and status != "all":
+        if status not in STATUS_FILTERS:
+            raise ExportError("Unknown status %r, expected all, completed or pending" % status)
+        if model is OrderBooking:
+            raise ExportError("Orders have no status, filter the shifting details exports instead")
+    if search and model is OrderBooking:
+        raise ExportError("Orders cannot be searched, search the shifting details exports instead")
+    if model is not OrderBooking:
+        queryset = filter_bookings(queryset, model, status, search)
+
+    columns = export_columns(model)
+    # Ordered by the primary key so the server walks the clustered index, chunk by chunk
+    rows = queryset.order_by('id').values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+    return columns, rows
+
+
+def csv_lines(columns, rows):
+    """Encode the header and rows as CSV lines, one at a time"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def spooled_csv(columns, rows):
+    """The whole CSV in a rewound temporary file, for servers that cannot run queries while streaming.
+
+    Nothing reaches the client until the last row is written: the CSV is held in memory up to
+    EXPORT_SPOOL_MAX_SIZE bytes and on disk beyond that.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=getattr(settings, 'EXPORT_SPOOL_MAX_SIZE', 8 * 1024 * 1024))
+    for line in csv_lines(columns, rows):
+        spool.write(line.encode())
+    spool.seek(0)
+    return spool
+
+
+def write_xlsx(path, columns, rows, title):
+    """Write rows to an .xlsx file with openpyxl's streaming write-only mode"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportError("XLSX export needs openpyxl, install it or export CSV")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(columns)
+    for row in rows:
+        # openpyxl refuses timezone aware datetimes, write them as local time
+        sheet.append([timezone.localtime(value).replace(tzinfo=None) if getattr(value, 'tzinfo', None) else value
+                      for value in row])
+    workbook.save(path)
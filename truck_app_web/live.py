@@ -0,0 +1,220 @@
+"""Live operations board: booking and status events pushed to dispatchers over server-sent events.
+
+Model signals feed an in-process broker. live_board_events, mounted on the ASGI application in
+truckapp_project.asgi, holds one long-lived connection per dispatcher and writes each event as it is
+published. The broker is per process: the board shows changes made by the process serving it, so
+run the ASGI app with one worker (or put a shared broker behind publish) when that matters.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from functools import partial
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.http.cookie import parse_cookie
+
+from truck_app.counters import booking_kind
+from truck_app.models import HouseShiftingDetails
+from truck_app.models import OrderBooking
+from truck_app.models import VehicleShiftingDetails
+from truck_app.models import WareHouseStorageDetails
+from truck_app.signals import shifting_details_updated
+
+# Same admin account the truck_app_web views check for
+ADMIN_USER_ID = 9
+
+SHIFTING_KINDS = {
+    HouseShiftingDetails: 'house_shifting',
+    VehicleShiftingDetails: 'vehicle_shifting',
+    WareHouseStorageDetails: 'warehouse_shifting',
+}
+
+
+class Subscription:
+    def __init__(self, loop, queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event):
+        """Queue event, dropping the oldest one if the dispatcher is not keeping up; runs on self.loop"""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class LiveBroker:
+    """Thread-safe fan-out of events to subscribers living on asyncio event loops.
+
+    publish may be called from any thread (sync views run in a thread pool under ASGI). A short
+    history lets a reconnecting EventSource catch up from its Last-Event-ID.
+    """
+    def __init__(self, history=100, queue_size=100):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=history)
+        self._next_id = 1
+        self.queue_size = queue_size
+
+    def subscribe(self, loop, last_event_id=None):
+        """Register a subscriber on loop; must be called from that loop"""
+        subscription = Subscription(loop, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event['id'] > last_event_id:
+                        subscription.offer(event)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, name, data):
+        with self._lock:
+            event = {'id': self._next_id, 'event': name, 'data': data}
+            self._next_id += 1
+            self._history.append(event)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's event loop has been closed
+                self.unsubscribe(subscription)
+        return event
+
+
+broker = LiveBroker(history=getattr(settings, 'LIVE_BOARD_HISTORY', 100),
+                    queue_size=getattr(settings, 'LIVE_BOARD_QUEUE_SIZE', 100))
+
+
+def shifting_details_event(instance):
+    return {'kind': SHIFTING_KINDS[type(instance)],
+            'id': instance.id,
+            'user_id': instance.user_id,
+            'booking_id': instance.booking_id,
+            'pickup_location': instance.pickup_location,
+            'completed': instance.completed,
+            'completed_date': instance.completed_date,
+            'created': instance.created}
+
+
+def order_event(instance):
+    return {'id': instance.id,
+            'user_id': instance.user_id,
+            'booking_id': instance.booking_id,
+            'kind': booking_kind(instance),
+            'payment_method': instance.payment_method,
+            'total_amount': instance.total_amount,
+            'created': instance.created}
+
+
+def _publish_on_commit(name, data):
+    # Only announce rows that are actually committed
+    transaction.on_commit(partial(broker.publish, name, data))
+
+
+def shifting_details_saved(sender, instance, created, **kwargs):
+    _publish_on_commit('booking' if created else 'status', shifting_details_event(instance))
+
+
+def order_saved(sender, instance, created, **kwargs):
+    _publish_on_commit('order', order_event(instance))
+
+
+def shifting_details_updated_in_bulk(sender, ids, values, **kwargs):
+    if sender in SHIFTING_KINDS:
+        broker.publish('completion' if 'completed' in values else 'status',
+                       {'kind': SHIFTING_KINDS[sender], 'ids': ids, **values})
+
+
+def connect_signals():
+    for model in SHIFTING_KINDS:
+        post_save.connect(shifting_details_saved, sender=model, dispatch_uid='live_board_%s' % model.__name__)
+    post_save.connect(order_saved, sender=OrderBooking, dispatch_uid='live_board_OrderBooking')
+    shifting_details_updated.connect(shifting_details_updated_in_bulk, dispatch_uid='live_board_bulk')
+
+
+def encode_event(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+    return ('id: %s\nevent: %s\ndata: %s\n\n' % (event['id'], event['event'], data)).encode()
+
+
+def board_user_allowed(session_key):
+    """Whether the session cookie belongs to the logged in admin"""
+    if not session_key:
+        return False
+    try:
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        user = get_user(SimpleNamespace(session=session_store(session_key)))
+        return user.is_authenticated and user.id == ADMIN_USER_ID
+    finally:
+        close_old_connections()
+
+
+async def _plain_response(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def live_board_events(scope, receive, send):
+    """ASGI app streaming broker events as text/event-stream until the dispatcher disconnects"""
+    if scope['method'] != 'GET':
+        await _plain_response(send, 405, b'Method Not Allowed')
+        return
+    headers = dict(scope['headers'])
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    if not await sync_to_async(board_user_allowed)(cookies.get(settings.SESSION_COOKIE_NAME)):
+        await _plain_response(send, 403, b'Forbidden')
+        return
+
+    try:
+        last_event_id = int(headers.get(b'last-event-id', b''))
+    except ValueError:
+        last_event_id = None
+    heartbeat = getattr(settings, 'LIVE_BOARD_HEARTBEAT', 15)
+    subscription = broker.subscribe(asyncio.get_running_loop(), last_event_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    getter = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache'),
+                                # Keep nginx from buffering the stream
+                                (b'x-accel-buffering', b'no')]})
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(subscription.queue.get())
+            done, pending = await asyncio.wait({getter, disconnected}, timeout=heartbeat,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                break
+            if getter in done:
+                body, getter = encode_event(getter.result()), None
+            else:
+                # Comment line, keeps proxies from closing an idle connection
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        broker.unsubscribe(subscription)
+        for task in (getter, disconnected):
+            if task is not None:
+                task.cancel()
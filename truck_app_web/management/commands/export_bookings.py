@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from truck_app_web.exports import EXPORT_MODELS, ExportError, csv_lines, export_date, export_rows, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "Export house shifting, vehicle shifting, warehouse bookings or orders to a CSV or XLSX file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_MODELS))
+        parser.add_argument('output', help="File to write; .xlsx writes a workbook (needs openpyxl), anything else CSV")
+        parser.add_argument('--start', help="First created date to include, YYYY-MM-DD")
+        parser.add_argument('--end', help="Last created date to include, YYYY-MM-DD")
+        parser.add_argument('--status', choices=['all', 'completed', 'pending'], default='all')
+
+    def handle(self, *args, **options):
+        try:
+            columns, rows = export_rows(options['kind'],
+                                        start=export_date(options['start']),
+                                        end=export_date(options['end']),
+                                        status=options['status'])
+            if options['output'].endswith('.xlsx'):
+                write_xlsx(options['output'], columns, rows, options['kind'])
+            else:
+                with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                    output.writelines(csv_lines(columns, rows))
+        except ExportError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS("Exported %s to %s" % (options['kind'], options['output'])))
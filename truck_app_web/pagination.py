@@ -0,0 +1,155 @@
+import base64
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from truck_app.models import OrderBooking
+from truck_app.models import UserProfile
+from truck_app.search import BOOKING_KINDS, CUSTOMER, search_ids
+
+# Columns the customer list shows; passwords and the rest of UserProfile are never read
+CUSTOMER_COLUMNS = ('id', 'user_id', 'user_name', 'user_phone_number', 'user_email', 'created')
+
+STATUS_FILTERS = {
+    "completed": Q(completed=True),
+    "pending": Q(completed=False) | Q(completed__isnull=True),
+}
+
+
+def page_size_from(value):
+    """Requested page size, capped at ADMIN_LIST_MAX_PAGE_SIZE"""
+    default = getattr(settings, 'ADMIN_LIST_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'ADMIN_LIST_MAX_PAGE_SIZE', 200)
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(row):
+    created = row.created.isoformat() if row.created is not None else ""
+    return base64.urlsafe_b64encode(("%s|%s" % (created, row.id)).encode()).decode()
+
+
+def decode_cursor(value):
+    """(created, id) from a cursor made by encode_cursor, or None when it is missing or malformed"""
+    if not value:
+        return None
+    try:
+        created, row_id = base64.urlsafe_b64decode(value.encode()).decode().split("|")
+        return (parse_datetime(created) if created else None), int(row_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def _older_than(created, row_id):
+    # Rows follow newest first with a NULL created last, which is how MySQL and SQLite sort DESC
+    if created is None:
+        return Q(created__isnull=True, id__lt=row_id)
+    return Q(created__lt=created) | Q(created=created, id__lt=row_id) | Q(created__isnull=True)
+
+
+def _newer_than(created, row_id):
+    if created is None:
+        return Q(created__isnull=False) | Q(created__isnull=True, id__gt=row_id)
+    return Q(created__gt=created) | Q(created=created, id__gt=row_id)
+
+
+class KeysetPage:
+    def __init__(self, rows, has_next, has_previous, page_size, params):
+        self.object_list = rows
+        self.has_next = has_next and bool(rows)
+        self.has_previous = has_previous and bool(rows)
+        self.page_size = page_size
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _query(self, **cursor):
+        return urlencode({**self.params, "page_size": self.page_size, **cursor})
+
+    @property
+    def filter_query(self):
+        """The page's filters alone, for links that keep them, such as the CSV export"""
+        return urlencode(self.params)
+
+    @property
+    def next_query(self):
+        return self._query(after=encode_cursor(self.object_list[-1]))
+
+    @property
+    def previous_query(self):
+        return self._query(before=encode_cursor(self.object_list[0]))
+
+
+def keyset_page(queryset, after=None, before=None, page_size=50, params=None):
+    """One page of queryset, newest created first, starting after (or ending before) a cursor.
+
+    Seeks with WHERE (created, id) < cursor instead of OFFSET, so every page costs the same
+    whatever its depth.
+    """
+    params = params or {}
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before is not None:
+        rows = list(queryset.filter(_newer_than(*before)).order_by('created', 'id')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(rows, True, has_previous, page_size, params)
+
+    if after is not None:
+        queryset = queryset.filter(_older_than(*after))
+    rows = list(queryset.order_by('-created', '-id')[:page_size + 1])
+    return KeysetPage(rows[:page_size], len(rows) > page_size, after is not None, page_size, params)
+
+
+def filter_bookings(queryset, model, status=None, search_query=None):
+    """queryset narrowed by a status filter and a search, as the admin lists and their exports apply them"""
+    if status in STATUS_FILTERS:
+        queryset = queryset.filter(STATUS_FILTERS[status])
+    if search_query:
+        # Exact booking id, or every term a prefix of the booking id, addresses or customer name/phone
+        queryset = queryset.filter(Q(booking_id=search_query) | Q(id__in=search_ids(search_query, BOOKING_KINDS[model])))
+    return queryset
+
+
+def booking_list_context(request, model):
+    """Status filter, search and keyset page of a shifting details table for the admin lists.
+
+    Reads the query string; the filter form used to POST, so POSTed filters are still honoured.
+    """
+    params = request.POST if request.method == "POST" else request.GET
+    status = params.get('status', '').strip() or "all"
+    search_query = params.get('search', '').strip()
+
+    queryset = filter_bookings(model.objects.all(), model, status, search_query)
+    page = keyset_page(queryset,
+                       after=params.get('after'),
+                       before=params.get('before'),
+                       page_size=page_size_from(params.get('page_size')),
+                       params={"status": status, "search": search_query})
+    return {"page": page, "status": status, "search_query": search_query}
+
+
+def customer_list_context(request):
+    """Keyset page of customers with their booking counts, optionally searched, for the admin customer list"""
+    search_query = request.GET.get('search', '').strip()
+    bookings = OrderBooking.objects.filter(user=OuterRef('user_id')).order_by() \
+        .values('user').annotate(count=Count('id')).values('count')
+    customers = UserProfile.objects.only(*CUSTOMER_COLUMNS) \
+        .annotate(booking_count=Coalesce(Subquery(bookings, output_field=IntegerField()), 0))
+    if search_query:
+        customers = customers.filter(id__in=search_ids(search_query, CUSTOMER))
+    page = keyset_page(customers,
+                       after=request.GET.get('after'),
+                       before=request.GET.get('before'),
+                       page_size=page_size_from(request.GET.get('page_size')),
+                       params={"search": search_query} if search_query else None)
+    return {"data": page, "page": page, "search_query": search_query}
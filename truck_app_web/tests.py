@@ -1,4 +1,264 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import tempfile
+import time
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import FileResponse, StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
+from truck_app.models import CustomUser
+from truck_app.models import HouseShiftingDetails
+from truck_app.models import OrderBooking
+from truck_app.models import VehicleShiftingDetails
+
+from .dashboard import DASHBOARD_LOCK_KEY, compute_dashboard_counts, dashboard_counts
+from .live import LiveBroker, broker, live_board_events
+from .pagination import decode_cursor, encode_cursor, keyset_page, page_size_from
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                           'LOCATION': 'truck_app_web_tests'}}
+
+# The admin views only let this user in
+ADMIN_USER_ID = 9
+
+
+def setUpModule():
+    # The requests' metrics snapshots go to a directory of their own rather than METRICS_DIR
+    metrics_dir = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(metrics_dir.cleanup)
+    override = override_settings(METRICS_DIR=metrics_dir.name)
+    override.enable()
+    unittest.addModuleCleanup(override.disable)
+
+
+class KeysetPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user('9000000001', password='Secret@123')
+        start = timezone.now().replace(microsecond=0)
+        created = [start - datetime.timedelta(hours=3), start, None, start - datetime.timedelta(hours=1),
+                   start, None, start - datetime.timedelta(hours=2)]
+        rows = [HouseShiftingDetails.objects.create(user=user, created=value) for value in created]
+        # Newest first, ties broken by the higher id, rows without created last
+        cls.expected = [row.id for row in sorted(rows, key=lambda row: (row.created is not None, row.created or start,
+                                                                        row.id), reverse=True)]
+
+    def page(self, **cursor):
+        return keyset_page(HouseShiftingDetails.objects.all(), page_size=3, **cursor)
+
+    @staticmethod
+    def ids(page):
+        return [row.id for row in page]
+
+    def test_cursor_round_trip(self):
+        row = HouseShiftingDetails.objects.get(id=self.expected[0])
+        self.assertEqual(decode_cursor(encode_cursor(row)), (row.created, row.id))
+        row = HouseShiftingDetails.objects.get(id=self.expected[-1])
+        self.assertEqual(decode_cursor(encode_cursor(row)), (None, row.id))
+        for value in (None, '', 'not a cursor', 'fHg='):
+            self.assertIsNone(decode_cursor(value), value)
+
+    def test_pages_forward_through_ties_and_nulls(self):
+        page = self.page()
+        self.assertFalse(page.has_previous)
+        seen = self.ids(page)
+        while page.has_next:
+            page = self.page(after=encode_cursor(page.object_list[-1]))
+            self.assertTrue(page.has_previous)
+            seen += self.ids(page)
+        self.assertEqual(seen, self.expected)
+
+    def test_pages_backward_to_the_first_page(self):
+        last = self.page(after=encode_cursor(HouseShiftingDetails.objects.get(id=self.expected[-2])))
+        self.assertEqual(self.ids(last), self.expected[-1:])
+        self.assertFalse(last.has_next)
+
+        page, seen = last, []
+        while page.has_previous:
+            page = self.page(before=encode_cursor(page.object_list[0]))
+            self.assertTrue(page.has_next)
+            seen = self.ids(page) + seen
+        self.assertEqual(seen, self.expected[:-1])
+        self.assertEqual(self.ids(page), self.expected[:3])
+
+    def test_before_a_null_created_row(self):
+        # Rows without created sort last, so every dated row and the higher null id come before them
+        page = keyset_page(HouseShiftingDetails.objects.all(), page_size=10,
+                           before=encode_cursor(HouseShiftingDetails.objects.get(id=self.expected[-1])))
+        self.assertEqual(self.ids(page), self.expected[:-1])
+        self.assertFalse(page.has_previous)
+
+    def test_empty_page_has_no_links(self):
+        page = keyset_page(HouseShiftingDetails.objects.none(), after=encode_cursor(
+            HouseShiftingDetails.objects.get(id=self.expected[0])))
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_links_keep_the_filters(self):
+        page = keyset_page(HouseShiftingDetails.objects.all(), page_size=3,
+                           params={'status': 'pending', 'search': 'chennai'})
+        self.assertEqual(parse_qs(page.filter_query), {'status': ['pending'], 'search': ['chennai']})
+        query = parse_qs(page.next_query)
+        self.assertEqual((query['status'], query['search'], query['page_size']), (['pending'], ['chennai'], ['3']))
+        self.assertEqual(self.ids(self.page(after=query['after'][0])), self.expected[3:6])
+
+    @override_settings(ADMIN_LIST_PAGE_SIZE=50, ADMIN_LIST_MAX_PAGE_SIZE=200)
+    def test_page_size_from(self):
+        self.assertEqual(page_size_from(None), 50)
+        self.assertEqual(page_size_from('abc'), 50)
+        self.assertEqual(page_size_from('0'), 1)
+        self.assertEqual(page_size_from('25'), 25)
+        self.assertEqual(page_size_from('5000'), 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RevenueChartTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        admin = CustomUser.objects.create_user('9000000009', password='Secret@123', id=ADMIN_USER_ID)
+        self.client.force_login(admin)
+
+    def chart(self, **params):
+        return self.client.get(reverse('RevenueChart'), params)
+
+    def test_first_load_rolls_up_the_orders_placed_so_far(self):
+        created = timezone.now() - datetime.timedelta(days=1)
+        OrderBooking.objects.create(user_id=ADMIN_USER_ID, total_amount='1,250', payment_method='cash',
+                                    house_shifting_details_id='1', created=created)
+        response = self.chart(year=created.year)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][created.month - 1], 1250.0)
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'period': 'week', 'weeks': '0'}, {'period': 'week', 'weeks': '105'},
+                       {'period': 'week', 'weeks': 'x'}, {'year': '0'}, {'year': '10000'}):
+            self.assertEqual(self.chart(**params).status_code, 400, params)
+        weeks = self.chart(period='week', weeks='4').json()
+        self.assertEqual((len(weeks['labels']), len(weeks['data'])), (4, 4))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_user('9000000009', password='Secret@123', id=ADMIN_USER_ID)
+        self.client.force_login(admin)
+        self.async_client.force_login(admin)
+        self.rows = [HouseShiftingDetails.objects.create(user=admin, pickup_location=city, created=timezone.now())
+                     for city in ('Chennai', 'Madurai')]
+
+    def check_csv(self, content):
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'user_id'])
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(row.id) for row in self.rows])
+        self.assertIn('Madurai', lines[2])
+
+    def test_streams_under_wsgi(self):
+        response = self.client.get(reverse('Export', args=['house_shifting']))
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.check_csv(b''.join(response.streaming_content))
+
+    @override_settings(EXPORT_SPOOL_MAX_SIZE=16)
+    async def test_buffers_under_asgi(self):
+        response = await self.async_client.get(reverse('Export', args=['house_shifting']))
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.check_csv(b''.join(response.streaming_content))
+
+    def test_rejects_an_unknown_export(self):
+        self.assertEqual(self.client.get(reverse('Export', args=['trucks'])).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES, DASHBOARD_CACHE_TTL=30)
+class DashboardCountsTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = CustomUser.objects.create_user('9000000001', password='Secret@123')
+        for completed in (True, False, None):
+            HouseShiftingDetails.objects.create(user=self.user, completed=completed)
+        VehicleShiftingDetails.objects.create(user=self.user, completed=True)
+
+    def test_counts_in_one_query_per_table(self):
+        with self.assertNumQueries(4):
+            counts = compute_dashboard_counts()
+        self.assertEqual(counts, {'house_shifting_count': 3, 'vehicle_shifting_count': 1,
+                                  'warehouse_shifting_count': 0, 'user_profile_count': 0,
+                                  'completed_count': 2, 'pending_count': 2})
+
+    def test_stale_counts_are_served_while_another_request_recomputes(self):
+        self.assertEqual(dashboard_counts()['house_shifting_count'], 3)
+        HouseShiftingDetails.objects.create(user=self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_counts()['house_shifting_count'], 3)
+
+        with mock.patch('truck_app_web.dashboard.time.time', return_value=time.time() + 31):
+            caches['default'].add(DASHBOARD_LOCK_KEY, 1)
+            self.assertEqual(dashboard_counts()['house_shifting_count'], 3)
+            caches['default'].delete(DASHBOARD_LOCK_KEY)
+            self.assertEqual(dashboard_counts()['house_shifting_count'], 4)
+
+
+class LiveBoardTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('9000000009', password='Secret@123', id=ADMIN_USER_ID)
+
+    def test_broker_drops_the_oldest_event_and_replays_history(self):
+        async def run():
+            broker = LiveBroker(history=3, queue_size=2)
+            subscription = broker.subscribe(asyncio.get_running_loop())
+            for number in range(3):
+                broker.publish('order', {'number': number})
+            await asyncio.sleep(0)
+            queued = [subscription.queue.get_nowait()['data']['number'] for _ in range(subscription.queue.qsize())]
+            late = broker.subscribe(asyncio.get_running_loop(), last_event_id=1)
+            return queued, [late.queue.get_nowait()['id'] for _ in range(late.queue.qsize())]
+
+        self.assertEqual(asyncio.run(run()), ([1, 2], [2, 3]))
+
+    def test_saves_are_published_after_commit(self):
+        published = broker._next_id
+        with self.captureOnCommitCallbacks(execute=True):
+            details = HouseShiftingDetails.objects.create(user=self.admin, pickup_location='Chennai')
+            self.assertEqual(broker._next_id, published)
+        event = broker._history[-1]
+        self.assertEqual((event['event'], event['data']['kind'], event['data']['id']),
+                         ('booking', 'house_shifting', details.id))
+
+    def stream(self, cookie=b''):
+        scope = {'type': 'http', 'method': 'GET', 'headers': [(b'cookie', cookie)]}
+        disconnected = asyncio.Event()
+        sent = []
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 2 and message.get('more_body'):
+                broker.publish('order', {'booking_id': 'TRK1'})
+            elif len(sent) == 3:
+                disconnected.set()
+
+        return scope, receive, send, sent
+
+    async def test_streams_events_to_the_admin(self):
+        await sync_to_async(self.client.force_login)(self.admin)
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        scope, receive, send, sent = self.stream(('%s=%s' % (settings.SESSION_COOKIE_NAME, session)).encode())
+        await asyncio.wait_for(live_board_events(scope, receive, send), 5)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertIn(b'event: order\ndata: {"booking_id": "TRK1"}\n\n', sent[2]['body'])
+
+    async def test_refuses_anyone_else(self):
+        scope, receive, send, sent = self.stream()
+        await asyncio.wait_for(live_board_events(scope, receive, send), 5)
+        self.assertEqual(sent[0]['status'], 403)
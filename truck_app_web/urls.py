@@ -5,7 +5,11 @@ urlpatterns = [
     path('login/', views.login, name='login'),
     path('logout/', views.logout_view, name="logout"),
     path('Dashboard/', views.dashboard, name='Dashboard'),
+    path('RevenueChart/', views.revenue_chart, name='RevenueChart'),
     path('CustomerDetails/', views.customer_details, name='CustomerDetails'),
+    path('Export/<str:kind>/', views.export_bookings, name='Export'),
+    path('LiveBoard/', views.live_board, name='LiveBoard'),
+    path('LiveBoard/events/', views.live_board_events, name='LiveBoardEvents'),
     path("HouseShifting/", views.house_shifting, name="HouseShifting"),
     path('VehicleShifting/', views.vehicle_shifting, name='VehicleShifting'),
     path('WarehouseShifting/', views.warehouse_shifting, name='WarehouseShifting'),
@@ -1,7 +1,10 @@
 from django.contrib.sessions.models import Session
 from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render
 import json
+import logging
 import requests
 
 from django.contrib.auth import authenticate, logout, login as dj_login
@@ -12,17 +15,39 @@ import re
 from truck_app.models import HouseShiftingDetails
 from truck_app.models import VehicleShiftingDetails
 from truck_app.models import WareHouseStorageDetails
-from truck_app.models import UserProfile
 from truck_app.models import Register
 from truck_app.models import CustomUser as User
+from truck_app.completion import maybe_reconcile_completion
+from truck_app.responses import FastJsonResponse as JsonResponse
+from truck_app.revenue import maybe_rollup_revenue, monthly_revenue, weekly_revenue
+from truck_app.routers import replica_reads
+from truck_app.sms import send_otp
+from .dashboard import dashboard_counts
+from .details import booking_detail_context, set_completed_date
+from .exports import ExportError, csv_lines, export_date, export_rows, spooled_csv
+from .pagination import booking_list_context, customer_list_context
 from django.contrib import messages
-from django.db import connections
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
-from datetime import datetime
 from django.utils import timezone
 from datetime import datetime as dt
-import pytz
+
+logger = logging.getLogger(__name__)
+
+# Longest period the weekly income chart covers
+MAX_CHART_WEEKS = 104
+
+
+def int_param(request, name, default, minimum, maximum):
+    """Whole-number query parameter within minimum..maximum, default when empty, None when invalid"""
+    value = request.GET.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if minimum <= number <= maximum else None
 
 
 def login(request):
@@ -39,14 +64,14 @@ def login(request):
             password = "Empty"
 
         user = authenticate(request, phone_number=phone_number, password=password)
-        print("user>>>>>>>>>>>",user)
         if user is not None:
             dj_login(request, user)
             user_ids = request.user.id
-            print("user_ids", user_ids)
+            logger.info("Admin logged in", extra={'user_id': user_ids})
 
             return redirect('Dashboard')
         else:
+            logger.warning("Admin login failed")
             messages.success(request, 'Incorrect Credential.')
             return render(request, 'truck_app_web/login.html')
 
@@ -59,396 +84,136 @@ def logout_view(request):
 
 
 @login_required
+@replica_reads
 def dashboard(request):
     request_user_id = request.user.id
     if request_user_id == 9:
-        dashboard_list = ["1000", "2200", "1700", "3000", "2500", "4000", "3500", "9000", "3400", "5000", '5500',
-                          '8000']
-        house_shifting_count = HouseShiftingDetails.objects.all().count()
-        if house_shifting_count is None or "":
-            house_shifting_count = "0"
-        vehicle_shifting_count = VehicleShiftingDetails.objects.all().count()
-        if vehicle_shifting_count is None or "":
-            vehicle_shifting_count = "0"
-        warehouse_shifting_count = WareHouseStorageDetails.objects.all().count()
-        if warehouse_shifting_count is None or "":
-            warehouse_shifting_count = "0"
-
-        user_profile_count = UserProfile.objects.all().count()
-        if user_profile_count is None or "":
-            user_profile_count = "0"
-
-        house_shifting_completed_count = HouseShiftingDetails.objects.filter(completed=True).count()
-        warehouse_shifting_completed_count = WareHouseStorageDetails.objects.filter(completed=True).count()
-        vehicle_shifting_completed_count = VehicleShiftingDetails.objects.filter(completed=True).count()
-        completed_count = house_shifting_completed_count + warehouse_shifting_completed_count + vehicle_shifting_completed_count
-        house_shifting_pending_count = HouseShiftingDetails.objects.filter(Q(completed=False) | Q(completed__isnull=True)).count()
-        warehouse_shifting_pending_count = WareHouseStorageDetails.objects.filter(Q(completed=False) | Q(completed__isnull=True)).count()
-        vehicle_shifting_pending_count = VehicleShiftingDetails.objects.filter(Q(completed=False) | Q(completed__isnull=True)).count()
-        pending_count = house_shifting_pending_count + warehouse_shifting_pending_count + vehicle_shifting_pending_count
+        maybe_rollup_revenue()
+        year = timezone.localdate().year
+        dashboard_list = monthly_revenue(year)
+        counts = dashboard_counts()
         return render(request,
                       'truck_app_web/dashboard.html',
-                      {"dashboard_list": dashboard_list,
-                       "house_shifting_count": house_shifting_count,
-                       "vehicle_shifting_count": vehicle_shifting_count,
-                       "warehouse_shifting_count": warehouse_shifting_count,
-                       "user_profile_count": user_profile_count,
-                       "completed_count": completed_count,
-                       "pending_count": pending_count})
+                      {"dashboard_list": dashboard_list, "chart_year": year, **counts})
+    else:
+        return redirect("login")
+
+
+@login_required
+@replica_reads
+def revenue_chart(request):
+    """Income chart data from the DailyRevenue rollup, by month of ?year= or by recent week (?period=week&weeks=)"""
+    request_user_id = request.user.id
+    if request_user_id == 9:
+        maybe_rollup_revenue()
+        if request.GET.get('period') == 'week':
+            weeks = int_param(request, 'weeks', 12, 1, MAX_CHART_WEEKS)
+            if weeks is None:
+                return HttpResponseBadRequest("weeks must be a whole number from 1 to %s" % MAX_CHART_WEEKS)
+            weeks = weekly_revenue(weeks=weeks)
+            return JsonResponse({"labels": [week.strftime("%d %b") for week, amount in weeks],
+                                 "data": [amount for week, amount in weeks]})
+        year = int_param(request, 'year', timezone.localdate().year, 1, 9999)
+        if year is None:
+            return HttpResponseBadRequest("year must be a whole number from 1 to 9999")
+        return JsonResponse({"labels": ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov',
+                                        'Dec'],
+                             "data": monthly_revenue(year)})
     else:
         return redirect("login")
 
 
 @login_required
+@replica_reads
+def export_bookings(request, kind):
+    """Stream a CSV of one bookings table, filtered by ?start= and ?end= (YYYY-MM-DD), ?status= and ?search=
+
+    Only under WSGI is the CSV streamed as it is read. Under ASGI the whole export is written to a
+    spooled temporary file first (see EXPORT_SPOOL_MAX_SIZE), so a large export starts downloading
+    only once every row has been read.
+    """
+    request_user_id = request.user.id
+    if request_user_id == 9:
+        try:
+            columns, rows = export_rows(kind,
+                                        start=export_date(request.GET.get('start')),
+                                        end=export_date(request.GET.get('end')),
+                                        status=request.GET.get('status', '').strip(),
+                                        search=request.GET.get('search', '').strip())
+        except ExportError as e:
+            return HttpResponseBadRequest(str(e))
+        if isinstance(request, ASGIRequest):
+            # Django 4.1 iterates streaming bodies on the event loop, where the ORM refuses to run, so the
+            # rows are read here, in the view's thread, into a spooled file the loop then sends
+            response = FileResponse(spooled_csv(columns, rows), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(csv_lines(columns, rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="%s_%s.csv"' % (kind, timezone.localdate())
+        return response
+    else:
+        return redirect("login")
+
+
+@login_required
+def live_board(request):
+    """Live operations board; events arrive over server-sent events from truck_app_web.live"""
+    request_user_id = request.user.id
+    if request_user_id == 9:
+        return render(request, 'truck_app_web/live_board.html')
+    else:
+        return redirect("login")
+
+
+def live_board_events(request):
+    """Reached only when the site runs under WSGI, where the ASGI event stream is not mounted.
+
+    A 204 tells EventSource to stop reconnecting; the board says live updates are unavailable.
+    """
+    return HttpResponse(status=204)
+
+
+@login_required
+@replica_reads
 def customer_details(request):
     request_user_id = request.user.id
     if request_user_id == 9:
-        # establish connection to MySQL database
-        cursor = connections['default'].cursor()
-
-        # execute a select query to retrieve all rows from the table
-        cursor.execute("SELECT * FROM truck_app_userprofile")
-        print("cursor", cursor)
-
-        # fetch all rows of data and store as list of dictionaries
-        rows = cursor.fetchall()
-        data = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
-        dic_data = {"data": data}
-        # return data
-        # return data as JSON response
-        return render(request, 'truck_app_web/customer_details.html', dic_data)
+        return render(request, 'truck_app_web/customer_details.html', customer_list_context(request))
     else:
         return redirect("login")
 
 
 @login_required
+@replica_reads
 def house_shifting(request):
     request_user_id = request.user.id
     if request_user_id == 9:
-        india_tz = pytz.timezone('Asia/Kolkata')
-        now = datetime.now(india_tz)
-        if request.method == "POST":
-            status = request.POST.get('status')
-            search_query = request.POST.get('search')
-            if status == "all":
-                house_shifting = HouseShiftingDetails.objects.all().order_by('-created')
-            elif status == "completed":
-                house_shifting = HouseShiftingDetails.objects.filter(completed=True).order_by('-created')
-            elif status == "pending":
-                house_shifting = HouseShiftingDetails.objects.filter((Q(completed=False) | Q(completed__isnull=True))).order_by('-created')
-            else:
-                house_shifting = HouseShiftingDetails.objects.all().order_by('-created')
-
-            if search_query:
-                try:
-                    house_shifting = house_shifting.filter(booking_id=search_query).order_by('-created')
-                except:
-                    house_shifting = HouseShiftingDetails.objects.all().order_by('-created')
-            house_shifting_detail = HouseShiftingDetails.objects.all().order_by('-created')
-            for house_shifting_data in house_shifting_detail:
-                print(">>>>for")
-                if house_shifting_data.completed is False or house_shifting_data.completed is None:
-                    completed_datetime = house_shifting_data.completed_date
-                    if completed_datetime is not None:
-                        completed_date = completed_datetime.date()
-                        completed_time = completed_datetime.time()
-                        now_date = now.date()
-                        now_time = now.time()
-                        if completed_date < now_date:
-                            print(">>>>>>>date less than>>>>>>>>>>>>>")
-                            house_shifting_data.completed = True
-                            house_shifting_data.save()
-                        elif completed_date == now_date:
-                            print(">>>>>>>date equal to >>>>>>>>>>>>>")
-                            if completed_time <= now_time:
-                                print("<>>>>>>>>>>time less than or equal to>>>>>>>>>>>>>>>>>")
-                                house_shifting_data.completed = True
-                                house_shifting_data.save()
-                else:
-                    completed_datetime = house_shifting_data.completed_date
-                    if house_shifting_data.completed is True:
-                        if completed_datetime is not None:
-                            completed_date = completed_datetime.date()
-                            completed_time = completed_datetime.time()
-                            now_date = now.date()
-                            now_time = now.time()
-                            if completed_date > now_date:
-                                print(">>>>>>>date greater than>>>>>>>>>>>>>")
-                                house_shifting_data.completed = False
-                                house_shifting_data.save()
-                            elif completed_date == now_date:
-                                print(">>>>>>>date equal than>>>>>>>>>>>>>")
-                                if completed_time > now_time:
-                                    print(">>>>>>>time greater than>>>>>>>>>>>>>")
-                                    house_shifting_data.completed = False
-                                    house_shifting_data.save()
-            return render(request, 'truck_app_web/house_shifting.html', {"house_shifting": house_shifting,
-                                                                         "search_query": search_query})
-        else:
-            search_query = ""
-            house_shifting = HouseShiftingDetails.objects.all().order_by('-created')
-            house_shifting_detail = HouseShiftingDetails.objects.all().order_by('-created')
-            for house_shifting_data in house_shifting_detail:
-                print(">>>>for")
-                if house_shifting_data.completed is False or house_shifting_data.completed is None:
-                    completed_datetime = house_shifting_data.completed_date
-                    if completed_datetime is not None:
-                        completed_date = completed_datetime.date()
-                        completed_time = completed_datetime.time()
-                        now_date = now.date()
-                        now_time = now.time()
-                        if completed_date < now_date:
-                            print(">>>>>>>date less than>>>>>>>>>>>>>")
-                            house_shifting_data.completed = True
-                            house_shifting_data.save()
-                        elif completed_date == now_date:
-                            print(">>>>>>>date equal to >>>>>>>>>>>>>")
-                            if completed_time <= now_time:
-                                print("<>>>>>>>>>>time less than or equal to>>>>>>>>>>>>>>>>>")
-                                house_shifting_data.completed = True
-                                house_shifting_data.save()
-                else:
-                    completed_datetime = house_shifting_data.completed_date
-                    if house_shifting_data.completed is True:
-                        if completed_datetime is not None:
-                            completed_date = completed_datetime.date()
-                            completed_time = completed_datetime.time()
-                            now_date = now.date()
-                            now_time = now.time()
-                            if completed_date > now_date:
-                                print(">>>>>>>date greater than>>>>>>>>>>>>>")
-                                house_shifting_data.completed = False
-                                house_shifting_data.save()
-                            elif completed_date == now_date:
-                                print(">>>>>>>date equal than>>>>>>>>>>>>>")
-                                if completed_time > now_time:
-                                    print(">>>>>>>time greater than>>>>>>>>>>>>>")
-                                    house_shifting_data.completed = False
-                                    house_shifting_data.save()
-            return render(request, 'truck_app_web/house_shifting.html', {"house_shifting": house_shifting,
-                                                                         "search_query": search_query})
+        maybe_reconcile_completion()
+        context = booking_list_context(request, HouseShiftingDetails)
+        return render(request, 'truck_app_web/house_shifting.html', {"house_shifting": context["page"], **context})
     else:
         return redirect("login")
 
 
 @login_required
+@replica_reads
 def vehicle_shifting(request):
     request_user_id = request.user.id
     if request_user_id == 9:
-        india_tz = pytz.timezone('Asia/Kolkata')
-        now = datetime.now(india_tz)
-        if request.method == "POST":
-            status = request.POST.get('status')
-            search_query = request.POST.get('search')
-            if status == "all":
-                vehicle_shifting = VehicleShiftingDetails.objects.all().order_by('-created')
-            elif status == "completed":
-                vehicle_shifting = HouseShiftingDetails.objects.filter(completed=True).order_by('-created')
-            elif status == "pending":
-                vehicle_shifting = HouseShiftingDetails.objects.filter((Q(completed=False) | Q(completed__isnull=True))).order_by('-created')
-            else:
-                vehicle_shifting = HouseShiftingDetails.objects.all().order_by('-created')
-
-            if search_query:
-                try:
-                    vehicle_shifting = vehicle_shifting.filter(booking_id=search_query).order_by('-created')
-                except:
-                    vehicle_shifting = VehicleShiftingDetails.objects.all().order_by('-created')
-            vehicle_shifting_detail = VehicleShiftingDetails.objects.all().order_by('-created')
-            for vehicle_shifting_data in vehicle_shifting_detail:
-                print("for")
-                if vehicle_shifting_data.completed is False or vehicle_shifting_data.completed is None:
-                    completed_datetime = vehicle_shifting_data.completed_date
-                    if completed_datetime is not None:
-                        completed_date = completed_datetime.date()
-                        completed_time = completed_datetime.time()
-                        now_date = now.date()
-                        now_time = now.time()
-                        if completed_date < now_date:
-                            print(">>>>>>>date less than>>>>>>>>>>>>>")
-                            vehicle_shifting_data.completed = True
-                            vehicle_shifting_data.save()
-                        elif completed_date == now_date:
-                            print(">>>>>>>date equal to >>>>>>>>>>>>>")
-                            if completed_time <= now_time:
-                                print("<>>>>>>>>>>time less than or equal to>>>>>>>>>>>>>>>>>")
-                                vehicle_shifting_data.completed = True
-                                vehicle_shifting_data.save()
-                else:
-                    completed_datetime = vehicle_shifting_data.completed_date
-                    if vehicle_shifting_data.completed is True:
-                        if completed_datetime is not None:
-                            completed_date = completed_datetime.date()
-                            completed_time = completed_datetime.time()
-                            now_date = now.date()
-                            now_time = now.time()
-                            if completed_date > now_date:
-                                print(">>>>>>>date greater than>>>>>>>>>>>>>")
-                                vehicle_shifting_data.completed = False
-                                vehicle_shifting_data.save()
-                            elif completed_date == now_date:
-                                print(">>>>>>>date equal than>>>>>>>>>>>>>")
-                                if completed_time > now_time:
-                                    print(">>>>>>>time greater than>>>>>>>>>>>>>")
-                                    vehicle_shifting_data.completed = False
-                                    vehicle_shifting_data.save()
-            return render(request, 'truck_app_web/vehicle_shifting.html', {"vehicle_shifting": vehicle_shifting,
-                                                                           "search_query": search_query})
-        else:
-            search_query = ""
-            vehicle_shifting = VehicleShiftingDetails.objects.all().order_by('-created')
-            vehicle_shifting_detail = VehicleShiftingDetails.objects.all().order_by('-created')
-            for vehicle_shifting_data in vehicle_shifting_detail:
-                print("for")
-                if vehicle_shifting_data.completed is False or vehicle_shifting_data.completed is None:
-                    completed_datetime = vehicle_shifting_data.completed_date
-                    if completed_datetime is not None:
-                        completed_date = completed_datetime.date()
-                        completed_time = completed_datetime.time()
-                        now_date = now.date()
-                        now_time = now.time()
-                        if completed_date < now_date:
-                            print(">>>>>>>date less than>>>>>>>>>>>>>")
-                            vehicle_shifting_data.completed = True
-                            vehicle_shifting_data.save()
-                        elif completed_date == now_date:
-                            print(">>>>>>>date equal to >>>>>>>>>>>>>")
-                            if completed_time <= now_time:
-                                print("<>>>>>>>>>>time less than or equal to>>>>>>>>>>>>>>>>>")
-                                vehicle_shifting_data.completed = True
-                                vehicle_shifting_data.save()
-                else:
-                    completed_datetime = vehicle_shifting_data.completed_date
-                    if vehicle_shifting_data.completed is True:
-                        if completed_datetime is not None:
-                            completed_date = completed_datetime.date()
-                            completed_time = completed_datetime.time()
-                            now_date = now.date()
-                            now_time = now.time()
-                            if completed_date > now_date:
-                                print(">>>>>>>date greater than>>>>>>>>>>>>>")
-                                vehicle_shifting_data.completed = False
-                                vehicle_shifting_data.save()
-                            elif completed_date == now_date:
-                                print(">>>>>>>date equal than>>>>>>>>>>>>>")
-                                if completed_time > now_time:
-                                    print(">>>>>>>time greater than>>>>>>>>>>>>>")
-                                    vehicle_shifting_data.completed = False
-                                    vehicle_shifting_data.save()
-            return render(request, 'truck_app_web/vehicle_shifting.html', {"vehicle_shifting": vehicle_shifting,
-                                                                           "search_query": search_query})
+        maybe_reconcile_completion()
+        context = booking_list_context(request, VehicleShiftingDetails)
+        return render(request, 'truck_app_web/vehicle_shifting.html', {"vehicle_shifting": context["page"], **context})
     else:
         return redirect("login")
 
 
 @login_required
+@replica_reads
 def warehouse_shifting(request):
     request_user_id = request.user.id
     if request_user_id == 9:
-        india_tz = pytz.timezone('Asia/Kolkata')
-        now = datetime.now(india_tz)
-        if request.method == "POST":
-            status = request.POST.get('status')
-            search_query = request.POST.get('search')
-            if status == "all":
-                warehouse_shifting = WareHouseStorageDetails.objects.all().order_by('-created')
-            elif status == "completed":
-                warehouse_shifting = WareHouseStorageDetails.objects.filter(completed=True).order_by('-created')
-            elif status == "pending":
-                warehouse_shifting = WareHouseStorageDetails.objects.filter((Q(completed=False) | Q(completed__isnull=True))).order_by('-created')
-            else:
-                warehouse_shifting = WareHouseStorageDetails.objects.all().order_by('-created')
-            if search_query:
-                try:
-                    warehouse_shifting = warehouse_shifting.filter(booking_id=search_query).order_by('-created')
-                except:
-                    warehouse_shifting = WareHouseStorageDetails.objects.all().order_by('-created')
-
-            warehouse_shifting_detail = WareHouseStorageDetails.objects.all().order_by('-created')
-            for warehouse_shifting_data in warehouse_shifting_detail:
-                print("for")
-                if warehouse_shifting_data.completed is False or warehouse_shifting_data.completed is None:
-                    completed_datetime = warehouse_shifting_data.completed_date
-                    if completed_datetime is not None:
-                        completed_date = completed_datetime.date()
-                        completed_time = completed_datetime.time()
-                        now_date = now.date()
-                        now_time = now.time()
-                        if completed_date < now_date:
-                            print(">>>>>>>date less than>>>>>>>>>>>>>")
-                            warehouse_shifting_data.completed = True
-                            warehouse_shifting_data.save()
-                        elif completed_date == now_date:
-                            print(">>>>>>>date equal to >>>>>>>>>>>>>")
-                            if completed_time <= now_time:
-                                print("<>>>>>>>>>>time less than or equal to>>>>>>>>>>>>>>>>>")
-                                warehouse_shifting_data.completed = True
-                                warehouse_shifting_data.save()
-                else:
-                    completed_datetime = warehouse_shifting_data.completed_date
-                    if warehouse_shifting_data.completed is True:
-                        if completed_datetime is not None:
-                            completed_date = completed_datetime.date()
-                            completed_time = completed_datetime.time()
-                            now_date = now.date()
-                            now_time = now.time()
-                            if completed_date > now_date:
-                                print(">>>>>>>date greater than>>>>>>>>>>>>>")
-                                warehouse_shifting_data.completed = False
-                                warehouse_shifting_data.save()
-                            elif completed_date == now_date:
-                                print(">>>>>>>date equal than>>>>>>>>>>>>>")
-                                if completed_time > now_time:
-                                    print(">>>>>>>time greater than>>>>>>>>>>>>>")
-                                    warehouse_shifting_data.completed = False
-                                    warehouse_shifting_data.save()
-
-            return render(request, 'truck_app_web/warehouse_shifting.html', {"warehouse_shifting": warehouse_shifting,
-                                                                             "search_query": search_query})
-        else:
-            search_query = ""
-            warehouse_shifting = WareHouseStorageDetails.objects.all().order_by('-created')
-            warehouse_shifting_detail = WareHouseStorageDetails.objects.all().order_by('-created')
-            for warehouse_shifting_data in warehouse_shifting_detail:
-                print("for")
-                if warehouse_shifting_data.completed is False or warehouse_shifting_data.completed is None:
-                    completed_datetime = warehouse_shifting_data.completed_date
-                    if completed_datetime is not None:
-                        completed_date = completed_datetime.date()
-                        completed_time = completed_datetime.time()
-                        now_date = now.date()
-                        now_time = now.time()
-                        if completed_date < now_date:
-                            print(">>>>>>>date less than>>>>>>>>>>>>>")
-                            warehouse_shifting_data.completed = True
-                            warehouse_shifting_data.save()
-                        elif completed_date == now_date:
-                            print(">>>>>>>date equal to >>>>>>>>>>>>>")
-                            if completed_time <= now_time:
-                                print("<>>>>>>>>>>time less than or equal to>>>>>>>>>>>>>>>>>")
-                                warehouse_shifting_data.completed = True
-                                warehouse_shifting_data.save()
-                else:
-                    completed_datetime = warehouse_shifting_data.completed_date
-                    if warehouse_shifting_data.completed is True:
-                        if completed_datetime is not None:
-                            completed_date = completed_datetime.date()
-                            completed_time = completed_datetime.time()
-                            now_date = now.date()
-                            now_time = now.time()
-                            if completed_date > now_date:
-                                print(">>>>>>>date greater than>>>>>>>>>>>>>")
-                                warehouse_shifting_data.completed = False
-                                warehouse_shifting_data.save()
-                            elif completed_date == now_date:
-                                print(">>>>>>>date equal than>>>>>>>>>>>>>")
-                                if completed_time > now_time:
-                                    print(">>>>>>>time greater than>>>>>>>>>>>>>")
-                                    warehouse_shifting_data.completed = False
-                                    warehouse_shifting_data.save()
-
-            return render(request, 'truck_app_web/warehouse_shifting.html', {"warehouse_shifting": warehouse_shifting,
-                                                                             "search_query": search_query})
+        maybe_reconcile_completion()
+        context = booking_list_context(request, WareHouseStorageDetails)
+        return render(request, 'truck_app_web/warehouse_shifting.html', {"warehouse_shifting": context["page"], **context})
     else:
         return redirect("login")
 
@@ -498,41 +263,12 @@ def warehouse_shifting(request):
 def house_shifting_details(request, id):
     request_user_id = request.user.id
     if request_user_id == 9:
-        house_shifting_detail_id = id
-        if house_shifting_detail_id:
-            if request.method == 'POST':
-                try:
-                    completed_date = request.POST['completed_date']
-                except:
-                    completed_date = ""
-                if completed_date is not None:
-                    date_obj = datetime.strptime(completed_date, '%Y-%m-%dT%H:%M')
-                    date_formatted = date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                    HouseShiftingDetails.objects.filter(id=house_shifting_detail_id).update(completed_date=date_formatted)
-                    house_shifting_detail = HouseShiftingDetails.objects.filter(id=house_shifting_detail_id).first()
-                    user_id = house_shifting_detail.user_id
-                    my_datetime_str = house_shifting_detail.completed_date
-                    completed_date = my_datetime_str.strftime("%Y-%m-%dT%H:%M")
-                    user_profile = UserProfile.objects.filter(user=user_id).first()
-                    return render(request, 'truck_app_web/houseshifting_details.html',
-                                  {"house_shifting_detail": house_shifting_detail,
-                                   "user_profile": user_profile,
-                                   "completed_date": completed_date})
-            else:
-                house_shifting_detail = HouseShiftingDetails.objects.filter(id=house_shifting_detail_id).first()
-                my_datetime_str = house_shifting_detail.completed_date
-                if my_datetime_str is not None:
-                    completed_date = my_datetime_str.strftime("%Y-%m-%dT%H:%M")
-                else:
-                    completed_date = ""
-                user_id = house_shifting_detail.user_id
-                user_profile = UserProfile.objects.filter(user=user_id).first()
-                return render(request, 'truck_app_web/houseshifting_details.html',
-                              {"house_shifting_detail": house_shifting_detail,
-                               "user_profile": user_profile,
-                               "completed_date": completed_date})
-        else:
-            return render(request, "truck_app_web/houseshifting_details.html")
+        if request.method == 'POST':
+            set_completed_date(HouseShiftingDetails, id, request.POST.get('completed_date'))
+        context = booking_detail_context(HouseShiftingDetails, id)
+        if context is None:
+            raise Http404("Booking not found")
+        return render(request, 'truck_app_web/houseshifting_details.html', {"house_shifting_detail": context["detail"], **context})
     else:
         return redirect("login")
 
@@ -541,42 +277,12 @@ def house_shifting_details(request, id):
 def vehicle_shifting_details(request, id):
     request_user_id = request.user.id
     if request_user_id == 9:
-        vehicle_shifting_detail_id = id
-        if vehicle_shifting_detail_id:
-            if request.method == 'POST':
-                try:
-                    completed_date = request.POST['completed_date']
-                except:
-                    completed_date = ""
-                if completed_date is not None:
-                    date_obj = datetime.strptime(completed_date, '%Y-%m-%dT%H:%M')
-                    date_formatted = date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                    VehicleShiftingDetails.objects.filter(id=vehicle_shifting_detail_id).update(
-                        completed_date=date_formatted)
-                    vehicle_shifting_detail = VehicleShiftingDetails.objects.filter(id=vehicle_shifting_detail_id).first()
-                    user_id = vehicle_shifting_detail.user_id
-                    my_datetime_str = vehicle_shifting_detail.completed_date
-                    completed_date = my_datetime_str.strftime("%Y-%m-%dT%H:%M")
-                    user_profile = UserProfile.objects.filter(user=user_id).first()
-                    return render(request, 'truck_app_web/vehicleshifting_details.html',
-                                  {"vehicle_shifting_detail": vehicle_shifting_detail,
-                                   "user_profile": user_profile,
-                                   "completed_date": completed_date})
-
-            else:
-                vehicle_shifting_detail = VehicleShiftingDetails.objects.filter(id=vehicle_shifting_detail_id).first()
-                my_datetime_str = vehicle_shifting_detail.completed_date
-                if my_datetime_str is not None:
-                    completed_date = my_datetime_str.strftime("%Y-%m-%dT%H:%M")
-                else:
-                    completed_date = ""
-                user_id = vehicle_shifting_detail.user_id
-                user_profile = UserProfile.objects.filter(user=user_id).first()
-                return render(request, 'truck_app_web/vehicleshifting_details.html',
-                              {"vehicle_shifting_detail": vehicle_shifting_detail,
-                               "user_profile": user_profile,
-                               "completed_date": completed_date})
-
+        if request.method == 'POST':
+            set_completed_date(VehicleShiftingDetails, id, request.POST.get('completed_date'))
+        context = booking_detail_context(VehicleShiftingDetails, id)
+        if context is None:
+            raise Http404("Booking not found")
+        return render(request, 'truck_app_web/vehicleshifting_details.html', {"vehicle_shifting_detail": context["detail"], **context})
     else:
         return redirect("login")
 
@@ -585,42 +291,12 @@ def vehicle_shifting_details(request, id):
 def warehouse_shifting_details(request, id):
     request_user_id = request.user.id
     if request_user_id == 9:
-        warehouse_shifting_details_id = id
-        if warehouse_shifting_details_id:
-            if request.method == 'POST':
-                try:
-                    completed_date = request.POST['completed_date']
-                except:
-                    completed_date = ""
-                if completed_date is not None:
-                    date_obj = datetime.strptime(completed_date, '%Y-%m-%dT%H:%M')
-                    date_formatted = date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                    WareHouseStorageDetails.objects.filter(id=warehouse_shifting_details_id).update(
-                        completed_date=date_formatted)
-                    warehouse_shifting_detail = WareHouseStorageDetails.objects.filter(id=warehouse_shifting_details_id).first()
-                    user_id = warehouse_shifting_detail.user_id
-                    my_datetime_str = warehouse_shifting_detail.completed_date
-                    completed_date = my_datetime_str.strftime("%Y-%m-%dT%H:%M")
-                    user_profile = UserProfile.objects.filter(user=user_id).first()
-                    return render(request, 'truck_app_web/warehouseshifting_details.html',
-                                  {"warehouse_shifting_detail": warehouse_shifting_detail,
-                                   "user_profile": user_profile,
-                                   "completed_date": completed_date})
-            else:
-                warehouse_shifting_detail = WareHouseStorageDetails.objects.filter(id=warehouse_shifting_details_id).first()
-                my_datetime_str = warehouse_shifting_detail.completed_date
-                if my_datetime_str is not None:
-                    completed_date = my_datetime_str.strftime("%Y-%m-%dT%H:%M")
-                else:
-                    completed_date = ""
-                user_id = warehouse_shifting_detail.user_id
-                user_profile = UserProfile.objects.filter(user=user_id).first()
-                return render(request, 'truck_app_web/warehouseshifting_details.html',
-                              {"warehouse_shifting_detail": warehouse_shifting_detail,
-                               "user_profile": user_profile,
-                               "completed_date": completed_date})
-        else:
-            return render(request, "truck_app_web/warehouseshifting_details.html")
+        if request.method == 'POST':
+            set_completed_date(WareHouseStorageDetails, id, request.POST.get('completed_date'))
+        context = booking_detail_context(WareHouseStorageDetails, id)
+        if context is None:
+            raise Http404("Booking not found")
+        return render(request, 'truck_app_web/warehouseshifting_details.html', {"warehouse_shifting_detail": context["detail"], **context})
     else:
         return redirect("login")
 
@@ -635,7 +311,7 @@ def testing(request):
 
     response = requests.request("GET", url, headers=headers, data=payload)
 
-    print(response.text)
+    logger.debug("SMS test response", extra={'status': response.status_code})
 
     return render(request, 'truck_app_web/testing.html')
 
@@ -643,26 +319,12 @@ def testing(request):
 def verify_phone_number(request):
     if request.method == "POST":
         phone_number = request.POST['phone_number']
-        print("phone_number", phone_number)
         user_phone_number = User.objects.values_list("phone_number", flat=True)
         for phone_number_list in user_phone_number:
-            print("fnvkjhvbdjkhvdjkfvdsfvh n", phone_number_list)
+            logger.debug("Checking phone number", extra={'candidate': phone_number_list})
             if phone_number_list == phone_number:
-                print("phone_nfhbvdfumber",phone_number)
-                phone_numbers = "+91" + phone_number
-                print("phone_numbers", phone_numbers)
-                url_1 = "https://2factor.in/API/V1"
-                api_key = "/8375cfcd-077a-11ee-addf-0200cd936042"
-                sms = "/SMS/"
-                auto_generate = "/AUTOGEN2/APM_testing_OTP"
-                # template_name = "/APM_testing_OTP"
-                url = url_1 + api_key + sms + phone_numbers + auto_generate
-                print("url", url)
-                payload = {}
-                headers = {}
-                response = requests.request("GET", url, headers=headers, data=payload)
-                response_json = json.loads(response.text)
-                otp = response_json["OTP"]
+                otp = send_otp(phone_number)
+                logger.info("Password reset OTP sent")
                 register = Register.objects.filter(user_phone_number=phone_number).first()
                 register.otp = otp
                 register.save()
@@ -10,7 +10,21 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import reverse
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truckapp_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, the live board reads models and settings
+from truck_app_web.live import live_board_events  # noqa: E402
+
+LIVE_BOARD_EVENTS_PATH = reverse('LiveBoardEvents')
+
+
+async def application(scope, receive, send):
+    # The live board stream is a raw ASGI app so a dispatcher's connection holds no Django thread
+    if scope['type'] == 'http' and scope['path'] == LIVE_BOARD_EVENTS_PATH:
+        await live_board_events(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
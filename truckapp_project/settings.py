@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,13 +45,20 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     # 'truck_app.middleware.SecretKeyMiddleware',
+    'truck_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'truck_app.middleware.ConnectionLimitMiddleware',
+    'truck_app.routers.ReplicaRoutingMiddleware',
+    'truck_app.middleware.ProfilingMiddleware',
+    'truck_app.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'truck_app.middleware.SmsNotConfiguredMiddleware',
+    'truck_app.middleware.SparseOptionsErrorMiddleware',
 
 ]
 
@@ -84,10 +92,26 @@ DATABASES = {
         'USER': 'root',
         'PASSWORD': '',
         'HOST': 'localhost',
-        'PORT': '3306'
+        'PORT': '3306',
+        # Reuse a connection for this many seconds instead of reconnecting on every request; set
+        # DB_CONN_MAX_AGE=0 for ASGI servers, where Django cannot reuse connections safely
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        # Ping a reused connection before the request's first query, reconnecting if it went away
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (truck_app.routers): one alias per host in DB_REPLICA_HOSTS, same credentials as the
+# primary. Views marked replica_reads read from them unless the user wrote in the last
+# REPLICA_STICKY_SECONDS seconds.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = 'replica%s' % (index + 1)
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['truck_app.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -121,6 +145,14 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# collectstatic minifies the admin CSS/JS and stores it under content-hashed names (truck_app_web.assets)
+STATICFILES_STORAGE = 'truck_app_web.assets.MinifiedManifestStaticFilesStorage'
+
+# Serve STATIC_ROOT from Django with far-future cache headers; turn off when a web server serves /static/
+SERVE_STATIC_FILES = True
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -134,3 +166,121 @@ TWILIO_PHONE_NUMBER = "+15674853346"
 LOGIN_URL = "/web/login/"
 AUTHENTICATION_BACKENDS = ['truck_app.backends.PhoneBackend',    'django.contrib.auth.backends.ModelBackend',]
 SESSION_COOKIE_AGE = 60 * 60
+
+# Encode API responses with orjson when it is installed (truck_app.responses.FastJsonResponse)
+FAST_JSON_ENCODER = True
+
+# Response compression (truck_app.middleware.CompressionMiddleware). Leave text/html out: the admin
+# pages carry CSRF tokens, which compression would expose to a BREACH attack.
+COMPRESSION_MIN_SIZE = 860
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'image/svg+xml',
+]
+
+# Seconds the admin dashboard counters are served from cache (truck_app_web.dashboard)
+DASHBOARD_CACHE_TTL = 30
+
+# Time zone the admin enters completed_date in, and how often (seconds) the admin list pages
+# reconcile completion when the reconcile_completion command is not scheduled (truck_app.completion)
+COMPLETION_TIME_ZONE = 'Asia/Kolkata'
+COMPLETION_RECONCILE_INTERVAL = 60
+
+# How often (seconds) the admin dashboard folds new orders into the income chart's DailyRevenue rollup
+# when the rollup_revenue command is not scheduled (truck_app.revenue)
+REVENUE_ROLLUP_INTERVAL = 300
+
+# Rows per page of the admin booking lists, and the most a ?page_size= may ask for (truck_app_web.pagination)
+ADMIN_LIST_PAGE_SIZE = 50
+ADMIN_LIST_MAX_PAGE_SIZE = 200
+
+# CSV exports (truck_app_web.views.export_bookings) stream row by row under WSGI. Under ASGI they are
+# buffered whole before the first byte is sent: in memory up to this many bytes, then in a temporary
+# file, so a large export needs that much disk and downloads only once every row has been read.
+EXPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Live operations board (truck_app_web.live): seconds between keepalive comments on an idle stream,
+# events kept for Last-Event-ID replay, and events buffered per dispatcher before the oldest are dropped
+LIVE_BOARD_HEARTBEAT = 15
+LIVE_BOARD_HISTORY = 100
+LIVE_BOARD_QUEUE_SIZE = 100
+
+# Admin search (truck_app.search): 'auto' uses MySQL FULLTEXT on MySQL and the token index elsewhere,
+# 'fulltext' or 'tokens' force one. Token prefixes are indexed from SEARCH_MIN_PREFIX to
+# SEARCH_MAX_PREFIX characters; InnoDB FULLTEXT also ignores terms shorter than innodb_ft_min_token_size.
+SEARCH_BACKEND = 'auto'
+SEARCH_MIN_PREFIX = 2
+SEARCH_MAX_PREFIX = 20
+
+# Shared cache tier (truck_app.caching): Django's Redis backend when REDIS_URL is set (any Redis
+# compatible server), otherwise a file-based cache all processes on this host share
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                          'LOCATION': os.path.join(BASE_DIR, 'cache'),
+                          'OPTIONS': {'MAX_ENTRIES': 10000}}}
+CACHE_SHARED_ALIAS = 'default'
+CACHE_DEFAULT_TIMEOUT = 300
+# In-process LRU tier in front of it: entries per process and the most seconds one is kept
+CACHE_LOCAL_MAX_ENTRIES = 1000
+CACHE_LOCAL_TIMEOUT = 60
+
+# Database connections a worker process uses at once, and seconds a request waits for one before a 503
+# (truck_app.middleware.ConnectionLimitMiddleware); keep workers x this under MySQL's max_connections
+DB_MAX_CONNECTIONS_PER_WORKER = 10
+DB_CONNECTION_WAIT = 5
+
+# OTP SMS provider (truck_app.sms) and seconds to wait for it. SMS_API_KEY must be exported in
+# production: without it the OTP endpoints answer 503 "SMS not configured" (check truck_app.W001)
+SMS_API_URL = 'https://2factor.in/API/V1'
+SMS_API_KEY = os.environ.get('SMS_API_KEY', '')
+SMS_OTP_TEMPLATE = 'APM_testing_OTP'
+SMS_TIMEOUT = 10
+
+# Structured logging (truck_app.logs): the app loggers write JSON lines from a background thread.
+# LOG_LEVEL is their level, LOG_LEVELS overrides single loggers ("truck_app.views=DEBUG,v1=WARNING"),
+# and only LOG_DEBUG_SAMPLE_RATE of the DEBUG records (per-row events) are written.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+LOG_QUEUE_SIZE = 10000
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {'json': {'()': 'truck_app.logs.JsonFormatter'}},
+    'filters': {'sample_debug': {'()': 'truck_app.logs.SamplingFilter', 'rate': LOG_DEBUG_SAMPLE_RATE}},
+    'handlers': {'background': {'class': 'truck_app.logs.BackgroundHandler',
+                                'stream': 'ext://sys.stdout',
+                                'queue_size': LOG_QUEUE_SIZE,
+                                'formatter': 'json',
+                                'filters': ['sample_debug']}},
+    'loggers': {name: {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False}
+                for name in ('truck_app', 'truck_app_web', 'v1')},
+}
+for logger_level in filter(None, os.environ.get('LOG_LEVELS', '').split(',')):
+    logger_name, _, level = logger_level.partition('=')
+    LOGGING['loggers'].setdefault(logger_name.strip(), {})['level'] = level.strip().upper()
+
+# Opt-in request profiling (truck_app.middleware.ProfilingMiddleware): requests whose X-Profile header
+# equals PROFILE_TOKEN, and a PROFILE_SAMPLE_RATE share of all requests, are profiled into PROFILE_DIR.
+# With neither set the middleware is not loaded. PROFILE_MODE is 'sampling' (a stack sample every
+# PROFILE_SAMPLE_INTERVAL seconds) or 'deterministic' (cProfile).
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MODE = 'sampling'
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Prometheus metrics (truck_app.metrics) served at /metrics: each worker writes its values to
+# METRICS_DIR every METRICS_FLUSH_INTERVAL seconds and the endpoint sums them. It defaults to a
+# directory under the system temp dir, out of the checkout; clear it when deploying. With
+# METRICS_TOKEN set the scraper must send "Authorization: Bearer <token>".
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'truckapp-metrics'))
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
@@ -0,0 +1,21 @@
+"""Settings for trying the read replica router (truck_app.routers) locally on two SQLite files.
+
+The tables are built from the models, since the truck_app migrations have two branches that a
+fresh database cannot apply:
+
+    python manage.py migrate --run-syncdb --settings=truckapp_project.settings_sqlite_replica
+    cp db.sqlite3 db_replica.sqlite3
+    python manage.py runserver --settings=truckapp_project.settings_sqlite_replica
+
+Rows written afterwards only reach db.sqlite3; copy the file again to "replicate" them.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db_replica.sqlite3',
+                'TEST': {'MIRROR': 'default'}},
+}
+DATABASE_REPLICAS = ['replica']
+MIGRATION_MODULES = {'truck_app': None}
@@ -13,14 +13,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from truck_app.metrics import metrics_view
+from truck_app_web.assets import serve_static
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/base/', include('truck_app.urls')),
     path('api/v1/', include('v1.urls')),
     path('web/', include('truck_app_web.urls')),
     path('', include('truck_app.urls')),
 ]
+
+if settings.SERVE_STATIC_FILES:
+    urlpatterns.insert(0, re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static))
@@ -1,7 +1,8 @@
 import json
+import logging
 
 from django.contrib.auth import authenticate
-from django.http import JsonResponse
+from truck_app.responses import FastJsonResponse as JsonResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
@@ -22,6 +23,8 @@ from truck_app.models import WareHouseStorageDetails
 from truck_app.models import WareHouseSelectedVehicle
 from truck_app.models import WareHouseStoringProducts
 
+logger = logging.getLogger(__name__)
+
 
 def webpage(request):
     return render(request, 'truck_app/index.html')
@@ -107,8 +110,7 @@ def register(request):
                 to=phone_number
             )
 
-            # Print message status
-            print(message.status)
+            logger.info("OTP SMS sent", extra={'status': message.status})
 
             register = Register(user_name=user_name,
                                 user_phone_number=user_phone_number,